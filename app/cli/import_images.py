@@ -0,0 +1,306 @@
+"""
+Bulk import of an existing photo library.
+
+    python -m app.cli.import_images manifest.jsonl [--batch-size 1000] [--skip-upload]
+
+The manifest has one JSON object per line:
+
+    {"url": "https://...", "public_id": "library/123", "owner_email": "a@example.com",
+     "description": "Harbour at dusk", "tags": ["sea", "dusk"]}
+
+Owners and tags are resolved in bulk, images and their tag links are
+written with COPY on Postgres (multi-row INSERTs elsewhere), one
+transaction per batch. Lines with a `public_id` point at assets already
+in Cloudinary and are never uploaded; lines without one are uploaded from
+`url` into the owner's folder, or rejected with --skip-upload.
+
+The manifest offset is saved to the checkpoint file after every batch and
+a restarted import continues from there; delete the file to start over.
+Public ids already in the database are skipped, so a batch replayed after
+a crash is not imported twice. Rejected lines are appended to the rejects
+file with the reason.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import AsyncContextManager, Callable, Iterator
+
+import cloudinary
+import cloudinary.uploader
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database.connection import sessionmanager
+from app.repository.images import crud_images
+from app.repository.users import crud_users
+from app.services.cache_service import cache_versions, CacheScope
+from app.services.feed_cache import feed_timeline
+
+# same limit as /upload_image
+MAX_TAGS = 5
+
+
+@dataclass(slots=True)
+class ManifestEntry:
+    line: int
+    url: str
+    public_id: str | None
+    owner_email: str
+    description: str
+    tags: list[str]
+
+
+@dataclass(slots=True)
+class Checkpoint:
+    offset: int = 0
+    line: int = 0
+    imported: int = 0
+    skipped: int = 0
+    rejected: int = 0
+
+    @classmethod
+    def load(cls, path: Path) -> 'Checkpoint':
+        if not path.exists():
+            return cls()
+        return cls(**json.loads(path.read_text()))
+
+    def save(self, path: Path):
+        # written aside and renamed: a crash never leaves half a checkpoint
+        temporary = path.with_name(path.name + '.tmp')
+        temporary.write_text(json.dumps(asdict(self)))
+        os.replace(temporary, path)
+
+
+def parse_entry(line: int, raw: bytes) -> ManifestEntry:
+    """Raises ValueError with the reason for lines that cannot be imported."""
+    data = json.loads(raw)
+    if not isinstance(data, dict):
+        raise ValueError('not a JSON object')
+    url, owner_email = data.get('url'), data.get('owner_email')
+    if not url or not owner_email:
+        raise ValueError('url and owner_email are required')
+    tags = data.get('tags') or []
+    if not isinstance(tags, list) or not all(isinstance(tag, str) and tag.strip() for tag in tags):
+        raise ValueError('tags must be a list of names')
+    tags = list(dict.fromkeys(tag.strip() for tag in tags))
+    if len(tags) > MAX_TAGS:
+        raise ValueError(f'more than {MAX_TAGS} tags')
+    return ManifestEntry(
+        line, url, data.get('public_id') or None, owner_email.strip(),
+        str(data.get('description') or ''), tags
+    )
+
+
+def read_batches(
+        path: Path,
+        checkpoint: Checkpoint,
+        batch_size: int
+) -> Iterator[tuple[list[tuple[int, bytes]], int, int]]:
+    """(line number, raw line) batches after the checkpoint, with the offset and line they end at."""
+    offset, line = checkpoint.offset, checkpoint.line
+    with open(path, 'rb') as manifest:
+        manifest.seek(offset)
+        batch = []
+        for raw in manifest:
+            offset += len(raw)
+            line += 1
+            if raw.strip():
+                batch.append((line, raw))
+            if len(batch) >= batch_size:
+                yield batch, offset, line
+                batch = []
+        if batch:
+            yield batch, offset, line
+
+
+def import_public_id(url: str) -> str:
+    """Stable name for an uploaded asset, so a replayed upload finds the first one."""
+    return 'import-' + hashlib.sha1(url.encode()).hexdigest()[:20]
+
+
+class Importer:
+
+    def __init__(self, rejects: Path, skip_upload: bool = False, upload_workers: int = 8):
+        self.rejects = rejects
+        self.skip_upload = skip_upload
+        self.upload_workers = upload_workers
+        # both tables are small next to the library: resolved once per import
+        self.owners: dict[str, int | None] = {}
+        self.tags: dict[str, int] = {}
+        self.rejected = 0
+
+    def reject(self, line: int, error: str, raw: bytes | str):
+        self.rejected += 1
+        if isinstance(raw, bytes):
+            raw = raw.decode('utf-8', errors='replace')
+        with open(self.rejects, 'a', encoding='utf-8') as rejects:
+            rejects.write(json.dumps({'line': line, 'error': error, 'entry': raw.strip()}) + '\n')
+
+    def parse(self, lines: list[tuple[int, bytes]]) -> list[ManifestEntry]:
+        entries = []
+        for line, raw in lines:
+            try:
+                entries.append(parse_entry(line, raw))
+            except ValueError as err:
+                self.reject(line, str(err), raw)
+        return entries
+
+    async def upload(self, entries: list[ManifestEntry]) -> list[ManifestEntry]:
+        """Upload entries without a public id; returns the entries that can be imported."""
+        pending = [entry for entry in entries if entry.public_id is None]
+        if not pending:
+            return entries
+        if self.skip_upload:
+            for entry in pending:
+                self.reject(entry.line, 'no public_id and uploads are skipped', entry.url)
+            return [entry for entry in entries if entry.public_id is not None]
+
+        semaphore = asyncio.Semaphore(self.upload_workers)
+
+        async def upload_one(entry: ManifestEntry):
+            async with semaphore:
+                try:
+                    result = await asyncio.to_thread(
+                        cloudinary.uploader.upload,
+                        entry.url,
+                        folder=entry.owner_email,
+                        public_id=import_public_id(entry.url),
+                        overwrite=False,
+                    )
+                except Exception as err:
+                    self.reject(entry.line, f'upload failed: {str(err)}', entry.url)
+                    return
+                entry.public_id, entry.url = result['public_id'], result['secure_url']
+
+        await asyncio.gather(*(upload_one(entry) for entry in pending))
+        return [entry for entry in entries if entry.public_id is not None]
+
+    async def import_batch(self, entries: list[ManifestEntry], session: AsyncSession) -> tuple[int, int]:
+        """
+        Write one batch in one transaction.
+
+        Returns:
+            tuple: (images imported, images skipped because they exist)
+        """
+        emails = {entry.owner_email for entry in entries} - self.owners.keys()
+        if emails:
+            self.owners.update(dict.fromkeys(emails))
+            self.owners.update(await crud_users.get_ids_by_email(list(emails), session))
+
+        candidates = []
+        for entry in entries:
+            if self.owners[entry.owner_email] is None:
+                self.reject(entry.line, 'unknown owner_email', entry.owner_email)
+            else:
+                candidates.append(entry)
+        existing = await crud_images.get_existing_public_ids(
+            [entry.public_id for entry in candidates], session
+        )
+        fresh: dict[str, ManifestEntry] = {}
+        for entry in candidates:
+            if entry.public_id not in existing:
+                fresh.setdefault(entry.public_id, entry)
+        skipped = len(candidates) - len(fresh)
+        if not fresh:
+            return 0, skipped
+
+        names = {tag for entry in fresh.values() for tag in entry.tags} - self.tags.keys()
+        self.tags.update(await crud_images.get_or_create_tag_ids(names, session))
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        ids = await crud_images.bulk_insert_images([
+            {
+                'description': entry.description,
+                'image_url': entry.url,
+                'user_id': self.owners[entry.owner_email],
+                'public_id': entry.public_id,
+                'created_at': now,
+                'updated_at': now,
+                'average_rating': 0.0,
+                'comment_count': 0,
+            }
+            for entry in fresh.values()
+        ], session)
+        await crud_images.bulk_tag_images([
+            (ids[entry.public_id], self.tags[tag])
+            for entry in fresh.values()
+            for tag in entry.tags
+        ], session)
+        await session.commit()
+
+        by_owner = defaultdict(list)
+        for entry in fresh.values():
+            by_owner[self.owners[entry.owner_email]].append(ids[entry.public_id])
+        await cache_versions.bump(CacheScope.images, CacheScope.tags)
+        await feed_timeline.add_many(by_owner)
+        await crud_users.invalidate_profile_stamps(list(by_owner), session)
+        return len(fresh), skipped
+
+    async def run(
+            self,
+            manifest: Path,
+            checkpoint_path: Path,
+            batch_size: int,
+            session_factory: Callable[[], AsyncContextManager[AsyncSession]]
+    ) -> Checkpoint:
+        checkpoint = Checkpoint.load(checkpoint_path)
+        if checkpoint.line:
+            print(f'resuming after line {checkpoint.line}')
+        for lines, offset, line in read_batches(manifest, checkpoint, batch_size):
+            self.rejected = 0
+            entries = await self.upload(self.parse(lines))
+            async with session_factory() as session:
+                imported, skipped = await self.import_batch(entries, session)
+            checkpoint.offset, checkpoint.line = offset, line
+            checkpoint.imported += imported
+            checkpoint.skipped += skipped
+            checkpoint.rejected += self.rejected
+            checkpoint.save(checkpoint_path)
+            print(
+                f'lines ..{line}: {imported} imported, {skipped} skipped, '
+                f'{self.rejected} rejected'
+            )
+        return checkpoint
+
+
+async def import_manifest(args: argparse.Namespace) -> Checkpoint:
+    if not args.skip_upload:
+        cloudinary.config(
+            cloud_name=settings.CLD_NAME,
+            api_key=settings.CLD_API_KEY,
+            api_secret=settings.CLD_API_SECRET,
+        )
+    importer = Importer(args.rejects, args.skip_upload, args.upload_workers)
+    async with sessionmanager.lifespan():
+        return await importer.run(
+            args.manifest, args.checkpoint, args.batch_size, sessionmanager.session
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('manifest', type=Path)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--checkpoint', type=Path, help='default: <manifest>.checkpoint')
+    parser.add_argument('--rejects', type=Path, help='default: <manifest>.rejected.jsonl')
+    parser.add_argument('--skip-upload', action='store_true',
+                        help='reject lines without public_id instead of uploading them')
+    parser.add_argument('--upload-workers', type=int, default=8)
+    args = parser.parse_args()
+    args.checkpoint = args.checkpoint or args.manifest.with_name(args.manifest.name + '.checkpoint')
+    args.rejects = args.rejects or args.manifest.with_name(args.manifest.name + '.rejected.jsonl')
+
+    checkpoint = asyncio.run(import_manifest(args))
+    print(
+        f'done, {checkpoint.imported} imported, {checkpoint.skipped} skipped, '
+        f'{checkpoint.rejected} rejected'
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""
+Recompute Image.comment_count and the last comment snapshot.
+
+    python -m app.cli.repair_comment_stats [--batch-size 500]
+
+Images are processed in id order, one transaction per batch, so the
+command can be interrupted and restarted with --after-id.
+"""
+import argparse
+import asyncio
+
+from app.database.connection import sessionmanager
+from app.repository.comments import crud_comments
+
+
+async def repair(batch_size: int, after_id: int = 0) -> int:
+    total = 0
+    async with sessionmanager.lifespan():
+        while True:
+            async with sessionmanager.session() as session:
+                drifted, last_id = await crud_comments.repair_comment_stats(
+                    session, after_id=after_id, batch_size=batch_size
+                )
+            if not last_id:
+                break
+            total += drifted
+            print(f'images {after_id + 1}..{last_id}: {drifted} repaired')
+            after_id = last_id
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--after-id', type=int, default=0)
+    args = parser.parse_args()
+
+    total = asyncio.run(repair(args.batch_size, args.after_id))
+    print(f'done, {total} images repaired')
+
+
+if __name__ == '__main__':
+    main()
@@ -20,7 +20,80 @@ class Settings(BaseSettings):
     REDIS_PORT : int = 0000
     REDIS_DB : int = 0
     REDIS_DECODE_RESPONSES : bool = True
-    
+
+    CACHE_ENABLED : bool = True
+    CACHE_PREFIX : str = 'photoshare'
+    CACHE_RETRY_AFTER : int = 5
+    CACHE_SOCKET_TIMEOUT : float = 0.5
+    CACHE_LOCK_TTL_MS : int = 3000
+    SEARCH_CACHE_TTL : int = 60
+    ETAG_STAMP_TTL : int = 600
+    IMAGE_REDIRECT_MAX_AGE : int = 300
+    COMMENTS_PAGE_SIZE : int = 50
+    FEED_PAGE_SIZE : int = 20
+    FEED_MAX_LENGTH : int = 1000
+    FEED_CARD_TTL : int = 300
+    LEADERBOARD_MIN_VOTES : int = 1
+    LEADERBOARD_REBUILD_INTERVAL : int = 3600
+    LEADERBOARD_REBUILD_TIMEOUT : int = 300
+    LEADERBOARD_SCAN_LIMIT : int = 1000
+    TAG_INDEX_REFRESH : int = 300
+    TAG_FUZZY_THRESHOLD : float = 0.3
+    RATINGS_WRITE_BEHIND : bool = False
+    RATINGS_FLUSH_INTERVAL : float = 1.0
+    RATINGS_FLUSH_BATCH : int = 200
+    RATINGS_FLUSH_LEASE : float = 30.0
+    RATINGS_SEED_TTL : int = 3600
+    PURGE_BATCH_SIZE : int = 500
+    EXPORT_BATCH_SIZE : int = 500
+    PURGE_JOBS_KEEP : int = 100
+    STORAGE_DELETE_INTERVAL : float = 5.0
+    STORAGE_DELETE_BATCH : int = 100
+    IMAGE_METADATA_WORKERS : int = 2
+    MAX_UPLOAD_SIZE : int = 10 * 1024 * 1024
+
+    COMPRESSION_ENABLED : bool = True
+    COMPRESSION_MIN_SIZE : int = 1024
+    COMPRESSION_GZIP_LEVEL : int = 6
+    COMPRESSION_BROTLI_QUALITY : int = 4
+    COMPRESSION_OFFLOAD_SIZE : int = 256 * 1024
+
+    METRICS_ENABLED : bool = True
+    METRICS_LOOP_LAG_INTERVAL : float = 0.5
+    SQL_STATS_ENABLED : bool = True
+    SQL_REPEAT_THRESHOLD : int = 5
+    SLOW_QUERY_THRESHOLD_MS : float = 200.0
+    SLOW_QUERY_MAX_FINGERPRINTS : int = 500
+    SLOW_QUERY_EXPLAIN : bool = True
+    SLOW_QUERY_EXPLAIN_INTERVAL : float = 300.0
+    SLOW_QUERY_EXPLAIN_TIMEOUT_MS : int = 5000
+
+    LOG_ENABLED : bool = True
+    LOG_LEVEL : str = 'INFO'
+    LOG_DIR : str = 'logs'
+    LOG_FILE : str = 'app.log'
+    LOG_MAX_BYTES : int = 10 * 1024 * 1024
+    LOG_BACKUP_COUNT : int = 5
+    LOG_ROTATE_WHEN : str = ''
+    LOG_QUEUE_SIZE : int = 10000
+    LOG_ACCESS : bool = True
+
+    TRACING_ENABLED : bool = True
+    TRACING_SAMPLE_RATE : float = 0.01
+    TRACING_EXPORTER : str = 'memory'
+    TRACING_FILE : str = 'logs/traces.jsonl'
+    TRACING_MEMORY_SPANS : int = 10000
+
+    PROFILING_ENABLED : bool = True
+    PROFILING_INTERVAL : float = 0.001
+    PROFILING_DIR : str = 'logs/profiles'
+    PROFILING_KEEP : int = 50
+
+    READINESS_CACHE_TTL : float = 5.0
+    READINESS_TIMEOUT : float = 1.0
+    READINESS_REQUIRED : list[str] = ['database']
+    READINESS_STORAGE_HOST : str = 'api.cloudinary.com'
+
     PROJECT_NAME : str = 'PhotoShare'
     PROJECT_VERSION : str = '1'
 
@@ -1,9 +1,27 @@
 import contextlib
 from typing import AsyncGenerator, Optional
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
 
 from app.config import settings
+from app.database.query_stats import instrument_engine
+from app.database.slow_queries import slow_query_log
+from app.services.tracing import trace_engine
+from app.services.metrics import registry
+
+
+def enable_foreign_keys(engine: AsyncEngine):
+    """SQLite ignores foreign keys, ON DELETE CASCADE included, unless asked per connection."""
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine.sync_engine, 'connect')
+    def _foreign_keys_on(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
 
 class DatabaseSessionManager:
     def __init__(self, url: str):
@@ -15,6 +33,10 @@ class DatabaseSessionManager:
         #ініціалізація двіжка
         if self._engine is None or self._session_maker is None:
             self._engine = create_async_engine(self._url)
+            enable_foreign_keys(self._engine)
+            instrument_engine(self._engine)
+            trace_engine(self._engine)
+            slow_query_log.instrument(self._engine)
             self._session_maker = async_sessionmaker(
                 autoflush=False,
                 autocommit=False,
@@ -47,6 +69,18 @@ class DatabaseSessionManager:
         finally:
             await session.close()
 
+    def pool_status(self) -> dict[str, int]:
+        """Connections of the engine pool, empty before the first session."""
+        if self._engine is None:
+            return {}
+        pool = self._engine.pool
+        status = {}
+        for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+            method = getattr(pool, name, None)
+            if method is not None:
+                status[name] = method()
+        return status
+
     @contextlib.asynccontextmanager
     async def lifespan(self):
         await self.initialize()
@@ -57,7 +91,19 @@ class DatabaseSessionManager:
 
 sessionmanager = DatabaseSessionManager(settings.PG_URL)
 
+db_pool_connections = registry.gauge(
+    'db_pool_connections', 'Connections of the database pool by state.', ('state',)
+)
+
+
+@registry.on_scrape
+def _export_pool_status():
+    db_pool_connections.clear()
+    for state, value in sessionmanager.pool_status().items():
+        db_pool_connections.set(value, state)
+
+
 async def get_conn_db() -> AsyncGenerator[AsyncSession, None]:
-    async with sessionmanager.lifespan():
-        async with sessionmanager.session() as session:
-            yield session
+    # the engine and its pool live until the app shuts down
+    async with sessionmanager.session() as session:
+        yield session
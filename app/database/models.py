@@ -8,7 +8,9 @@ from sqlalchemy import (
     ForeignKey, 
     func, 
     Enum,
-    Float
+    Float,
+    Index,
+    BigInteger
 )
 from sqlalchemy.orm import relationship, Mapped, mapped_column, DeclarativeBase
 from app.config import RoleSet
@@ -18,8 +20,11 @@ class BaseModel(DeclarativeBase): ...
 
 
 image_tag_association = Table('image_tag', BaseModel.metadata,
-    Column('image_id', Integer, ForeignKey('images.id')),
-    Column('tag_id', Integer, ForeignKey('tags.id'))
+    Column('image_id', Integer, ForeignKey('images.id', ondelete='CASCADE')),
+    Column('tag_id', Integer, ForeignKey('tags.id', ondelete='CASCADE')),
+    # tag aggregates of image cards and the tag filter of search
+    Index('ix_image_tag_image_id_tag_id', 'image_id', 'tag_id'),
+    Index('ix_image_tag_tag_id', 'tag_id'),
 )
 
 class User(BaseModel):
@@ -45,13 +50,31 @@ class Image(BaseModel):
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'))
     public_id: Mapped[str] = mapped_column(String, nullable=False, unique=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=func.now(), onupdate=func.now())
     average_rating: Mapped[float] = mapped_column(Float, default=0.0)
+    # maintained by CommentCrud, recomputed by `python -m app.cli.repair_comment_stats`
+    comment_count: Mapped[int] = mapped_column(Integer, default=0, server_default='0', nullable=False)
+    last_comment_id: Mapped[int] = mapped_column(Integer, nullable=True)
+    last_comment_text: Mapped[str] = mapped_column(String, nullable=True)
+    last_comment_user_id: Mapped[int] = mapped_column(Integer, nullable=True)
+    last_comment_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    # filled at upload by app.services.ingest_service, null when unknown;
+    # width and height as displayed, EXIF orientation already applied
+    width: Mapped[int] = mapped_column(Integer, nullable=True)
+    height: Mapped[int] = mapped_column(Integer, nullable=True)
+    format: Mapped[str] = mapped_column(String(10), nullable=True)
+    orientation: Mapped[int] = mapped_column(Integer, nullable=True)
+    taken_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    content_hash: Mapped[str] = mapped_column(String(64), nullable=True, index=True)
+    phash: Mapped[int] = mapped_column(BigInteger, nullable=True, index=True)
 
+    # dependent rows go with the image through ON DELETE CASCADE: the ORM
+    # never loads them just to delete them (passive_deletes)
     user: Mapped['User'] = relationship('User', back_populates='images', lazy='selectin')
-    tags: Mapped[list['Tag']] = relationship('Tag', secondary=image_tag_association, back_populates='images', lazy='selectin')
-    comments: Mapped[list['Comment']] = relationship('Comment', back_populates='image', lazy='selectin')
-    transformations: Mapped[list['Transformation']] = relationship('Transformation', back_populates='image',lazy='selectin')
-    ratings: Mapped[list['Rating']] = relationship('Rating', back_populates='image', lazy='selectin')
+    tags: Mapped[list['Tag']] = relationship('Tag', secondary=image_tag_association, back_populates='images', lazy='selectin', passive_deletes=True)
+    comments: Mapped[list['Comment']] = relationship('Comment', back_populates='image', lazy='selectin', cascade='all, delete-orphan', passive_deletes=True)
+    transformations: Mapped[list['Transformation']] = relationship('Transformation', back_populates='image',lazy='selectin', cascade='all, delete-orphan', passive_deletes=True)
+    ratings: Mapped[list['Rating']] = relationship('Rating', back_populates='image', lazy='selectin', cascade='all, delete-orphan', passive_deletes=True)
 
 class Tag(BaseModel):
     __tablename__ = 'tags'
@@ -66,17 +89,22 @@ class Comment(BaseModel):
     created_at: Mapped[datetime] = mapped_column(DateTime, default=func.now())
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=func.now(), onupdate=func.now())
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'))
-    image_id: Mapped[int] = mapped_column(Integer, ForeignKey('images.id'))
+    image_id: Mapped[int] = mapped_column(Integer, ForeignKey('images.id', ondelete='CASCADE'))
 
     user: Mapped['User'] = relationship('User', back_populates='comments', lazy='selectin')
     image: Mapped['Image'] = relationship('Image', back_populates='comments', lazy='selectin')
 
+    __table_args__ = (
+        # keyset pages of an image's comments
+        Index('ix_comments_image_id_created_at_id', 'image_id', 'created_at', 'id'),
+    )
+
 class Transformation(BaseModel):
     __tablename__ = 'transformations'
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     transformation_url: Mapped[str] = mapped_column(String, nullable=False)
     qr_code_url: Mapped[str] = mapped_column(String, nullable=False)
-    image_id: Mapped[int] = mapped_column(Integer, ForeignKey('images.id'))
+    image_id: Mapped[int] = mapped_column(Integer, ForeignKey('images.id', ondelete='CASCADE'))
 
     image: Mapped['Image'] = relationship('Image', back_populates='transformations', lazy='selectin')
 
@@ -86,10 +114,9 @@ class Rating(BaseModel):
     value: Mapped[float] = mapped_column(Float, nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=func.now())
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'))
-    image_id: Mapped[int] = mapped_column(Integer, ForeignKey('images.id'))
+    image_id: Mapped[int] = mapped_column(Integer, ForeignKey('images.id', ondelete='CASCADE'))
 
     user: Mapped['User'] = relationship('User', back_populates='ratings', lazy='selectin')
     image: Mapped['Image'] = relationship('Image', back_populates='ratings', lazy='selectin')
 
 User.ratings = relationship('Rating', back_populates='user', lazy='selectin')
-Image.ratings = relationship('Rating', back_populates='image', lazy='selectin')
@@ -0,0 +1,102 @@
+"""
+Per-request SQL statistics collected from engine events.
+
+`track_queries` binds a `QueryStats` to the current context; every
+statement executed by an instrumented engine in that context is counted
+there. SQLAlchemy runs the sync event hooks in a greenlet that shares
+the caller's context, so this works with the async engines too.
+"""
+import contextlib
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Iterator
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+
+@dataclass(slots=True)
+class QueryStats:
+    count: int = 0
+    duration: float = 0.0
+    statements: Counter = field(default_factory=Counter)
+
+    def record(self, statement: str, elapsed: float):
+        self.count += 1
+        self.duration += elapsed
+        self.statements[statement] += 1
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        """Statements executed at least `threshold` times, the usual N+1 shape."""
+        return [
+            (statement, times)
+            for statement, times in self.statements.most_common()
+            if times >= threshold
+        ]
+
+
+_current_stats: ContextVar[QueryStats | None] = ContextVar('query_stats', default=None)
+_listeners: list[Callable[[str, QueryStats], None]] = []
+
+
+def current_query_stats() -> QueryStats | None:
+    return _current_stats.get()
+
+
+@contextlib.contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    stats = QueryStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+def add_listener(listener: Callable[[str, QueryStats], None]):
+    """Call `listener(route, stats)` after every tracked request."""
+    _listeners.append(listener)
+
+
+def remove_listener(listener: Callable[[str, QueryStats], None]):
+    _listeners.remove(listener)
+
+
+def notify_listeners(route: str, stats: QueryStats):
+    for listener in list(_listeners):
+        listener(route, stats)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.record(statement, time.perf_counter() - started)
+
+
+def _handle_error(context):
+    # failed statements never reach after_cursor_execute
+    conn = context.connection
+    if conn is None or not conn.info.get('query_started'):
+        return
+    started = conn.info['query_started'].pop()
+    stats = _current_stats.get()
+    if stats is not None and context.statement:
+        stats.record(context.statement, time.perf_counter() - started)
+
+
+def instrument_engine(engine: Engine | AsyncEngine):
+    """Attach the counting hooks, once per engine."""
+    sync_engine = engine.sync_engine if isinstance(engine, AsyncEngine) else engine
+    if event.contains(sync_engine, 'before_cursor_execute', _before_cursor_execute):
+        return
+    event.listen(sync_engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(sync_engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(sync_engine, 'handle_error', _handle_error)
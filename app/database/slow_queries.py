@@ -0,0 +1,223 @@
+"""
+Statement fingerprints and the slow query log.
+
+Every statement of an instrumented engine is timed and aggregated under
+its fingerprint: the SQL with literals and placeholders folded, so
+`IN (?, ?, ?)` and `IN (?, ?)` count as one statement. Executions slower
+than `SLOW_QUERY_THRESHOLD_MS` are logged with the shape of their
+parameters (types and lengths, never values), the repository method and
+the route. On Postgres the plan of a slow SELECT is captured with
+`EXPLAIN (ANALYZE, BUFFERS)` in a background task: one at a time, in a
+read-only transaction, at most once per fingerprint every
+`SLOW_QUERY_EXPLAIN_INTERVAL` seconds.
+"""
+import asyncio
+import contextvars
+import hashlib
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.config import settings
+from app.services.tracing import current_operation
+from app.utils.logger import current_log_context
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'\$\d+|%\(\w+\)s|%s')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_FINGERPRINT_CACHE_SIZE = 5000
+
+
+def normalize(statement: str) -> str:
+    statement = _WHITESPACE.sub(' ', statement).strip()
+    statement = _STRING.sub('?', statement)
+    statement = _PLACEHOLDER.sub('?', statement)
+    statement = _NUMBER.sub('?', statement)
+    return _PLACEHOLDER_LIST.sub('(...)', statement)
+
+
+def _value_shape(value) -> str:
+    if value is None:
+        return 'null'
+    if isinstance(value, (str, bytes, list, tuple, dict, set)):
+        return f'{type(value).__name__}[{len(value)}]'
+    return type(value).__name__
+
+
+def parameter_shape(parameters, executemany: bool = False) -> str:
+    """Types and lengths of bound parameters; the values stay out of the log."""
+    if executemany:
+        rows = list(parameters or ())
+        return f'{len(rows)} x {parameter_shape(rows[0]) if rows else "()"}'
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f'{key}: {_value_shape(value)}' for key, value in parameters.items()) + '}'
+    if isinstance(parameters, (list, tuple)):
+        return '(' + ', '.join(_value_shape(value) for value in parameters) + ')'
+    return _value_shape(parameters)
+
+
+@dataclass(slots=True)
+class StatementStats:
+    fingerprint: str
+    statement: str
+    calls: int = 0
+    slow_calls: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    last_slow_at: float | None = None
+    last_operation: str | None = None
+    last_route: str | None = None
+    last_parameters: str | None = None
+    plan: str | None = None
+    plan_captured_at: float | None = None
+
+    @property
+    def mean_ms(self) -> float:
+        return self.total_ms / self.calls if self.calls else 0.0
+
+
+class SlowQueryLog:
+
+    def __init__(self, threshold_ms: float, max_fingerprints: int):
+        self.threshold_ms = threshold_ms
+        self.max_fingerprints = max_fingerprints
+        self._stats: dict[str, StatementStats] = {}
+        self._fingerprints: dict[str, tuple[str, str]] = {}
+        self._lock = threading.Lock()
+        self._explaining = False
+
+    def fingerprint(self, statement: str) -> tuple[str, str]:
+        cached = self._fingerprints.get(statement)
+        if cached is None:
+            normalized = normalize(statement)
+            cached = (hashlib.sha1(normalized.encode()).hexdigest()[:16], normalized)
+            if len(self._fingerprints) >= _FINGERPRINT_CACHE_SIZE:
+                self._fingerprints.clear()
+            self._fingerprints[statement] = cached
+        return cached
+
+    def record(self, statement: str, elapsed_ms: float) -> StatementStats:
+        fingerprint, normalized = self.fingerprint(statement)
+        with self._lock:
+            stats = self._stats.get(fingerprint)
+            if stats is None:
+                if len(self._stats) >= self.max_fingerprints:
+                    # make room by forgetting the cheapest statement
+                    del self._stats[min(self._stats.values(), key=lambda s: s.total_ms).fingerprint]
+                stats = self._stats[fingerprint] = StatementStats(fingerprint, normalized)
+            stats.calls += 1
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+        return stats
+
+    def top(self, limit: int = 20, order: str = 'total_ms') -> list[StatementStats]:
+        with self._lock:
+            stats = list(self._stats.values())
+        return sorted(stats, key=lambda s: getattr(s, order), reverse=True)[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def instrument(self, engine: AsyncEngine):
+        """Time every statement of the engine; once per engine."""
+        sync_engine = engine.sync_engine
+        if event.contains(sync_engine, 'before_cursor_execute', _before_cursor_execute):
+            return
+        event.listen(sync_engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(
+            sync_engine,
+            'after_cursor_execute',
+            lambda *args: self._after_cursor_execute(engine, *args)
+        )
+
+    def _after_cursor_execute(self, engine, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_slow_query_started', None)
+        if started is None:
+            return
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        stats = self.record(statement, elapsed_ms)
+        if self.threshold_ms <= 0 or elapsed_ms < self.threshold_ms:
+            return
+
+        log_context = current_log_context()
+        stats.slow_calls += 1
+        stats.last_slow_at = time.time()
+        stats.last_operation = current_operation()
+        stats.last_route = log_context.current_route() if log_context is not None else None
+        stats.last_parameters = parameter_shape(parameters, executemany)
+        logger.warning(
+            f'Slow query {elapsed_ms:.1f}ms in {stats.last_operation or "?"}: '
+            f'{stats.statement[:500]}',
+            extra={
+                'fingerprint': stats.fingerprint,
+                'duration_ms': round(elapsed_ms, 2),
+                'operation': stats.last_operation,
+                'parameters': stats.last_parameters,
+            }
+        )
+        if self._should_explain(engine, stats, statement, executemany):
+            self._explaining = True
+            stats.plan_captured_at = time.time()
+            # a fresh context: the plan must not count towards the request's queries
+            asyncio.get_running_loop().create_task(
+                self._explain(engine, stats, statement, parameters),
+                context=contextvars.Context()
+            )
+
+    def _should_explain(self, engine, stats: StatementStats, statement: str, executemany: bool) -> bool:
+        if not settings.SLOW_QUERY_EXPLAIN or self._explaining or executemany:
+            return False
+        if engine.dialect.name != 'postgresql':
+            return False
+        # ANALYZE runs the statement: only plain reads
+        if statement.lstrip()[:6].upper() != 'SELECT':
+            return False
+        if stats.plan_captured_at is not None and (
+            time.time() - stats.plan_captured_at < settings.SLOW_QUERY_EXPLAIN_INTERVAL
+        ):
+            return False
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        return True
+
+    async def _explain(self, engine: AsyncEngine, stats: StatementStats, statement: str, parameters):
+        try:
+            async with engine.connect() as conn:
+                await conn.execution_options(slow_query_log=False)
+                await conn.execute(text('SET TRANSACTION READ ONLY'))
+                await conn.execute(text(
+                    f'SET LOCAL statement_timeout = {int(settings.SLOW_QUERY_EXPLAIN_TIMEOUT_MS)}'
+                ))
+                result = await conn.exec_driver_sql(
+                    f'EXPLAIN (ANALYZE, BUFFERS) {statement}', parameters
+                )
+                stats.plan = '\n'.join(row[0] for row in result)
+                await conn.rollback()
+            logger.info(
+                f'Plan of slow query {stats.fingerprint}:\n{stats.plan}',
+                extra={'fingerprint': stats.fingerprint}
+            )
+        except Exception as err:
+            logger.warning(f'EXPLAIN of slow query {stats.fingerprint} failed: {str(err)}')
+        finally:
+            self._explaining = False
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and context.execution_options.get('slow_query_log', True):
+        context._slow_query_started = time.perf_counter()
+
+
+slow_query_log = SlowQueryLog(settings.SLOW_QUERY_THRESHOLD_MS, settings.SLOW_QUERY_MAX_FINGERPRINTS)
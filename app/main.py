@@ -1,22 +1,112 @@
+import contextlib
+import logging
+from pathlib import Path
+
 from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi.responses import JSONResponse, PlainTextResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 
 from app.services.security.auth_service import role_deps
 from app.routers.routers import api_router
 from app.config import settings
-from app.database.connection import get_conn_db
+from app.database.connection import get_conn_db, sessionmanager
+from app.repository.images import crud_images
+from app.services.image_service import storage_janitor
+from app.services.ingest_service import image_ingest
+from app.services.purge_service import purge_jobs
+from app.services.rating_service import rating_flusher
+from app.middleware import (
+    CompressionMiddleware,
+    MetricsMiddleware,
+    ProfilingMiddleware,
+    QueryStatsMiddleware,
+    RequestContextMiddleware,
+    TracingMiddleware,
+)
+from app.services.health import readiness
+from app.services.metrics import loop_lag_monitor, registry
+from app.services.tracing import FileExporter, tracer
+from app.utils.logger import logger_setup
+from app.utils.static_files import PrecompressedStaticFiles, STATIC_DIR
+
+logger = logging.getLogger(__name__)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.LOG_ENABLED:
+        logger_setup.setup_logger()
+    if settings.TRACING_ENABLED and settings.TRACING_EXPORTER == 'file':
+        tracer.configure(exporter=FileExporter(Path(settings.TRACING_FILE)))
+    try:
+        await crud_images.refresh_tag_index(sessionmanager.session)
+    except Exception as err:
+        # the index is loaded again by the first autocomplete request
+        logger.warning(f'Tag index warm-up failed: {str(err)}')
+    if settings.RATINGS_WRITE_BEHIND:
+        rating_flusher.start()
+    storage_janitor.start()
+    if settings.METRICS_ENABLED:
+        loop_lag_monitor.start(settings.METRICS_LOOP_LAG_INTERVAL)
+    yield
+    await loop_lag_monitor.stop()
+    await purge_jobs.stop()
+    await rating_flusher.stop()
+    await storage_janitor.stop()
+    image_ingest.shutdown()
+    await sessionmanager.close()
+    tracer.exporter.close()
+    logger_setup.shutdown()
+
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
-    version=settings.PROJECT_VERSION
+    version=settings.PROJECT_VERSION,
+    lifespan=lifespan
 )
+app.add_middleware(QueryStatsMiddleware)
+app.add_middleware(CompressionMiddleware)
+# wraps compression, so latency includes it
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(ProfilingMiddleware)
+# outermost, so every record of a request carries its ids
+app.add_middleware(RequestContextMiddleware)
 app.include_router(router=api_router)
+app.mount('/static', PrecompressedStaticFiles(directory=STATIC_DIR), name='static')
 
 @app.get("/")
 async def index():
     return {"message": "home page"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Runtime metrics in the Prometheus text format."""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Not Found')
+    return PlainTextResponse(
+        registry.render(), media_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    """Liveness: the process serves requests. No dependency is touched."""
+    return {"status": "ok"}
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    """
+    Readiness: database, Redis and storage checked in parallel, the
+    result cached for a few seconds. 503 when a required check fails.
+    """
+    result = await readiness.status()
+    return JSONResponse(
+        result,
+        status_code=503 if result["status"] == "unavailable" else 200,
+        headers={"Cache-Control": "no-store"}
+    )
+
 @app.get("/check-connection-db")
 async def healthchecker(
     db: AsyncSession = Depends(get_conn_db),
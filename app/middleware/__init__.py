@@ -0,0 +1,15 @@
+from app.middleware.compression import CompressionMiddleware
+from app.middleware.metrics import MetricsMiddleware
+from app.middleware.profiling import ProfilingMiddleware
+from app.middleware.query_stats import QueryStatsMiddleware
+from app.middleware.request_context import RequestContextMiddleware
+from app.middleware.tracing import TracingMiddleware
+
+__all__ = [
+    'CompressionMiddleware',
+    'MetricsMiddleware',
+    'ProfilingMiddleware',
+    'QueryStatsMiddleware',
+    'RequestContextMiddleware',
+    'TracingMiddleware',
+]
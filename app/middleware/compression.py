@@ -0,0 +1,161 @@
+import gzip
+from typing import Callable
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+
+try:
+    import brotli
+except ImportError:
+    # brotli is optional and not a project dependency: 'br' is only
+    # offered where the package is installed, gzip is always available
+    brotli = None
+
+# media types that are already compressed or not worth the cpu time
+INCOMPRESSIBLE_PREFIXES = ('image/', 'video/', 'audio/')
+INCOMPRESSIBLE_TYPES = {
+    'application/zip',
+    'application/gzip',
+    'application/x-gzip',
+    'application/pdf',
+    'application/octet-stream',
+    'font/woff',
+    'font/woff2',
+}
+
+
+def _gzip(body: bytes) -> bytes:
+    return gzip.compress(body, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+def _brotli(body: bytes) -> bytes:
+    return brotli.compress(body, quality=settings.COMPRESSION_BROTLI_QUALITY)
+
+
+def available_encodings() -> dict[str, Callable[[bytes], bytes]]:
+    """Supported content codings, best first."""
+    encoders: dict[str, Callable[[bytes], bytes]] = {}
+    if brotli is not None:
+        encoders['br'] = _brotli
+    encoders['gzip'] = _gzip
+    return encoders
+
+
+def negotiate_encoding(accept_encoding: str | None, offered) -> str | None:
+    """
+    Pick a content coding from an Accept-Encoding header.
+
+    Codings are tried in the order of `offered` (server preference),
+    anything with q=0 is refused, `*` covers codings not listed.
+    """
+    if not accept_encoding:
+        return None
+    weights: dict[str, float] = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[name] = quality
+
+    best, best_quality = None, 0.0
+    for coding in offered:
+        quality = weights.get(coding, weights.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def is_compressible(headers: Headers) -> bool:
+    if 'content-encoding' in headers:
+        return False
+    content_type = headers.get('content-type', '').split(';')[0].strip().lower()
+    if not content_type:
+        return False
+    if content_type.startswith(INCOMPRESSIBLE_PREFIXES):
+        return False
+    return content_type not in INCOMPRESSIBLE_TYPES
+
+
+class CompressionMiddleware:
+    """
+    Negotiated brotli/gzip compression for buffered responses.
+
+    Only bodies sent in one piece and at least `COMPRESSION_MIN_SIZE` bytes
+    long are compressed, streaming responses (files, exports) pass through.
+    Bodies above `COMPRESSION_OFFLOAD_SIZE` are compressed in a worker
+    thread so a large search page does not stall the event loop.
+    A strong ETag becomes weak, the compressed bytes differ from the
+    representation the tag was computed for.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.encoders = available_encodings()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http' or not settings.COMPRESSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(
+            Headers(scope=scope).get('accept-encoding'), self.encoders
+        )
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Message | None = None
+        passthrough = False
+
+        async def send_wrapper(message: Message):
+            nonlocal start_message, passthrough
+            if message['type'] == 'http.response.start':
+                start_message = message
+                return
+            if message['type'] != 'http.response.body' or start_message is None:
+                await send(message)
+                return
+            if passthrough:
+                await send(message)
+                return
+
+            start, start_message = start_message, None
+            body = message.get('body', b'')
+            headers = MutableHeaders(raw=start['headers'])
+            if (
+                message.get('more_body', False)
+                or len(body) < settings.COMPRESSION_MIN_SIZE
+                or not is_compressible(headers)
+            ):
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+
+            compress = self.encoders[encoding]
+            if len(body) >= settings.COMPRESSION_OFFLOAD_SIZE:
+                compressed = await anyio.to_thread.run_sync(compress, body)
+            else:
+                compressed = compress(body)
+
+            headers['Content-Encoding'] = encoding
+            headers['Content-Length'] = str(len(compressed))
+            headers.add_vary_header('Accept-Encoding')
+            etag = headers.get('etag')
+            if etag and not etag.startswith('W/'):
+                headers['ETag'] = 'W/' + etag
+            await send(start)
+            await send({'type': 'http.response.body', 'body': compressed})
+
+        await self.app(scope, receive, send_wrapper)
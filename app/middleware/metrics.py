@@ -0,0 +1,63 @@
+import time
+
+from starlette.types import Message, Receive, Scope, Send, ASGIApp
+
+from app.config import settings
+from app.services.metrics import (
+    http_request_duration,
+    http_requests_in_flight,
+    http_requests_total,
+)
+
+KNOWN_METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+
+def route_template(scope: Scope) -> str:
+    """
+    Path template of the matched route, e.g. `/app/rate_image/{image_id}/`.
+    Raw paths would give one label value per id, so unmatched requests
+    share a single value.
+    """
+    route = scope.get('route')
+    if route is not None:
+        return route.path
+    if 'endpoint' in scope:
+        # mounted app such as /static
+        return scope.get('root_path', '') + '/{path}'
+    return '<unmatched>'
+
+
+class MetricsMiddleware:
+    """
+    Counts responses and records latency per route template and status.
+    Route labels are read after the request went through the router,
+    which writes the matched route into the shared scope.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http' or not settings.METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        http_requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_requests_in_flight.dec()
+            method = scope['method'] if scope['method'] in KNOWN_METHODS else 'OTHER'
+            route = route_template(scope)
+            http_request_duration.observe(elapsed, method, route)
+            http_requests_total.inc(method, route, status_code)
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+
+from fastapi import HTTPException
+from starlette.datastructures import MutableHeaders
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+from app.database.connection import sessionmanager
+from app.middleware.metrics import route_template
+from app.services.profiling import profiler
+from app.services.security.auth_service import role_deps
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b'x-profile'
+PROFILE_ID_HEADER = 'X-Profile-Id'
+
+
+def _header(scope: Scope, name: bytes) -> bytes | None:
+    for key, value in scope['headers']:
+        if key == name:
+            return value
+    return None
+
+
+def _matched_route(scope: Scope) -> str | None:
+    for route in scope['app'].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, 'path', None)
+    return None
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a request when an admin sends `X-Profile: 1`, or when its
+    route was armed through the admin panel. Other requests only pay for
+    a look at the headers.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http' or not settings.PROFILING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        trigger = None
+        if profiler.armed:
+            route = _matched_route(scope)
+            if route is not None and profiler.take(route):
+                trigger = 'armed'
+        if trigger is None and _header(scope, PROFILE_HEADER) in (b'1', b'true'):
+            if await self._is_admin(scope):
+                trigger = 'header'
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        info, sampler = profiler.start(scope['method'], scope['path'], trigger)
+
+        async def send_with_profile_id(message: Message):
+            if message['type'] == 'http.response.start':
+                MutableHeaders(scope=message).append(PROFILE_ID_HEADER, info.id)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            document = profiler.finish(info, sampler, route_template(scope))
+            try:
+                await asyncio.to_thread(profiler.save, info, document)
+            except OSError as err:
+                logger.warning(f'Saving profile {info.id} failed: {str(err)}')
+
+    @staticmethod
+    async def _is_admin(scope: Scope) -> bool:
+        """The same checks as `role_deps.admin_only()`, before routing."""
+        authorization = _header(scope, b'authorization') or b''
+        scheme, _, token = authorization.decode('latin-1').partition(' ')
+        if scheme.lower() != 'bearer' or not token:
+            return False
+        try:
+            async with sessionmanager.session() as session:
+                user = await role_deps.auth_service.get_current_user(token=token, session=session)
+                await role_deps.admin_only().dependency(current_user=user)
+        except HTTPException:
+            return False
+        except Exception as err:
+            logger.warning(f'Profiling admin check failed: {str(err)}')
+            return False
+        return True
@@ -0,0 +1,60 @@
+import logging
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+from app.database.query_stats import notify_listeners, track_queries
+from app.middleware.metrics import route_template
+
+logger = logging.getLogger(__name__)
+
+
+class QueryStatsMiddleware:
+    """
+    Counts the SQL statements of every request.
+
+    The totals go into a `Server-Timing: db;dur=..;desc="N queries"`
+    header and the log. Statements repeated `SQL_REPEAT_THRESHOLD` times
+    or more are logged as a warning: usually a lazy load inside a loop.
+    Statements run after the response started (streaming bodies) are
+    logged but cannot be in the header anymore.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http' or not settings.SQL_STATS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        with track_queries() as stats:
+            async def send_with_timing(message: Message):
+                if message['type'] == 'http.response.start' and stats.count:
+                    headers = MutableHeaders(scope=message)
+                    headers.append(
+                        'Server-Timing',
+                        f'db;dur={stats.duration * 1000:.2f};desc="{stats.count} queries"'
+                    )
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                self._report(scope, stats)
+
+    @staticmethod
+    def _report(scope: Scope, stats):
+        route = route_template(scope)
+        notify_listeners(route, stats)
+        if not stats.count:
+            return
+        logger.debug(
+            f'{scope["method"]} {route}: {stats.count} queries in {stats.duration * 1000:.2f}ms'
+        )
+        for statement, times in stats.repeated(settings.SQL_REPEAT_THRESHOLD):
+            logger.warning(
+                f'{scope["method"]} {route} ran the same statement {times} times: '
+                f'{" ".join(statement.split())[:300]}'
+            )
@@ -0,0 +1,68 @@
+import logging
+import re
+import time
+import uuid
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+from app.middleware.metrics import route_template
+from app.utils.logger import log_context
+
+access_logger = logging.getLogger('app.access')
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+# ids coming from a proxy are kept, anything else is replaced
+_VALID_REQUEST_ID = re.compile(r'[A-Za-z0-9._:-]{1,128}')
+
+
+class RequestContextMiddleware:
+    """
+    Opens the log context of a request: a request id (taken from the
+    `X-Request-ID` header when it looks sane, echoed in the response) and
+    the route template. One access record with status and duration is
+    logged when the request ends.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope['headers']:
+            if name == b'x-request-id':
+                request_id = value.decode('latin-1')
+                break
+        if request_id is None or not _VALID_REQUEST_ID.fullmatch(request_id):
+            request_id = uuid.uuid4().hex
+
+        status_code = 500
+
+        async def send_with_request_id(message: Message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+                MutableHeaders(scope=message).append(REQUEST_ID_HEADER, request_id)
+            await send(message)
+
+        with log_context(request_id=request_id, scope=scope) as context:
+            start = time.perf_counter()
+            try:
+                await self.app(scope, receive, send_with_request_id)
+            finally:
+                if settings.LOG_ACCESS:
+                    # also names mounts and unmatched paths
+                    context.route = route_template(scope)
+                    access_logger.info(
+                        f'{scope["method"]} {context.route} {status_code}',
+                        extra={
+                            'method': scope['method'],
+                            'status': status_code,
+                            'duration_ms': round((time.perf_counter() - start) * 1000, 2),
+                        }
+                    )
@@ -0,0 +1,63 @@
+from typing import Callable
+
+from fastapi.routing import APIRoute
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+from app.middleware.metrics import route_template
+from app.services.tracing import traced, tracer
+from app.utils.logger import bind_log_context
+
+
+class TracingMiddleware:
+    """
+    Root span of every request. The sampling decision is taken here:
+    handlers, repository methods, SQL, Redis and Cloudinary calls only
+    get spans inside a sampled request. The span is renamed after the
+    route template once the router has matched.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http' or not settings.TRACING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for name, value in scope['headers']:
+            if name == b'traceparent':
+                traceparent = value.decode('latin-1')
+                break
+
+        with tracer.trace(f'{scope["method"]} {scope["path"]}', traceparent) as span:
+            if not span.recording:
+                await self.app(scope, receive, send)
+                return
+
+            bind_log_context(trace_id=span.trace_id)
+
+            async def send_with_status(message: Message):
+                if message['type'] == 'http.response.start':
+                    span.set_attribute('http.status_code', message['status'])
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                route = route_template(scope)
+                span.name = f'{scope["method"]} {route}'
+                span.set_attribute('http.method', scope['method'])
+                span.set_attribute('http.route', route)
+                span.set_attribute('http.target', scope['path'])
+
+
+class TracedRoute(APIRoute):
+    """
+    Route class of the routers: a span named `handler.<endpoint>` around
+    dependency resolution, the endpoint and response serialization.
+    """
+
+    def get_route_handler(self) -> Callable:
+        return traced(f'handler.{self.endpoint.__name__}')(super().get_route_handler())
@@ -1,16 +1,82 @@
+from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Sequence
+from typing import AsyncIterator, Sequence
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import select
+from sqlalchemy import case, delete, func, select, update
 from sqlalchemy.orm import joinedload
 from fastapi import HTTPException, status
 
-from app.database.models import Comment, User
+from app.database.models import Comment, Image, User
+from app.repository.pagination import (
+    decode_cursor,
+    encode_cursor,
+    keyset_filter,
+    parse_cursor_datetime,
+)
+from app.repository.users import crud_users
+from app.services.cache_service import cache_versions, CacheScope
+from app.services.http_cache import etag_stamps
+from app.services.feed_cache import image_card_cache
+from app.services.tracing import trace_methods
 
+@dataclass(slots=True)
+class CommentRow:
+    """
+    Columns of a comment as returned by the API, in CommentResponse order.
+    """
+    id: int
+    text: str
+    created_at: datetime
+    updated_at: datetime
+    user_id: int
+    image_id: int
+
+
+@dataclass(slots=True)
+class CommentAuthor:
+    username: str
+    avatar_url: str | None
+
+
+@dataclass(slots=True)
+class AuthoredCommentRow(CommentRow):
+    author: CommentAuthor | None = None
+
+
+def _latest_comment(column):
+    """Correlated subquery: `column` of the newest comment of the outer image."""
+    return (
+        select(column)
+        .where(Comment.image_id == Image.id)
+        .order_by(Comment.created_at.desc(), Comment.id.desc())
+        .limit(1)
+        .correlate(Image)
+        .scalar_subquery()
+    )
+
+
+def _recomputed_comment_stats() -> dict:
+    """Values of the Image comment counters computed from the comments table."""
+    return {
+        'comment_count': (
+            select(func.count(Comment.id))
+            .where(Comment.image_id == Image.id)
+            .correlate(Image)
+            .scalar_subquery()
+        ),
+        'last_comment_id': _latest_comment(Comment.id),
+        'last_comment_text': _latest_comment(Comment.text),
+        'last_comment_user_id': _latest_comment(Comment.user_id),
+        'last_comment_at': _latest_comment(Comment.created_at),
+    }
+
+
+@trace_methods
 class CommentCrud:
     """
     Handles CRUD operations for comments, ensuring only authorized users can modify or delete.
+    Keeps `Image.comment_count` and the last comment snapshot in the same transaction.
     """
 
     async def create_comment(
@@ -38,8 +104,27 @@ class CommentCrud:
             image_id=image_id
         )
         session.add(new_comment)
+        await session.flush()
+        await session.execute(
+            update(Image)
+            .where(Image.id == image_id)
+            .values(
+                comment_count=Image.comment_count + 1,
+                last_comment_id=new_comment.id,
+                last_comment_text=text,
+                last_comment_user_id=user_id,
+                last_comment_at=(
+                    select(Comment.created_at)
+                    .where(Comment.id == new_comment.id)
+                    .scalar_subquery()
+                ),
+            )
+            .execution_options(synchronize_session=False)
+        )
         await session.commit()
         await session.refresh(new_comment)
+        await self._forget_image_comments(image_id)
+        await crud_users.invalidate_profile_stamp(user_id, session)
         return new_comment
 
     async def update_comment(
@@ -89,6 +174,7 @@ class CommentCrud:
 
         await session.commit()
         await session.refresh(comment)
+        await etag_stamps.invalidate(('image_comments', comment.image_id))
         return comment
 
     async def delete_comment(
@@ -121,8 +207,32 @@ class CommentCrud:
                     detail='Comment not found'
                 )
     
+            image_id, user_id = comment.image_id, comment.user_id
             await session.delete(comment)
+            await session.flush()
+            values = {
+                'comment_count': case(
+                    (Image.comment_count > 0, Image.comment_count - 1),
+                    else_=0
+                )
+            }
+            stats = _recomputed_comment_stats()
+            for name in ('last_comment_id', 'last_comment_text',
+                         'last_comment_user_id', 'last_comment_at'):
+                # only move the snapshot when the deleted comment was the newest
+                values[name] = case(
+                    (Image.last_comment_id == comment_id, stats[name]),
+                    else_=getattr(Image, name)
+                )
+            await session.execute(
+                update(Image)
+                .where(Image.id == image_id)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
             await session.commit()
+            await self._forget_image_comments(image_id)
+            await crud_users.invalidate_profile_stamp(user_id, session)
             return comment
         except SQLAlchemyError as e:
             await session.rollback()
@@ -132,6 +242,84 @@ class CommentCrud:
             )
 
 
+    async def stream_user_comments(
+        self,
+        user_id: int,
+        session: AsyncSession,
+        batch_size: int
+    ) -> AsyncIterator[Sequence]:
+        """
+        (id, image_id) rows of every comment of a user, `batch_size` at a
+        time, through a server-side cursor.
+        """
+        result = await session.stream(
+            select(Comment.id, Comment.image_id)
+            .filter(Comment.user_id == user_id)
+            .order_by(Comment.id)
+            .execution_options(yield_per=batch_size)
+        )
+        async for rows in result.partitions():
+            yield rows
+
+    async def export_comments(
+        self,
+        user_id: int,
+        session: AsyncSession,
+        after_id: int = 0,
+        batch_size: int = 500
+    ) -> AsyncIterator[list[CommentRow]]:
+        """
+        Comments of a user with an id above `after_id`, in id order,
+        `batch_size` at a time through a server-side cursor.
+        """
+        result = await session.stream(
+            select(
+                Comment.id,
+                Comment.text,
+                Comment.created_at,
+                Comment.updated_at,
+                Comment.user_id,
+                Comment.image_id,
+            )
+            .filter(Comment.user_id == user_id, Comment.id > after_id)
+            .order_by(Comment.id)
+            .execution_options(yield_per=batch_size)
+        )
+        async for rows in result.partitions():
+            yield [CommentRow(*row) for row in rows]
+
+    async def delete_comments(
+        self,
+        comment_ids: list[int],
+        image_ids: list[int],
+        session: AsyncSession
+    ) -> int:
+        """
+        Delete comments in one statement and recompute the counters of
+        their images in another, without committing.
+
+        Args:
+            comment_ids (list[int]): Comments to delete.
+            image_ids (list[int]): Images the comments belong to.
+            session (AsyncSession): The database session.
+
+        Returns:
+            int: number of comments deleted.
+        """
+        if not comment_ids:
+            return 0
+        result = await session.execute(
+            delete(Comment).where(Comment.id.in_(comment_ids)),
+            execution_options={'synchronize_session': False}
+        )
+        await session.execute(
+            update(Image)
+            .where(Image.id.in_(image_ids))
+            .values(**_recomputed_comment_stats())
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount
+
     async def get_comment(
         self,
         comment_id: int,
@@ -157,23 +345,146 @@ class CommentCrud:
     async def get_comments_for_image(
         self,
         image_id: int,
-        session: AsyncSession
-    ) -> Sequence[Comment]:
+        session: AsyncSession,
+        limit: int | None = None,
+        cursor: str | None = None,
+        include_author: bool = False,
+    ) -> list[CommentRow]:
         """
-        Retrieves all comments for a given image ID.
+        Retrieves comments for a given image ID, oldest first.
+        Only the response columns are selected, no ORM objects are built.
 
         Args:
             image_id (int): The ID of the image to retrieve comments for.
             session (AsyncSession): The database session.
+            limit (int | None): Page size, all comments when not set.
+            cursor (str | None): Value of `comments_cursor` for the previous page.
+            include_author (bool): Attach username and avatar of every author.
 
         Returns:
-            list[Comment]: A list of comments for the given image.
+            list[CommentRow]: A list of comments for the given image,
+            AuthoredCommentRow items when `include_author` is set.
+
+        Raises:
+            HTTPException: 400 if the cursor is malformed.
         """
-        query = select(Comment).options(
-            joinedload(Comment.user)
+        query = select(
+            Comment.id,
+            Comment.text,
+            Comment.created_at,
+            Comment.updated_at,
+            Comment.user_id,
+            Comment.image_id,
         ).filter(Comment.image_id == image_id)
 
+        if cursor:
+            value, last_id = decode_cursor(cursor, size=2)
+            if not isinstance(last_id, int):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail='Invalid cursor'
+                )
+            query = query.filter(keyset_filter(
+                session,
+                Comment.created_at,
+                Comment.id,
+                parse_cursor_datetime(value),
+                last_id,
+                descending=False
+            ))
+
+        query = query.order_by(Comment.created_at, Comment.id)
+        if limit:
+            query = query.limit(limit)
+
         result = await session.execute(query)
-        return result.scalars().all()
+        if not include_author:
+            return [CommentRow(*row) for row in result.all()]
+
+        rows = [AuthoredCommentRow(*row) for row in result.all()]
+        authors = await self._get_authors({row.user_id for row in rows}, session)
+        for row in rows:
+            row.author = authors.get(row.user_id)
+        return rows
+
+    @staticmethod
+    async def _forget_image_comments(image_id: int):
+        await CommentCrud.forget_images_comments([image_id])
+
+    @staticmethod
+    async def forget_images_comments(image_ids: list[int]):
+        await cache_versions.bump(CacheScope.comments)
+        await etag_stamps.invalidate(*[
+            (resource, image_id)
+            for image_id in image_ids
+            for resource in ('image_comments', 'image')
+        ])
+        await image_card_cache.invalidate(*image_ids)
+
+    async def repair_comment_stats(
+        self,
+        session: AsyncSession,
+        after_id: int = 0,
+        batch_size: int = 500
+    ) -> tuple[int, int]:
+        """
+        Recompute comment counters of the next `batch_size` images after `after_id`.
+
+        Returns:
+            tuple: (number of images that had drifted, last image id of the batch,
+            0 when there are no more images)
+        """
+        ids = (await session.execute(
+            select(Image.id)
+            .where(Image.id > after_id)
+            .order_by(Image.id)
+            .limit(batch_size)
+        )).scalars().all()
+        if not ids:
+            return 0, 0
+
+        stats = _recomputed_comment_stats()
+        drifted = (await session.execute(
+            select(func.count(Image.id))
+            .where(Image.id.in_(ids))
+            .where(
+                (Image.comment_count != stats['comment_count'])
+                | (Image.last_comment_id.is_distinct_from(stats['last_comment_id']))
+            )
+        )).scalar_one()
+        if drifted:
+            await session.execute(
+                update(Image)
+                .where(Image.id.in_(ids))
+                .values(**stats)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+            await cache_versions.bump(CacheScope.comments)
+            await etag_stamps.invalidate(*[('image', image_id) for image_id in ids])
+            await image_card_cache.invalidate(*ids)
+        return drifted, ids[-1]
+
+    @staticmethod
+    async def _get_authors(
+        user_ids: set[int],
+        session: AsyncSession
+    ) -> dict[int, CommentAuthor]:
+        """Username and avatar of every user in `user_ids`, in one query."""
+        if not user_ids:
+            return {}
+        result = await session.execute(
+            select(User.id, User.username, User.avatar_url)
+            .filter(User.id.in_(user_ids))
+        )
+        return {
+            user_id: CommentAuthor(username=username, avatar_url=avatar_url)
+            for user_id, username, avatar_url in result.all()
+        }
+
+    @staticmethod
+    def comments_cursor(comment: CommentRow) -> str:
+        """Cursor pointing right after `comment`."""
+        return encode_cursor(comment.created_at, comment.id)
 
 crud_comments = CommentCrud()
@@ -1,4 +1,10 @@
-from sqlalchemy import insert, select, desc
+import logging
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import AsyncContextManager, AsyncIterator, Callable, Sequence
+from sqlalchemy import delete, insert, select, desc, exists, func, union
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from fastapi import HTTPException, status
@@ -8,8 +14,114 @@ import cloudinary.api
 from sqlalchemy.orm import selectinload
 from sqlalchemy.exc import SQLAlchemyError
 
-from app.database.models import Image, Transformation, User, Tag
+from app.config import settings
+from app.database.models import Comment, Image, Rating, Transformation, User, Tag, image_tag_association
+from app.repository.pagination import (
+    encode_cursor,
+    decode_cursor,
+    keyset_filter,
+    parse_cursor_datetime,
+)
+from app.repository.users import crud_users
+from app.services.cache_service import cache_versions, CacheScope
+from app.services.http_cache import etag_stamps
+from app.services.feed_cache import feed_timeline, image_card_cache
+from app.services.leaderboard_cache import leaderboard
+from app.services.rating_cache import pending_ratings
+from app.services.ingest_service import ImageMetadata
+from app.services.metrics import cloudinary_metrics
+from app.services.tracing import trace_methods, tracer
+from app.services.tag_index import tag_index
 
+logger = logging.getLogger(__name__)
+
+SessionFactory = Callable[[], AsyncContextManager[AsyncSession]]
+
+TAG_SEPARATOR = '\x1f'
+
+
+@dataclass(slots=True)
+class LastCommentSnapshot:
+    id: int
+    text: str
+    user_id: int
+    created_at: datetime
+
+    @classmethod
+    def of(cls, image: Image) -> 'LastCommentSnapshot | None':
+        """Snapshot stored on an Image row, None when it has no comments."""
+        if image.last_comment_id is None:
+            return None
+        return cls(
+            image.last_comment_id,
+            image.last_comment_text,
+            image.last_comment_user_id,
+            image.last_comment_at,
+        )
+
+
+@dataclass(slots=True)
+class ImageCard:
+    """
+    Columns needed to render an image in a listing, tags already aggregated.
+    Field names and order follow the JSON of ImageResponseSchema.
+    """
+    id: int
+    description: str
+    image_url: str
+    user_id: int
+    tags: list[str]
+    average_rating: float
+    created_at: datetime
+    comment_count: int
+    last_comment: LastCommentSnapshot | None
+    width: int | None = None
+    height: int | None = None
+
+
+@dataclass(slots=True)
+class GalleryRow:
+    """An image as written to a gallery export."""
+    id: int
+    description: str
+    image_url: str
+    tags: list[str]
+    average_rating: float
+    comment_count: int
+    created_at: datetime
+    updated_at: datetime
+
+
+# columns written by bulk imports, every one explicit so COPY needs no defaults
+IMPORT_COLUMNS = [
+    'description', 'image_url', 'user_id', 'public_id',
+    'created_at', 'updated_at', 'average_rating', 'comment_count',
+]
+
+
+async def _asyncpg_connection(session: AsyncSession):
+    """
+    The asyncpg connection under the session, None on other drivers.
+    The adapter opens its transaction with the first statement: run one
+    before COPY, or COPY commits on its own.
+    """
+    connection = await session.connection()
+    if connection.dialect.driver != 'asyncpg':
+        return None
+    raw = await connection.get_raw_connection()
+    return raw.driver_connection
+
+
+def _tag_list(tags) -> list[str]:
+    """Tag names from `_tag_names_aggregate`: an array or a joined string."""
+    if tags is None:
+        return []
+    if isinstance(tags, str):
+        return tags.split(TAG_SEPARATOR)
+    return list(tags)
+
+
+@trace_methods
 class CrudTags:
     """
     Spesial class from Tag operations.
@@ -142,17 +254,140 @@ class CrudTags:
         """
         if not isinstance(tags_object, list):
             tags_object = [tags_object]
+        # tags may be expired by an earlier commit, compare identities and
+        # read names only after the refresh
+        previous = set(image_object.tags)
         try:
             image_object.tags = list(set(image_object.tags + tags_object))
+            image_object.updated_at = datetime.now(timezone.utc).replace(tzinfo=None)
             session.add(image_object)
             await session.commit()
             await session.refresh(image_object)
+            attached = [tag.name for tag in image_object.tags if tag not in previous]
+            await cache_versions.bump(CacheScope.tags)
+            await etag_stamps.invalidate(('image', image_object.id))
+            await image_card_cache.invalidate(image_object.id)
+            tag_index.record_usage(attached)
         except SQLAlchemyError as error:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f'Failed to update image tags: {str(error)}'
             )
+
+    async def get_or_create_tag_ids(
+            self,
+            names: set[str],
+            session: AsyncSession
+    ) -> dict[str, int]:
+        """
+        Ids of the tags by name, creating the missing ones, in at most
+        three statements. Safe against concurrent imports creating the
+        same tag; nothing is committed.
+        """
+        if not names:
+            return {}
+        existing = dict((await session.execute(
+            select(Tag.name, Tag.id).where(Tag.name.in_(names))
+        )).all())
+        missing = names - existing.keys()
+        if missing:
+            dialect = session.get_bind().dialect.name
+            if dialect == 'postgresql':
+                stmt = postgresql.insert(Tag).on_conflict_do_nothing(index_elements=['name'])
+            elif dialect == 'sqlite':
+                stmt = sqlite.insert(Tag).on_conflict_do_nothing(index_elements=['name'])
+            else:
+                stmt = insert(Tag)
+            await session.execute(stmt, [{'name': name} for name in missing])
+            existing.update((await session.execute(
+                select(Tag.name, Tag.id).where(Tag.name.in_(missing))
+            )).all())
+        return existing
+
+    async def get_tag_usage(
+            self,
+            session: AsyncSession
+    ) -> list[tuple[str, int]]:
+        """
+        Every tag name with the number of images it is attached to.
+        """
+        result = await session.execute(
+            select(Tag.name, func.count(image_tag_association.c.image_id))
+            .select_from(Tag)
+            .outerjoin(image_tag_association, image_tag_association.c.tag_id == Tag.id)
+            .group_by(Tag.id, Tag.name)
+            # nearly the index order: the sort in Python becomes a merge
+            .order_by(func.lower(Tag.name))
+        )
+        return [(name, count) for name, count in result]
+
+    async def refresh_tag_index(self, session_factory: SessionFactory):
+        """
+        Reload the autocomplete index when it is stale. Only the first load
+        is awaited, later ones run in the background on their own session.
+        """
+        if not tag_index.is_stale():
+            return
+
+        async def load():
+            async with session_factory() as session:
+                return await self.get_tag_usage(session)
+
+        if tag_index.loaded_at is None:
+            await tag_index.reload(load)
+        else:
+            tag_index.reload_in_background(load)
+
+    async def get_image_tag_names(
+            self,
+            image_ids: list[int],
+            session: AsyncSession
+    ) -> list[str]:
+        """Tag names of the images, once per image carrying the tag."""
+        if not image_ids:
+            return []
+        result = await session.execute(
+            select(Tag.name)
+            .join(image_tag_association, image_tag_association.c.tag_id == Tag.id)
+            .where(image_tag_association.c.image_id.in_(image_ids))
+        )
+        return list(result.scalars().all())
+
+    async def fuzzy_tags(
+            self,
+            text: str,
+            limit: int,
+            session: AsyncSession
+    ) -> list[tuple[str, int]]:
+        """
+        Tags similar to `text` by pg_trgm trigram similarity, most used first.
+        Returns nothing on databases without pg_trgm.
+        """
+        if session.get_bind().dialect.name != 'postgresql':
+            return []
+        usage = func.count(image_tag_association.c.image_id)
+        similarity = func.similarity(Tag.name, text)
+        try:
+            async with session.begin_nested():
+                result = await session.execute(
+                    select(Tag.name, usage)
+                    .select_from(Tag)
+                    .outerjoin(
+                        image_tag_association,
+                        image_tag_association.c.tag_id == Tag.id
+                    )
+                    .where(similarity > settings.TAG_FUZZY_THRESHOLD)
+                    .group_by(Tag.id, Tag.name)
+                    .order_by(similarity.desc(), usage.desc())
+                    .limit(limit)
+                )
+                return [(name, count) for name, count in result]
+        except SQLAlchemyError as err:
+            # pg_trgm is not installed: CREATE EXTENSION pg_trgm
+            logger.warning(f'Fuzzy tag search unavailable: {str(err)}')
+            return []
     
+@trace_methods
 class ImageCrud(CrudTags):
     """
     Spesial class from Image CRUD operations.
@@ -165,10 +400,11 @@ class ImageCrud(CrudTags):
             user_id:int,
             public_id,
             session:AsyncSession,
+            metadata: ImageMetadata | None = None,
     )->Image:
         session
         """
-        Create record images in database
+        Create record images in database, with the metadata extracted at upload
         """
         try:
             image_record = Image(
@@ -176,11 +412,15 @@ class ImageCrud(CrudTags):
                 description=description,
                 user_id=user_id,
                 public_id=public_id,
+                **(asdict(metadata) if metadata else {}),
             )
             session.add(image_record)
 
             await session.commit()
             await session.refresh(image_record)
+            await cache_versions.bump(CacheScope.images)
+            await feed_timeline.add(image_record.id, user_id)
+            await crud_users.invalidate_profile_stamp(user_id, session)
 
             return image_record
         
@@ -208,6 +448,9 @@ class ImageCrud(CrudTags):
             image_obj.description = description
             await session.commit()
             await session.refresh(image_obj)
+            await cache_versions.bump(CacheScope.images)
+            await etag_stamps.invalidate(('image', image_obj.id))
+            await image_card_cache.invalidate(image_obj.id)
 
             return image_obj
         
@@ -225,17 +468,20 @@ class ImageCrud(CrudTags):
         ):
         try:
             
-            image_obj = await self.get_image_obj(image_id,session)
+            image_row = await self._get_image_for_delete(image_id, session)
 
             self.check_permission(
-                image_obj=image_obj,
+                image_obj=image_row,
                 current_user_id=current_user.id
             )
             
-            cloudinary.uploader.destroy(image_obj.public_id)
+            with cloudinary_metrics.time('destroy'), tracer.span('cloudinary destroy'):
+                cloudinary.uploader.destroy(image_row.public_id)
 
-            await session.delete(image_obj)
+            tag_names = await self.get_image_tag_names([image_row.id], session)
+            await self.delete_image_rows([image_row.id], session)
             await session.commit()
+            await self._forget_deleted_image(image_row.id, image_row.user_id, session, tag_names)
             return True
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
@@ -248,16 +494,250 @@ class ImageCrud(CrudTags):
         ):
         try:
             
-            image_obj = await self.get_image_obj(image_id,session)
+            image_row = await self._get_image_for_delete(image_id, session)
             
-            cloudinary.uploader.destroy(image_obj.public_id)
+            with cloudinary_metrics.time('destroy'), tracer.span('cloudinary destroy'):
+                cloudinary.uploader.destroy(image_row.public_id)
 
-            await session.delete(image_obj)
+            tag_names = await self.get_image_tag_names([image_row.id], session)
+            await self.delete_image_rows([image_row.id], session)
             await session.commit()
+            await self._forget_deleted_image(image_row.id, image_row.user_id, session, tag_names)
             return True
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
+    async def _get_image_for_delete(
+            self,
+            image_id: int,
+            session: AsyncSession
+    ):
+        """
+        The columns a delete needs; the collections of the image stay unloaded.
+        """
+        image_row = (await session.execute(
+            select(Image.id, Image.user_id, Image.public_id).where(Image.id == image_id)
+        )).one_or_none()
+        if image_row is None:
+            raise HTTPException(
+                status_code=404, 
+                detail="Image not found"
+            )
+        return image_row
+
+    async def delete_image_rows(
+            self,
+            image_ids: list[int],
+            session: AsyncSession
+    ) -> int:
+        """
+        Delete images in one statement without committing. Comments,
+        ratings, transformations and tag links go with them through
+        ON DELETE CASCADE, so the cost does not depend on how many
+        there are.
+        """
+        if not image_ids:
+            return 0
+        result = await session.execute(
+            delete(Image).where(Image.id.in_(image_ids)),
+            execution_options={'synchronize_session': False}
+        )
+        return result.rowcount
+
+    async def stream_user_images(
+            self,
+            user_id: int,
+            session: AsyncSession,
+            batch_size: int
+    ) -> AsyncIterator[Sequence]:
+        """
+        (id, public_id) rows of every image of a user, `batch_size` at a
+        time, read through a server-side cursor so memory stays flat.
+        The session must not be used for anything else until the stream
+        is exhausted.
+        """
+        result = await session.stream(
+            select(Image.id, Image.public_id)
+            .where(Image.user_id == user_id)
+            .order_by(Image.id)
+            .execution_options(yield_per=batch_size)
+        )
+        async for rows in result.partitions():
+            yield rows
+
+    async def get_existing_public_ids(
+            self,
+            public_ids: list[str],
+            session: AsyncSession
+    ) -> set[str]:
+        if not public_ids:
+            return set()
+        result = await session.execute(
+            select(Image.public_id).where(Image.public_id.in_(public_ids))
+        )
+        return set(result.scalars())
+
+    async def bulk_insert_images(
+            self,
+            rows: list[dict],
+            session: AsyncSession
+    ) -> dict[str, int]:
+        """
+        Insert image rows (dicts of `IMPORT_COLUMNS`) without committing.
+        On asyncpg the rows go through COPY, elsewhere through batched
+        multi-row INSERTs.
+
+        Returns:
+            dict: public_id -> id of the new images.
+        """
+        if not rows:
+            return {}
+        driver = await _asyncpg_connection(session)
+        if driver is None:
+            result = await session.execute(
+                insert(Image).returning(Image.public_id, Image.id), rows
+            )
+            return dict(result.all())
+
+        await driver.copy_records_to_table(
+            Image.__tablename__,
+            columns=IMPORT_COLUMNS,
+            records=[tuple(row[column] for column in IMPORT_COLUMNS) for row in rows]
+        )
+        result = await session.execute(
+            select(Image.public_id, Image.id)
+            .where(Image.public_id.in_([row['public_id'] for row in rows]))
+        )
+        return dict(result.all())
+
+    async def bulk_tag_images(
+            self,
+            pairs: list[tuple[int, int]],
+            session: AsyncSession
+    ):
+        """Link (image_id, tag_id) pairs without committing; COPY on asyncpg."""
+        if not pairs:
+            return
+        driver = await _asyncpg_connection(session)
+        if driver is None:
+            await session.execute(
+                insert(image_tag_association),
+                [{'image_id': image_id, 'tag_id': tag_id} for image_id, tag_id in pairs]
+            )
+            return
+        await driver.copy_records_to_table(
+            image_tag_association.name,
+            columns=['image_id', 'tag_id'],
+            records=pairs
+        )
+
+    async def export_gallery(
+            self,
+            user_id: int,
+            session: AsyncSession,
+            after_id: int = 0,
+            batch_size: int = 500
+    ) -> AsyncIterator[list[GalleryRow]]:
+        """
+        Images of a user with an id above `after_id`, in id order,
+        `batch_size` at a time through a server-side cursor.
+        """
+        result = await session.stream(
+            select(
+                Image.id,
+                Image.description,
+                Image.image_url,
+                self._tag_names_aggregate(session).label('tags'),
+                Image.average_rating,
+                Image.comment_count,
+                Image.created_at,
+                Image.updated_at,
+            )
+            .where(Image.user_id == user_id, Image.id > after_id)
+            .order_by(Image.id)
+            .execution_options(yield_per=batch_size)
+        )
+        async for rows in result.partitions():
+            yield [
+                GalleryRow(
+                    id_, description, image_url, _tag_list(tags), rating or 0.0,
+                    comment_count or 0, created_at, updated_at
+                )
+                for (
+                    id_, description, image_url, tags, rating,
+                    comment_count, created_at, updated_at
+                ) in rows
+            ]
+
+    async def get_contributor_ids(
+            self,
+            image_ids: list[int],
+            session: AsyncSession
+    ) -> list[int]:
+        """Users who commented on or rated any of the images."""
+        if not image_ids:
+            return []
+        result = await session.execute(union(
+            select(Comment.user_id).where(Comment.image_id.in_(image_ids)),
+            select(Rating.user_id).where(Rating.image_id.in_(image_ids)),
+        ))
+        return [user_id for user_id in result.scalars() if user_id is not None]
+
+    async def _forget_deleted_image(
+            self,
+            image_id: int,
+            owner_id: int,
+            session: AsyncSession,
+            tag_names: list[str] = ()
+    ):
+        """
+        Invalidate every cached view of an image that no longer exists.
+        `tag_names` are the tags it carried, from `get_image_tag_names`.
+        """
+        await self.forget_deleted_images([image_id], owner_id, session, tag_names)
+
+    async def forget_deleted_images(
+            self,
+            image_ids: list[int],
+            owner_id: int,
+            session: AsyncSession,
+            tag_names: list[str] = ()
+    ):
+        """
+        `_forget_deleted_image` for a batch of images of one owner, with
+        one round trip per cache instead of one per image.
+        """
+        if not image_ids:
+            return
+        tag_index.record_usage(tag_names, delta=-1)
+        await cache_versions.bump(CacheScope.images)
+        await etag_stamps.invalidate(*[
+            (resource, image_id)
+            for image_id in image_ids
+            for resource in ('image', 'image_url', 'image_comments')
+        ])
+        await feed_timeline.remove_many(image_ids, owner_id)
+        await image_card_cache.invalidate(*image_ids)
+        await leaderboard.remove_images(image_ids, datetime.now(timezone.utc).replace(tzinfo=None))
+        await pending_ratings.drop_images(image_ids)
+        await crud_users.invalidate_profile_stamp(owner_id, session)
+
+    async def get_image_owner_id(
+            self,
+            image_id: int,
+            session: AsyncSession
+    ) -> int:
+        """Owner of an image without loading the entity and its relationships."""
+        owner_id = (await session.execute(
+            select(Image.user_id).where(Image.id == image_id)
+        )).scalar_one_or_none()
+        if owner_id is None:
+            raise HTTPException(
+                status_code=404,
+                detail="Image not found"
+            )
+        return owner_id
+
     async def get_image_url(
             self,
             image_id:int,
@@ -279,6 +759,107 @@ class ImageCrud(CrudTags):
             )
         return image
     
+    @staticmethod
+    def _tag_names_aggregate(session: AsyncSession):
+        """
+        Correlated subquery collecting tag names of the outer image,
+        array_agg on Postgres and group_concat elsewhere.
+        """
+        if session.get_bind().dialect.name == 'postgresql':
+            aggregate = func.array_agg(aggregate_order_by(Tag.name, Tag.id))
+        else:
+            aggregate = func.group_concat(Tag.name, TAG_SEPARATOR)
+        return (
+            select(aggregate)
+            .select_from(image_tag_association)
+            .join(Tag, Tag.id == image_tag_association.c.tag_id)
+            .where(image_tag_association.c.image_id == Image.id)
+            .correlate(Image)
+            .scalar_subquery()
+        )
+
+    def _image_cards_query(self, session: AsyncSession):
+        """
+        Select only the columns of an image card, without loading entities
+        or their eager relationships.
+        """
+        return select(
+            Image.id,
+            Image.description,
+            Image.image_url,
+            Image.user_id,
+            Image.average_rating,
+            Image.created_at,
+            self._tag_names_aggregate(session).label('tags'),
+            Image.comment_count,
+            Image.last_comment_id,
+            Image.last_comment_text,
+            Image.last_comment_user_id,
+            Image.last_comment_at,
+            Image.width,
+            Image.height,
+        )
+
+    @classmethod
+    async def _fetch_image_cards(
+            cls,
+            stmt,
+            session: AsyncSession,
+            merge_pending: bool = True
+    ) -> list[ImageCard]:
+        result = await session.execute(stmt)
+        cards = []
+        for (
+            id_, description, image_url, user_id, rating, created_at, tags,
+            comment_count, last_id, last_text, last_user_id, last_at, width, height
+        ) in result:
+            tags = _tag_list(tags)
+            last_comment = None
+            if last_id is not None:
+                last_comment = LastCommentSnapshot(last_id, last_text, last_user_id, last_at)
+            cards.append(ImageCard(
+                id_, description, image_url, user_id, tags, rating or 0.0, created_at,
+                comment_count or 0, last_comment, width, height
+            ))
+        if merge_pending:
+            await cls.merge_pending_ratings(cards)
+        return cards
+
+    @staticmethod
+    async def merge_pending_ratings(cards: list[ImageCard]):
+        """Show averages with the write-behind votes not yet in the database."""
+        if settings.RATINGS_WRITE_BEHIND and cards:
+            merged = await pending_ratings.averages([card.id for card in cards])
+            for card in cards:
+                card.average_rating = merged.get(card.id, card.average_rating)
+
+    async def get_image_cards_by_ids(
+            self,
+            image_ids: list[int],
+            session: AsyncSession
+    ) -> list[ImageCard]:
+        """Cards of the given images in one query, in no particular order."""
+        if not image_ids:
+            return []
+        stmt = self._image_cards_query(session).where(Image.id.in_(image_ids))
+        return await self._fetch_image_cards(stmt, session)
+
+    async def get_latest_image_ids(
+            self,
+            session: AsyncSession,
+            user_id: int | None = None,
+            before_id: int | None = None,
+            limit: int = 20
+    ) -> list[int]:
+        """Ids of the newest images, optionally of one owner and below `before_id`."""
+        stmt = select(Image.id).order_by(desc(Image.id)).limit(limit)
+        if user_id is not None:
+            stmt = stmt.where(Image.user_id == user_id)
+        if before_id is not None:
+            stmt = stmt.where(Image.id < before_id)
+        result = await session.execute(stmt)
+        return list(result.scalars().all())
+
     async def get_images_by_user_id(
             self,
             user_id: int, 
@@ -292,10 +873,10 @@ class ImageCrud(CrudTags):
             session: Database session.
 
         Returns:
-            List of Image objects.
+            List of ImageCard rows.
         """
-        result = await session.execute(select(Image).where(Image.user_id == user_id))
-        return result.scalars().all()
+        stmt = self._image_cards_query(session).where(Image.user_id == user_id)
+        return await self._fetch_image_cards(stmt, session)
     
     async def create_transformed_images(
             self, 
@@ -340,36 +921,74 @@ class ImageCrud(CrudTags):
             query: str|None = None,
             tag: str|None = None,
             order_by: str = "date",
+            limit: int|None = None,
+            cursor: str|None = None,
+            merge_pending: bool = True,
     ):
         """
         Search for images by description or tag.
         Ability to sort by rating or upload date.
+        Returns ImageCard rows. With `limit` results are paged by keyset, `cursor` is
+        the value returned by `search_cursor` for the previous page. Build
+        that cursor before `merge_pending_ratings`: keyset pages compare
+        with the stored average, not the merged one.
         """
         try:
-            stmt = select(Image)
+            stmt = self._image_cards_query(session)
 
             if query: # filter by key_word description
                 stmt = stmt.filter(Image.description.ilike(f"%{query}%"))
 
-            if tag: # filter by tag
-                stmt = stmt.join(Image.tags).filter(Tag.name == tag)
+            if tag: # filter by tag, the aggregate still lists every tag
+                stmt = stmt.filter(
+                    exists()
+                    .where(image_tag_association.c.image_id == Image.id)
+                    .where(image_tag_association.c.tag_id == Tag.id)
+                    .where(Tag.name == tag)
+                )
 
-            if order_by == "rating":
-                stmt = stmt.order_by(desc(Image.average_rating))
-            else:
-                stmt = stmt.order_by(desc(Image.created_at))
+            sort_column = self._search_sort_column(order_by)
+            if cursor:
+                value, last_id = decode_cursor(cursor, size=2)
+                if not isinstance(last_id, int):
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail='Invalid cursor'
+                    )
+                if order_by != "rating":
+                    value = parse_cursor_datetime(value)
+                stmt = stmt.filter(
+                    keyset_filter(session, sort_column, Image.id, value, last_id)
+                )
 
-            result = await session.execute(stmt)
-            images = result.scalars().all()
+            stmt = stmt.order_by(desc(sort_column), desc(Image.id))
+            if limit:
+                stmt = stmt.limit(limit)
 
-            return images
+            return await self._fetch_image_cards(stmt, session, merge_pending)
     
+        except HTTPException:
+            raise
         except Exception as err:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error searching images: {str(err)}"
             )        
 
+    @staticmethod
+    def _search_sort_column(order_by: str):
+        if order_by == "rating":
+            return Image.average_rating
+        return Image.created_at
+
+    def search_cursor(self, image, order_by: str) -> str:
+        """
+        Cursor pointing right after `image` in a search sorted by `order_by`.
+        """
+        if order_by == "rating":
+            return encode_cursor(image.average_rating, image.id)
+        return encode_cursor(image.created_at, image.id)
+
     async def get_all_images(
             self, 
             session: AsyncSession
@@ -395,11 +1014,12 @@ class ImageCrud(CrudTags):
         Search images by username (available to moderators and administrators).
         """
         try:
-            result = await session.execute(
-                select(Image).join(User).filter(User.username.ilike(f"{username}"))
+            stmt = (
+                self._image_cards_query(session)
+                .join(User, User.id == Image.user_id)
+                .filter(User.username.ilike(f"{username}"))
             )
-            images = result.scalars().all()
-            return images
+            return await self._fetch_image_cards(stmt, session)
         
         except Exception as err:
             raise HTTPException(
@@ -0,0 +1,89 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from fastapi import HTTPException, status
+from sqlalchemy import and_, func, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def encode_cursor(*values) -> str:
+    """
+    Pack the sort key of the last returned row into an opaque cursor.
+    Datetimes are stored as ISO strings, callers parse them back.
+    """
+    payload = [
+        value.isoformat() if isinstance(value, datetime) else value
+        for value in values
+    ]
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(
+        cursor: str,
+        size: int,
+        detail: str = 'Invalid cursor'
+) -> list:
+    """
+    Unpack a cursor produced by `encode_cursor`.
+
+    Raises:
+        HTTPException: 400 if the cursor is malformed.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, binascii.Error, UnicodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=detail
+        )
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=detail
+        )
+    return values
+
+
+def parse_cursor_datetime(
+        value,
+        detail: str = 'Invalid cursor'
+) -> datetime:
+    """Turn the ISO string stored in a cursor back into a datetime."""
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=detail
+        )
+
+
+def keyset_filter(
+        session: AsyncSession,
+        sort_column,
+        id_column,
+        value,
+        last_id: int,
+        descending: bool = True,
+):
+    """
+    Condition selecting rows that follow (value, last_id) in the
+    (sort_column, id_column) order.
+    """
+    if isinstance(value, datetime) and session.get_bind().dialect.name == 'sqlite':
+        # sqlite keeps datetimes as text, with or without fractional seconds,
+        # so compare their numeric form instead of the strings
+        sort_column, value = func.julianday(sort_column), func.julianday(value)
+    if descending:
+        return or_(
+            sort_column < value,
+            and_(sort_column == value, id_column < last_id)
+        )
+    return or_(
+        sort_column > value,
+        and_(sort_column == value, id_column > last_id)
+    )
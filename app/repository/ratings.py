@@ -1,4 +1,9 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import AsyncIterator, Sequence
+
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import delete, insert, update
 from sqlalchemy.future import select
 from fastapi import HTTPException, status
 from app.database.models import Rating, Image
@@ -7,6 +12,31 @@ from sqlalchemy.exc import SQLAlchemyError
 from abc import ABC, abstractmethod
 
 from app.repository.images import crud_images
+from app.repository.users import crud_users
+from app.services.cache_service import cache_versions, CacheScope
+from app.services.http_cache import etag_stamps
+from app.services.feed_cache import image_card_cache
+from app.services.leaderboard_cache import leaderboard
+from app.services.rating_cache import pending_ratings
+from app.services.tracing import trace_methods
+
+@dataclass(slots=True)
+class RatingRow:
+    """A rating as written to an export."""
+    id: int
+    image_id: int
+    value: float
+    created_at: datetime
+
+
+@dataclass(slots=True)
+class PersistedVotes:
+    """Outcome of `persist_pending`: what was inserted and the image's totals after it."""
+    inserted_sum: float
+    inserted_count: int
+    total_sum: float
+    total_count: int
+
 
 class BaseRatingCrud(ABC):
 
@@ -82,6 +112,7 @@ class BaseRatingCrud(ABC):
         ...
 
 
+@trace_methods
 class RatingCrud(BaseRatingCrud):
     
     async def _update_average_rating(
@@ -99,6 +130,9 @@ class RatingCrud(BaseRatingCrud):
         session.add(image)
         await session.commit()
         await session.refresh(image)
+        await cache_versions.bump(CacheScope.ratings)
+        await etag_stamps.invalidate(('image', image_id))
+        await image_card_cache.invalidate(image_id)
 
     async def _create_rating(
         self,
@@ -179,6 +213,9 @@ class RatingCrud(BaseRatingCrud):
             value=value,
             session=session
         )
+        await leaderboard.record(
+            image_id, value, rated_at=datetime.now(timezone.utc).replace(tzinfo=None)
+        )
 
         await self._update_average_rating(
             image=image,
@@ -188,6 +225,9 @@ class RatingCrud(BaseRatingCrud):
 
         await session.commit()
         await session.refresh(image)
+        # keep the write-behind state of the image in step
+        await pending_ratings.persisted(image_id, user_id, value)
+        await crud_users.invalidate_profile_stamp(user_id, session)
 
         return {
             "message": "Rating added successfully", 
@@ -221,9 +261,13 @@ class RatingCrud(BaseRatingCrud):
         try:
             rating_object = await self._get_rating_object(rating_id, session)
             image_id = rating_object.image_id
+            user_id = rating_object.user_id
+            value, rated_at = rating_object.value, rating_object.created_at
 
             await session.delete(rating_object)
             await session.commit()
+            await leaderboard.record(image_id, value, rated_at=rated_at, votes=-1)
+            await pending_ratings.forget(image_id, user_id, value)
 
             image = await crud_images.get_image_obj(
                 image_id,
@@ -234,6 +278,7 @@ class RatingCrud(BaseRatingCrud):
                 image_id=image_id,
                 session=session
             )
+            await crud_users.invalidate_profile_stamp(user_id, session)
 
             return {
                 "message": "Rating deleted successfully"
@@ -244,4 +289,175 @@ class RatingCrud(BaseRatingCrud):
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=detail
             )
+    async def stream_user_ratings(
+            self,
+            user_id: int,
+            session: AsyncSession,
+            batch_size: int
+    ) -> AsyncIterator[Sequence]:
+        """
+        (id, image_id, value) rows of every rating a user gave,
+        `batch_size` at a time, through a server-side cursor.
+        """
+        result = await session.stream(
+            select(Rating.id, Rating.image_id, Rating.value)
+            .filter(Rating.user_id == user_id)
+            .order_by(Rating.id)
+            .execution_options(yield_per=batch_size)
+        )
+        async for rows in result.partitions():
+            yield rows
+
+    async def export_ratings(
+            self,
+            user_id: int,
+            session: AsyncSession,
+            after_id: int = 0,
+            batch_size: int = 500
+    ) -> AsyncIterator[list[RatingRow]]:
+        """
+        Ratings a user gave with an id above `after_id`, in id order,
+        `batch_size` at a time through a server-side cursor.
+        """
+        result = await session.stream(
+            select(Rating.id, Rating.image_id, Rating.value, Rating.created_at)
+            .filter(Rating.user_id == user_id, Rating.id > after_id)
+            .order_by(Rating.id)
+            .execution_options(yield_per=batch_size)
+        )
+        async for rows in result.partitions():
+            yield [RatingRow(*row) for row in rows]
+
+    async def delete_ratings(
+            self,
+            rating_ids: list[int],
+            image_ids: list[int],
+            session: AsyncSession
+    ) -> int:
+        """
+        Delete ratings in one statement and recompute the average of their
+        images in another, without committing.
+
+        Returns:
+            int: number of ratings deleted.
+        """
+        if not rating_ids:
+            return 0
+        result = await session.execute(
+            delete(Rating).where(Rating.id.in_(rating_ids)),
+            execution_options={'synchronize_session': False}
+        )
+        await session.execute(
+            update(Image)
+            .where(Image.id.in_(image_ids))
+            .values(average_rating=func.coalesce(
+                select(func.avg(Rating.value))
+                .where(Rating.image_id == Image.id)
+                .correlate(Image)
+                .scalar_subquery(),
+                0.0
+            ))
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount
+
+    async def get_rating_totals(
+            self,
+            session: AsyncSession,
+            since: datetime | None = None
+    ) -> list[tuple[int, float, int]]:
+        """
+        (image_id, sum of values, number of votes) of every rated image,
+        counting only ratings created after `since` when it is given.
+        """
+        stmt = select(
+            Rating.image_id, func.sum(Rating.value), func.count(Rating.id)
+        ).filter(Rating.image_id.is_not(None)).group_by(Rating.image_id)
+        if since is not None:
+            stmt = stmt.filter(Rating.created_at >= since)
+        result = await session.execute(stmt)
+        return [(image_id, float(total), count) for image_id, total, count in result]
+
+    async def get_top_rated(
+            self,
+            session: AsyncSession,
+            limit: int,
+            min_votes: int,
+            since: datetime | None = None
+    ) -> list[tuple[int, float, int]]:
+        """
+        Database version of the leaderboard: (image_id, average, votes),
+        best average first.
+        """
+        average = func.avg(Rating.value)
+        votes = func.count(Rating.id)
+        stmt = (
+            select(Rating.image_id, average, votes)
+            .filter(Rating.image_id.is_not(None))
+            .group_by(Rating.image_id)
+            .having(votes >= min_votes)
+            .order_by(average.desc(), Rating.image_id.desc())
+            .limit(limit)
+        )
+        if since is not None:
+            stmt = stmt.filter(Rating.created_at >= since)
+        result = await session.execute(stmt)
+        return [(image_id, float(avg), count) for image_id, avg, count in result]
+
+    async def get_votes(
+            self,
+            image_id: int,
+            session: AsyncSession
+    ) -> tuple[list[int], float, int]:
+        """(user ids, sum of values, number of ratings) of an image."""
+        result = await session.execute(
+            select(Rating.user_id, Rating.value).filter(Rating.image_id == image_id)
+        )
+        rows = result.all()
+        return [user_id for user_id, _ in rows], float(sum(v for _, v in rows)), len(rows)
+
+    async def persist_pending(
+            self,
+            image_id: int,
+            votes: dict[int, int],
+            session: AsyncSession
+    ) -> PersistedVotes:
+        """
+        Write a batch of write-behind votes and refresh the image average
+        in one transaction. Users that already have a row are skipped, so
+        a batch written twice after a crash is only inserted once.
+        """
+        if not await session.get(Image, image_id):
+            return PersistedVotes(0.0, 0, 0.0, 0)
+        existing = set((await session.execute(
+            select(Rating.user_id)
+            .filter(Rating.image_id == image_id, Rating.user_id.in_(votes))
+        )).scalars().all())
+        rows = [
+            {'image_id': image_id, 'user_id': user_id, 'value': value}
+            for user_id, value in votes.items()
+            if user_id not in existing
+        ]
+        if rows:
+            await session.execute(insert(Rating), rows)
+            await session.execute(
+                update(Image)
+                .where(Image.id == image_id)
+                .values(average_rating=(
+                    select(func.avg(Rating.value))
+                    .where(Rating.image_id == image_id)
+                    .scalar_subquery()
+                ))
+                .execution_options(synchronize_session=False)
+            )
+        total_sum, total_count = (await session.execute(
+            select(func.coalesce(func.sum(Rating.value), 0), func.count(Rating.id))
+            .filter(Rating.image_id == image_id)
+        )).one()
+        await session.commit()
+        return PersistedVotes(
+            float(sum(row['value'] for row in rows)), len(rows),
+            float(total_sum), int(total_count)
+        )
+
 crud_ratings = RatingCrud()
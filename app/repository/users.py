@@ -1,5 +1,6 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import func, select, distinct
+from sqlalchemy.orm import raiseload
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime
 from typing import Optional
@@ -7,9 +8,12 @@ from typing import Optional
 from app.config import RoleSet
 from app.services.security.secure_password import Hasher
 from app.database.models import Comment, Image, Rating, User
+from app.services.http_cache import etag_stamps
+from app.services.tracing import trace_methods
 from fastapi import HTTPException, status
 from sqlalchemy.exc import SQLAlchemyError
 
+@trace_methods
 class UserCrud:
 
     async def exist_user(self, email: str, session: AsyncSession) -> bool:
@@ -53,10 +57,21 @@ class UserCrud:
         return new_user
 
     async def get_user_by_email(self, email:str, session:AsyncSession):
-        result = await session.execute(select(User).filter(User.email == email))
+        # runs on every authenticated request: skip the selectin cascade
+        # through images/comments/ratings, callers only read columns
+        result = await session.execute(
+            select(User).options(raiseload('*')).filter(User.email == email)
+        )
         user = result.scalars().first()
         return user
 
+    async def get_ids_by_email(self, emails: list[str], session: AsyncSession) -> dict[str, int]:
+        """Ids of the users with the given emails, unknown emails are left out"""
+        if not emails:
+            return {}
+        result = await session.execute(select(User.email, User.id).filter(User.email.in_(emails)))
+        return dict(result.all())
+
     async def get_user_by_id(self, user_id, session:AsyncSession):
         result = await session.execute(select(User).filter(User.id == user_id))
         user = result.scalar_one_or_none()
@@ -118,7 +133,8 @@ class UserCrud:
          .outerjoin(Comment, User.id == Comment.user_id)\
          .outerjoin(Rating, User.id == Rating.user_id)\
          .filter(User.username == username)\
-         .group_by(User.id)
+         .group_by(User.id)\
+         .options(raiseload('*'))
 
         result = await session.execute(query)
         user_data = result.first()
@@ -145,6 +161,21 @@ class UserCrud:
             "id": user.id
         }
 
+    async def invalidate_profile_stamp(self, user_id: int, session: AsyncSession):
+        """Drop the cached profile ETag after the user's statistics changed"""
+        result = await session.execute(select(User.username).filter(User.id == user_id))
+        username = result.scalar_one_or_none()
+        if username:
+            await etag_stamps.invalidate(('user_profile', username))
+
+    async def invalidate_profile_stamps(self, user_ids: list[int], session: AsyncSession, chunk_size: int = 1000):
+        """`invalidate_profile_stamp` for many users, one query per `chunk_size` ids"""
+        for start in range(0, len(user_ids), chunk_size):
+            result = await session.execute(
+                select(User.username).filter(User.id.in_(user_ids[start:start + chunk_size]))
+            )
+            await etag_stamps.invalidate(*[('user_profile', username) for username in result.scalars()])
+
     async def update_user_profile(
         self, 
         user_id: int, 
@@ -163,6 +194,7 @@ class UserCrud:
 
             if not user:
                 return None 
+            old_username = user.username
             
             update_data = {
                 "username": username,
@@ -178,6 +210,10 @@ class UserCrud:
                     
             await session.commit()
             await session.refresh(user)                
+            await etag_stamps.invalidate(
+                ('user_profile', old_username),
+                ('user_profile', user.username)
+            )
             return user
         
         except SQLAlchemyError as e:
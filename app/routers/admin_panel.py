@@ -1,18 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException, Path, Query, Response, status
+import asyncio
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
-from fastapi.responses import RedirectResponse
-from datetime import datetime
+from fastapi.responses import PlainTextResponse, RedirectResponse
+from fastapi.routing import APIRoute
 
 from app.database.models import User
 from app.services.security.auth_service import role_deps
 from app.repository.users import crud_users
-from app.database.connection import get_conn_db
+from app.database.connection import get_conn_db, sessionmanager
+from app.database.slow_queries import slow_query_log
 import app.schemas as sch
-from app.repository.images import crud_images
+from app.repository.images import crud_images, LastCommentSnapshot
 from app.repository.ratings import crud_ratings
+from app.services.cache_service import cache_metrics
+from app.services.search_service import image_cards_serializer
+from app.services.profiling import collapsed, profiler
+from app.services.purge_service import purge_jobs
+from app.utils.fast_json import RawJSONResponse
+from app.middleware.tracing import TracedRoute
 
-router = APIRouter(prefix='/admin_panel')
+router = APIRouter(prefix='/admin_panel', route_class=TracedRoute)
 
 @router.put(
         '/ban-user/{user_id}',
@@ -158,17 +168,7 @@ async def get_all_images_by_admin(
             detail=f"No images found for user with ID {user_id}."
         )
 
-    return [
-        sch.ImageResponseSchema(
-            id=image.id,
-            description=image.description,
-            image_url=image.image_url,
-            user_id=image.user_id,
-            created_at=image.created_at,
-            tags=[tag.name for tag in image.tags],
-        )
-        for image in images
-    ]
+    return image_cards_serializer.response(images)
 
 @router.get("/serch/by_user/", response_model=list[sch.ImageResponseSchema])
 async def search_images_by_username(
@@ -181,15 +181,7 @@ async def search_images_by_username(
     """
     images = await crud_images.search_by_user(username, session)
 
-    return [sch.ImageResponseSchema(
-        id=img.id,
-        description=img.description,
-        image_url=img.image_url,
-        user_id=img.user_id,
-        tags=[tag.name for tag in img.tags],
-        average_rating=getattr(img, 'average_rating', 0.0),
-        created_at=getattr(img, 'created_at', datetime.now())
-    ) for img in images]
+    return image_cards_serializer.response(images)
 
 @router.delete("/delete_rating/{rating_id}/")
 async def delete_rating(
@@ -202,6 +194,61 @@ async def delete_rating(
     """
     return await crud_ratings.delete_rating(rating_id, session)
 
+@router.post(
+        "/purge-user/{user_id}",
+        response_model=sch.PurgeJobResponse,
+        status_code=status.HTTP_202_ACCEPTED,
+        responses={
+            404: {"description": "User not found"},
+            409: {"description": "A purge of this user is already running"},
+        }
+)
+async def purge_user_content(
+    user_id: int = Path(..., description='ID of the user whose content is removed', gt=0),
+    session: AsyncSession = Depends(get_conn_db),
+    current_user: User = role_deps.admin_only(),
+):
+    """
+    Delete every image, comment and rating of a user in the background.
+    Ban the user first, content posted after the purge started may stay.
+    Progress is reported by `GET /purge-jobs/{job_id}`.
+    """
+    if not await crud_users.get_user_by_id(user_id, session):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='User not found'
+        )
+    if purge_jobs.active_for(user_id):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail='A purge of this user is already running'
+        )
+    return purge_jobs.start(user_id, current_user.id, sessionmanager.session)
+
+
+@router.get("/purge-jobs", response_model=list[sch.PurgeJobResponse])
+async def get_purge_jobs(
+    _: User = role_deps.admin_only(),
+):
+    """
+    Purge jobs of this process, newest first.
+    """
+    return purge_jobs.jobs()
+
+
+@router.get("/purge-jobs/{job_id}", response_model=sch.PurgeJobResponse)
+async def get_purge_job(
+    job_id: str,
+    _: User = role_deps.admin_only(),
+):
+    job = purge_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Purge job not found"
+        )
+    return job
+
 @router.delete(
         "/delete_image/{image_id}/", 
         status_code=status.HTTP_204_NO_CONTENT
@@ -301,5 +348,119 @@ async def get_image_info(
         description=image_object.description,
         image_url=image_object.image_url,
         user_id=image_object.user_id,
-        tags=[tag.name for tag in image_object.tags] 
-    )
\ No newline at end of file
+        tags=[tag.name for tag in image_object.tags],
+        comment_count=image_object.comment_count,
+        last_comment=LastCommentSnapshot.of(image_object),
+        width=image_object.width,
+        height=image_object.height
+    )
+
+@router.get("/cache-stats")
+async def get_cache_stats(
+    _: User = role_deps.admin_only(),
+):
+    """
+    Hit/miss counters of the response caches in this process.
+    """
+    return cache_metrics.snapshot()
+
+
+@router.post("/profiling/routes", response_model=sch.ProfileRouteResponse)
+async def arm_route_profiling(
+    body: sch.ProfileRouteRequest,
+    request: Request,
+    _: User = role_deps.admin_only(),
+):
+    """
+    Profile the next `count` requests to a route, whoever sends them.
+    Single requests can also be profiled by sending `X-Profile: 1` with
+    an admin token.
+    """
+    routes = {route.path for route in request.app.routes if isinstance(route, APIRoute)}
+    if body.route not in routes:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Route not found"
+        )
+    profiler.arm(body.route, body.count)
+    return {"route": body.route, "remaining": body.count}
+
+
+@router.get("/profiling/routes", response_model=list[sch.ProfileRouteResponse])
+async def get_armed_routes(
+    _: User = role_deps.admin_only(),
+):
+    return [
+        {"route": route, "remaining": remaining}
+        for route, remaining in profiler.armed.items()
+    ]
+
+
+@router.delete("/profiling/routes", status_code=status.HTTP_204_NO_CONTENT)
+async def disarm_route_profiling(
+    route: str = Query(..., description="Route template to stop profiling"),
+    _: User = role_deps.admin_only(),
+):
+    if not profiler.disarm(route):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Route is not being profiled"
+        )
+
+
+@router.get("/profiling/profiles", response_model=list[sch.ProfileInfoResponse])
+async def get_profiles(
+    _: User = role_deps.admin_only(),
+):
+    """
+    Profiles recorded by this process, newest first.
+    """
+    return profiler.profiles()
+
+
+@router.get("/profiling/profiles/{profile_id}")
+async def get_profile(
+    profile_id: str,
+    format: Literal["speedscope", "collapsed"] = Query("speedscope"),
+    _: User = role_deps.admin_only(),
+):
+    """
+    A stored profile: speedscope JSON (open it on speedscope.app) or
+    folded stacks for flamegraph.pl.
+    """
+    raw = await asyncio.to_thread(profiler.load, profile_id)
+    if raw is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found"
+        )
+    if format == "collapsed":
+        return PlainTextResponse(await asyncio.to_thread(collapsed, raw))
+    return RawJSONResponse(
+        content=raw,
+        headers={
+            "Content-Disposition": f'attachment; filename="{profile_id}.speedscope.json"'
+        }
+    )
+
+
+@router.get("/slow-queries", response_model=list[sch.SlowQueryResponse])
+async def get_slow_queries(
+    limit: int = Query(20, ge=1, le=500),
+    order: Literal["total_ms", "max_ms", "mean_ms", "calls", "slow_calls"] = Query("total_ms"),
+    _: User = role_deps.admin_only(),
+):
+    """
+    SQL statement fingerprints of this process, by total time by default.
+    Statements over SLOW_QUERY_THRESHOLD_MS carry the repository method,
+    route and parameter shape of their last slow run and, on Postgres,
+    their EXPLAIN (ANALYZE, BUFFERS) plan.
+    """
+    return slow_query_log.top(limit, order)
+
+
+@router.delete("/slow-queries", status_code=status.HTTP_204_NO_CONTENT)
+async def reset_slow_queries(
+    _: User = role_deps.admin_only(),
+):
+    slow_query_log.reset()
@@ -8,8 +8,9 @@ from app.services.security.secure_password import Hasher
 from app.services.security.auth_service import AuthService
 from app.database.connection import get_conn_db
 import app.schemas as sch
+from app.middleware.tracing import TracedRoute
 
-router = APIRouter(prefix='/auth')
+router = APIRouter(prefix='/auth', route_class=TracedRoute)
 
 @router.post(
           "/register", 
@@ -1,13 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database.connection import get_conn_db
 from app.database.models import User
-from app.repository.comments import crud_comments
+from app.repository.comments import crud_comments, AuthoredCommentRow, CommentRow
 from app.services.security.auth_service import role_deps
+from app.services.http_cache import (
+    apply_etag,
+    check_etag,
+    make_etag,
+    stamped_not_modified,
+)
+from app.config import settings
 import app.schemas as sch
+from app.utils.fast_json import TrustedRowsSerializer
+from app.middleware.tracing import TracedRoute
+
+router = APIRouter(prefix="/comments", tags=["comments"], route_class=TracedRoute)
 
-router = APIRouter(prefix="/comments", tags=["comments"])
+comment_rows_serializer = TrustedRowsSerializer(CommentRow)
+authored_comment_rows_serializer = TrustedRowsSerializer(AuthoredCommentRow)
 
 
 @router.post(
@@ -151,42 +163,77 @@ async def get_comment(
 
 @router.get(
         "/image/{image_id}/", 
-        response_model=list[sch.CommentResponse]
+        response_model=list[sch.CommentWithAuthorResponse]
     )
 async def get_comments_for_image(
     image_id: int,
+    request: Request,
+    limit: int = Query(None, ge=1, le=200, description="Page size"),
+    cursor: str = Query(None, description="Value of X-Next-Cursor from the previous page"),
+    include_author: bool = Query(False, description="Add username and avatar_url of authors"),
     _: User = role_deps.all_users(),
     session: AsyncSession = Depends(get_conn_db)
 ):
     """
-    Retrieves all comments for a specific image.
+    Retrieves comments for a specific image, oldest first,
+    `COMMENTS_PAGE_SIZE` per page unless `limit` is given.
+    The cursor of the next page is sent in the `X-Next-Cursor` header.
 
     Args:
         image_id (int): The ID of the image to retrieve comments for.
+        limit (int): Page size.
+        cursor (str): Cursor of the page to load.
+        include_author (bool): Include a minimal author summary.
         session (AsyncSession): The database session.
 
     Returns:
-        list[CommentResponse]: A list of comments for the given image.
+        list[CommentWithAuthorResponse]: A page of comments for the given image.
 
     Raises:
         HTTPException: 404 if no comments are found.
     """
-    comments = await crud_comments.get_comments_for_image(image_id, session)
+    # only the default first page has a stamp that comment writes invalidate
+    default_page = cursor is None and limit is None and not include_author
+    if default_page:
+        cached = await stamped_not_modified(request, 'image_comments', image_id)
+        if cached:
+            return cached
+
+    page_size = limit or settings.COMMENTS_PAGE_SIZE
+    comments = await crud_comments.get_comments_for_image(
+        image_id,
+        session,
+        limit=page_size,
+        cursor=cursor,
+        include_author=include_author
+    )
 
-    if not comments:
+    if not comments and cursor is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, 
             detail="No comments found for this image"
         )
 
-    return [
-        {
-            "id": comment.id,
-            "text": comment.text,
-            "created_at": comment.created_at,
-            "updated_at": comment.updated_at,
-            "user_id": comment.user_id,
-            "image_id": comment.image_id,
-        }
-        for comment in comments
-    ]
+    headers = {}
+    if len(comments) == page_size:
+        headers['X-Next-Cursor'] = crud_comments.comments_cursor(comments[-1])
+
+    if include_author:
+        response = authored_comment_rows_serializer.response(comments, headers=headers)
+        etag = make_etag(*[
+            f'{comment.id}@{comment.updated_at}@{comment.author}'
+            for comment in comments
+        ])
+    else:
+        response = comment_rows_serializer.response(comments, headers=headers)
+        etag = make_etag(*[
+            f'{comment.id}@{comment.updated_at}' for comment in comments
+        ])
+
+    if default_page:
+        unchanged = await apply_etag(request, response, 'image_comments', image_id, etag)
+    else:
+        unchanged = check_etag(request, response, etag)
+    if unchanged:
+        return unchanged
+    return response
@@ -0,0 +1,64 @@
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import RoleSet
+from app.database.connection import get_conn_db, sessionmanager
+from app.database.models import User
+from app.repository.users import crud_users
+from app.services.export_service import ExportFormat, ExportKind, export_rows
+from app.services.security.auth_service import role_deps
+from app.middleware.tracing import TracedRoute
+
+router = APIRouter(prefix='/export', route_class=TracedRoute)
+
+
+@router.get(
+    '/{kind}',
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "description": "One row per line, in id order",
+            "content": {"application/x-ndjson": {}, "text/csv": {}},
+        },
+        403: {"description": "Only admins can export other users"},
+        404: {"description": "User not found"},
+    }
+)
+async def export_user_data(
+    kind: ExportKind = Path(..., description='What to export'),
+    format: ExportFormat = Query(ExportFormat.ndjson),
+    after_id: int = Query(0, ge=0, description='Resume after the last id received'),
+    user_id: int | None = Query(None, gt=0, description='User to export, admins only'),
+    session: AsyncSession = Depends(get_conn_db),
+    current_user: User = role_deps.all_users(),
+):
+    """
+    Stream the images (with tags and average rating), comments or ratings
+    of the current user as NDJSON or CSV. Admins can export anyone with
+    `user_id`.
+
+    Rows are sent in id order while they are read, a broken download
+    continues with `after_id` set to the last id received.
+    """
+    if user_id is None or user_id == current_user.id:
+        user_id = current_user.id
+    elif current_user.role != RoleSet.admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail='Only admins can export other users'
+        )
+    elif not await crud_users.get_user_by_id(user_id, session):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='User not found'
+        )
+
+    return StreamingResponse(
+        export_rows(kind, format, user_id, after_id, sessionmanager.session),
+        media_type=format.media_type,
+        headers={
+            'Content-Disposition': f'attachment; filename="{kind.value}-{user_id}.{format.value}"',
+            'Cache-Control': 'no-store',
+        }
+    )
@@ -0,0 +1,36 @@
+from fastapi import APIRouter, Query, Depends, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.services.feed_service import feed_page
+from app.database.connection import get_conn_db
+from app.services.security.auth_service import role_deps
+from app.database.models import User
+import app.schemas as sch
+from app.middleware.tracing import TracedRoute
+
+router = APIRouter(prefix='/feed', tags=['feed'], route_class=TracedRoute)
+
+@router.get("/", response_model=list[sch.ImageResponseSchema])
+async def get_feed(
+    limit: int = Query(None, ge=1, le=100, description="Page size"),
+    cursor: str = Query(None, description="Value of X-Next-Cursor from the previous page"),
+    session: AsyncSession = Depends(get_conn_db),
+    _: User = role_deps.all_users(),
+) -> Response:
+    """
+    Latest images of all users, newest first.
+    """
+    return await feed_page(session=session, limit=limit, cursor=cursor)
+
+@router.get("/user/{user_id}/", response_model=list[sch.ImageResponseSchema])
+async def get_user_feed(
+    user_id: int,
+    limit: int = Query(None, ge=1, le=100, description="Page size"),
+    cursor: str = Query(None, description="Value of X-Next-Cursor from the previous page"),
+    session: AsyncSession = Depends(get_conn_db),
+    _: User = role_deps.all_users(),
+) -> Response:
+    """
+    Latest images of one user, newest first.
+    """
+    return await feed_page(session=session, owner_id=user_id, limit=limit, cursor=cursor)
@@ -1,4 +1,3 @@
-from datetime import datetime
 from fastapi import (
     APIRouter, 
     Body, 
@@ -7,7 +6,9 @@ from fastapi import (
     UploadFile, 
     status, 
     Depends, 
-    Query
+    Query,
+    Request,
+    Response
 )
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
@@ -18,10 +19,15 @@ from app.database.connection import get_conn_db
 from app.services.security.auth_service import role_deps
 from app.services.qrcode_service import ImageGenerator, get_image_generator
 from app.database.models import User
-from app.repository.images import crud_images
+from app.repository.images import crud_images, LastCommentSnapshot
 from app.services.image_service import CloudinaryService
+from app.services.ingest_service import image_ingest
+from app.services.search_service import cached_image_search, image_cards_serializer
+from app.services.http_cache import apply_etag, make_etag, stamped_not_modified
+from app.config import settings
+from app.middleware.tracing import TracedRoute
 
-router = APIRouter(tags=['images'])
+router = APIRouter(tags=['images'], route_class=TracedRoute)
 
 @router.post("/upload_image")
 async def upload_image_endpoint(
@@ -49,6 +55,7 @@ async def upload_image_endpoint(
             HTTPException: If Cloudinary not return `secure_url` &
             `public_id`.
             HTTPException: IF file not image.
+            HTTPException: If file is larger than MAX_UPLOAD_SIZE.
     """  
     if tags and len(tags) > 5:
         raise HTTPException(
@@ -63,6 +70,21 @@ async def upload_image_endpoint(
             detail='Invalid file type. Only JPG, PNG and GIF'
         )
 
+    too_large = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f'File is larger than {settings.MAX_UPLOAD_SIZE} bytes'
+    )
+    if file.size is not None and file.size > settings.MAX_UPLOAD_SIZE:
+        raise too_large
+    # the size is not always known up front: never read past the limit
+    data = await file.read(settings.MAX_UPLOAD_SIZE + 1)
+    if len(data) > settings.MAX_UPLOAD_SIZE:
+        raise too_large
+
+    # decoded and hashed in a worker process while the loop serves others
+    metadata = await image_ingest.extract(data)
+    await file.seek(0)
+
     upload_result = await cloudinary_service.upload_image(
         file=file, 
         folder=current_user.email
@@ -86,7 +108,8 @@ async def upload_image_endpoint(
         description=description,
         user_id=current_user.id,
         public_id=public_id,
-        session=session
+        session=session,
+        metadata=metadata
     )
     
     await crud_images._add_tag_to_image(image_object,tags_object,session)
@@ -97,7 +120,9 @@ async def upload_image_endpoint(
         image_url=image_object.image_url,
         user_id=image_object.user_id,
         created_at=image_object.created_at,
-        tags=[tag.name for tag in tags_object] 
+        tags=[tag.name for tag in tags_object],
+        width=image_object.width,
+        height=image_object.height
     )
 
 @router.delete(
@@ -170,19 +195,29 @@ async def add_tags_to_image(
         image_url=user_image.image_url,
         user_id=user_image.user_id,
         created_at=user_image.created_at,
-        tags=[tag.name for tag in user_image.tags] 
+        tags=[tag.name for tag in user_image.tags],
+        width=user_image.width,
+        height=user_image.height
     )
 
 
 @router.get('/image-info')
 async def get_image_info(
     image_id:int,
+    request: Request,
+    response: Response,
     session:AsyncSession = Depends(get_conn_db),
     current_user:User = role_deps.all_users(),
 ):
     """
     get info about image
+    Supports If-None-Match, a matching ETag is answered with 304
     """
+    cached = await stamped_not_modified(
+        request, 'image', image_id, viewer_id=current_user.id
+    )
+    if cached:
+        return cached
 
     image_object = await crud_images.get_image_obj(
         image_id=image_id,
@@ -192,6 +227,18 @@ async def get_image_info(
         image_obj=image_object, 
         current_user_id=current_user.id 
     )
+
+    tag_names = [tag.name for tag in image_object.tags]
+    unchanged = await apply_etag(
+        request,
+        response,
+        'image',
+        image_id,
+        etag=make_etag(image_object.id, image_object.updated_at, *sorted(tag_names)),
+        owner_id=image_object.user_id
+    )
+    if unchanged:
+        return unchanged
     
     return sch.ImageResponseSchema(
         id=image_object.id,
@@ -199,7 +246,11 @@ async def get_image_info(
         image_url=image_object.image_url,
         user_id=image_object.user_id,
         created_at=image_object.created_at,
-        tags=[tag.name for tag in image_object.tags] 
+        tags=tag_names,
+        comment_count=image_object.comment_count,
+        last_comment=LastCommentSnapshot.of(image_object),
+        width=image_object.width,
+        height=image_object.height
     )
 
 @router.put(
@@ -230,10 +281,18 @@ async def update_image_description(
 @router.get("/get_image/{image_id}/")
 async def get_image_by_id(
     image_id: int, 
+    request: Request,
     session: AsyncSession = Depends(get_conn_db),
     _: User = role_deps.all_users(),
 ):
     """find url by ImageId"""
+    cache_control = f'private, max-age={settings.IMAGE_REDIRECT_MAX_AGE}'
+    cached = await stamped_not_modified(
+        request, 'image_url', image_id, cache_control=cache_control
+    )
+    if cached:
+        return cached
+
     image_object= await crud_images.get_image_url(
         image_id, 
         session)
@@ -242,7 +301,16 @@ async def get_image_by_id(
             status_code=404, 
             detail="Image not found"
     )
-    return RedirectResponse(url=image_object.image_url)
+    redirect = RedirectResponse(url=image_object.image_url)
+    unchanged = await apply_etag(
+        request,
+        redirect,
+        'image_url',
+        image_id,
+        etag=make_etag(image_object.id, image_object.image_url),
+        cache_control=cache_control
+    )
+    return unchanged or redirect
 
 
 @router.post(
@@ -327,24 +395,15 @@ async def get_user_images(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="You have no images."
         )
-    return [
-        sch.ImageResponseSchema(
-            id=image.id,
-            description=image.description,
-            image_url=image.image_url,
-            user_id=image.user_id,
-            tags=[tag.name for tag in image.tags],
-            average_rating=getattr(image, 'average_rating', 0.0),
-            created_at=getattr(image, 'created_at', datetime.now())
-        )
-        for image in images
-    ]
+    return image_cards_serializer.response(images)
 
 @router.get("/search_images/", response_model=list[sch.ImageResponseSchema])
 async def search_images(
     query: str = Query(None, description="Search by description"),
     tag: str = Query(None, description="Filter by tag"),
     order_by: str = Query("date", description="Sort by 'date' or 'rating'"),
+    limit: int = Query(None, ge=1, le=100, description="Page size"),
+    cursor: str = Query(None, description="Value of X-Next-Cursor from the previous page"),
     session: AsyncSession = Depends(get_conn_db),
     _: User = role_deps.all_users(),
 ):
@@ -352,13 +411,4 @@ async def search_images(
     Search for images by description or tag.
     Ability to sort by rating or upload date.
     """
-    images = await crud_images.search_images(session ,query, tag, order_by)
-    return [sch.ImageResponseSchema(
-        id=img.id,
-        description=img.description,
-        image_url=img.image_url,
-        user_id=img.user_id,
-        tags=[tag.name for tag in img.tags],
-        average_rating=img.average_rating,
-        created_at=img.created_at
-    ) for img in images]
+    return await cached_image_search(session, query, tag, order_by, limit, cursor)
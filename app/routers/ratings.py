@@ -1,12 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.database.connection import get_conn_db
 from app.database.models import User
 from app.repository.ratings import crud_ratings
+from app.services.leaderboard_cache import LeaderboardWindow
+from app.services.leaderboard_service import top_rated
+from app.services.rating_service import accept_rating
+from app.config import settings
+import app.schemas as sch
 
 from app.services.security.auth_service import role_deps
+from app.middleware.tracing import TracedRoute
 
-router = APIRouter(tags=['ratings'])
+router = APIRouter(tags=['ratings'], route_class=TracedRoute)
 
 @router.post("/rate_image/{image_id}/")
 async def rate_image(
@@ -25,4 +31,21 @@ async def rate_image(
             detail=detail
         )
 
+    if settings.RATINGS_WRITE_BEHIND:
+        accepted = await accept_rating(image_id, current_user.id, value, session)
+        if accepted is not None:
+            return accepted
     return await crud_ratings.add_rating(image_id, current_user.id, value, session)
+
+@router.get("/leaderboard/", response_model=list[sch.LeaderboardEntry])
+async def get_leaderboard(
+    window: LeaderboardWindow = Query(LeaderboardWindow.all, description="day, week or all"),
+    limit: int = Query(10, ge=1, le=100, description="Number of images"),
+    min_votes: int = Query(None, ge=1, description="Minimum number of ratings"),
+    session: AsyncSession = Depends(get_conn_db),
+    _: User = role_deps.all_users(),
+) -> Response:
+    """
+    Top rated images of the current UTC day, ISO week or of all time.
+    """
+    return await top_rated(session, window=window, limit=limit, min_votes=min_votes)
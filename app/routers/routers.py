@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from app.routers import auth, images, comments, admin_panel, search, ratings, users
+from app.routers import auth, images, comments, admin_panel, search, ratings, users, feed, tags, export
 
 api_router = APIRouter(prefix='/app')
 
@@ -38,3 +38,17 @@ api_router.include_router(
     tags=['users']
 )
 
+api_router.include_router(
+    feed.router,
+    tags=['feed']
+)
+
+api_router.include_router(
+    tags.router,
+    tags=['tags']
+)
+
+api_router.include_router(
+    export.router,
+    tags=['export']
+)
@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.connection import get_conn_db, sessionmanager
+from app.database.models import User
+from app.repository.images import crud_images
+from app.services.security.auth_service import role_deps
+from app.services.tag_index import tag_index
+import app.schemas as sch
+from app.middleware.tracing import TracedRoute
+
+router = APIRouter(prefix='/tags', tags=['tags'], route_class=TracedRoute)
+
+@router.get("/autocomplete/", response_model=list[sch.TagSuggestion])
+async def autocomplete_tags(
+    q: str = Query(..., min_length=1, max_length=50, description="Beginning of the tag name"),
+    limit: int = Query(10, ge=1, le=50, description="Number of suggestions"),
+    session: AsyncSession = Depends(get_conn_db),
+    _: User = role_deps.all_users(),
+):
+    """
+    Suggest existing tags that start with `q`, most used first.
+    When there are not enough of them, similar names are added
+    (Postgres with pg_trgm only).
+    """
+    await crud_images.refresh_tag_index(sessionmanager.session)
+    suggestions = tag_index.suggest(q, limit)
+    if len(suggestions) < limit and len(q) >= 3:
+        seen = {name for name, _ in suggestions}
+        for name, count in await crud_images.fuzzy_tags(q, limit, session):
+            if name not in seen and len(suggestions) < limit:
+                suggestions.append((name, count))
+    return [sch.TagSuggestion(name=name, count=count) for name, count in suggestions]
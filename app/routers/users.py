@@ -1,5 +1,5 @@
 # endponint from profile users and managment
-from fastapi import APIRouter, Depends, HTTPException, status, Path, Response
+from fastapi import APIRouter, Depends, HTTPException, status, Path, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
 import logging
@@ -10,11 +10,13 @@ from app.schemas import UserProfileResponse, UserProfileEdit, UserProfileFull, U
 from app.services.security.auth_service import role_deps, AuthService
 from app.services.security.secure_password import Hasher
 from app.services.user_service import get_token_blacklist
+from app.services.http_cache import apply_etag, make_etag, stamped_not_modified
 from app.database.models import User
+from app.middleware.tracing import TracedRoute
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/users")
+router = APIRouter(prefix="/users", route_class=TracedRoute)
 
 @router.get(
     "/{username}", 
@@ -41,17 +43,33 @@ router = APIRouter(prefix="/users")
     }
 )
 async def get_user_profile(
+    request: Request,
+    response: Response,
     username: str = Path(..., min_length=3, max_length=50, pattern="^[a-zA-Z0-9_-]+$"),
     _: User = role_deps.all_users(),
     db: AsyncSession = Depends(get_conn_db)
 ):
     """Get public profile information for any user"""
+    cached = await stamped_not_modified(request, 'user_profile', username)
+    if cached:
+        return cached
+
     profile = await crud_users.get_user_profile(username, db)
     if not profile:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
+    public_fields = UserProfileResponse.model_fields
+    unchanged = await apply_etag(
+        request,
+        response,
+        'user_profile',
+        username,
+        etag=make_etag(*[f'{name}={profile[name]}' for name in public_fields])
+    )
+    if unchanged:
+        return unchanged
     return profile
 
 @router.get(
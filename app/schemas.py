@@ -141,6 +141,13 @@ class CommentResponse(BaseModel):
         from_attributes= True
     )
 
+class CommentAuthor(BaseModel):
+    username: str
+    avatar_url: Optional[str] = None
+
+class CommentWithAuthorResponse(CommentResponse):
+    author: Optional[CommentAuthor] = None
+
 Tag = Annotated[str, constr(
     min_length=1,
     max_length=50
@@ -153,6 +160,16 @@ class ImageCreate(BaseModel):
     owner_id: int
     tags: Optional[list[Tag]] = []
 
+class LastComment(BaseModel):
+    id: int
+    text: str
+    user_id: int
+    created_at: datetime
+
+    model_config = ConfigDict(
+        from_attributes=True
+    )
+
 class ImageResponseSchema(BaseModel):
     id: int
     description: str
@@ -162,10 +179,26 @@ class ImageResponseSchema(BaseModel):
     average_rating: Optional[float] = 0.0
     #created_at: datetime
     created_at: Optional[datetime] = Field(default_factory=datetime.now)
+    comment_count: int = 0
+    last_comment: Optional[LastComment] = None
+    # layout hints, null when the upload could not be decoded
+    width: Optional[int] = None
+    height: Optional[int] = None
     model_config = ConfigDict(
         from_attributes=True
     )
 
+class TagSuggestion(BaseModel):
+    name: str
+    count: int
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    image_id: int
+    average_rating: float
+    votes: int
+    image: ImageResponseSchema
+
 class ImageResponseUpdateSchema(BaseModel):
     id: int
     description: str
@@ -226,3 +259,68 @@ class RatingResponse(BaseModel):
 class UserProfileWithLogout(UserProfileFull):    
     require_logout: bool = False
     message: Optional[str] = None
+
+
+class ProfileRouteRequest(BaseModel):
+    route: str = Field(..., description="Route template, e.g. /app/search/images/")
+    count: int = Field(1, ge=1, le=100, description="Number of requests to profile")
+
+
+class ProfileRouteResponse(BaseModel):
+    route: str
+    remaining: int
+
+
+class ProfileInfoResponse(BaseModel):
+    id: str
+    method: str
+    path: str
+    route: Optional[str] = None
+    trigger: str
+    started_at: float
+    duration_ms: float
+    samples: int
+
+    model_config = ConfigDict(
+        from_attributes=True
+    )
+
+
+class PurgeJobResponse(BaseModel):
+    id: str
+    user_id: int
+    requested_by: int
+    status: str
+    images_deleted: int
+    comments_deleted: int
+    ratings_deleted: int
+    assets_queued: int
+    assets_destroyed: int
+    assets_failed: int
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+
+    model_config = ConfigDict(
+        from_attributes=True
+    )
+
+
+class SlowQueryResponse(BaseModel):
+    fingerprint: str
+    statement: str
+    calls: int
+    slow_calls: int
+    total_ms: float
+    mean_ms: float
+    max_ms: float
+    last_slow_at: Optional[float] = None
+    last_operation: Optional[str] = None
+    last_route: Optional[str] = None
+    last_parameters: Optional[str] = None
+    plan: Optional[str] = None
+
+    model_config = ConfigDict(
+        from_attributes=True
+    )
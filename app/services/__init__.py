@@ -1,2 +1,14 @@
-from app.services.security.secure_token.manager import token_manager, TokenType
-from app.services.security.auth_service import role_deps
+# re-exported lazily: the database layer imports leaf services (metrics,
+# tracing) and must not pull in auth, which depends on the database
+_EXPORTS = {
+    'token_manager': 'app.services.security.secure_token.manager',
+    'TokenType': 'app.services.security.secure_token.manager',
+    'role_deps': 'app.services.security.auth_service',
+}
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    import importlib
+    return getattr(importlib.import_module(_EXPORTS[name]), name)
@@ -0,0 +1,299 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Awaitable, Callable, Iterable
+
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+
+from app.config import settings
+from app.services.metrics import registry
+from app.services.user_service import RedisClient
+
+logger = logging.getLogger(__name__)
+
+
+class CacheScope(str, Enum):
+    """
+    Data sets that cached responses depend on.
+    Every scope has its own generation counter in redis.
+    """
+    images = 'images'
+    tags = 'tags'
+    ratings = 'ratings'
+    comments = 'comments'
+
+
+class CacheMetrics:
+    """
+    In-process counters for cache lookups, grouped by namespace.
+    """
+
+    def __init__(self):
+        self._counters: dict[str, dict[str, int]] = defaultdict(
+            lambda: defaultdict(int)
+        )
+
+    def incr(self, namespace: str, event: str, amount: int = 1):
+        self._counters[namespace][event] += amount
+
+    def snapshot(self) -> dict[str, dict]:
+        """Return counters with a computed hit ratio for every namespace."""
+        result = {}
+        for namespace, counters in self._counters.items():
+            hits = counters.get('hits', 0)
+            lookups = hits + counters.get('misses', 0)
+            result[namespace] = {
+                **counters,
+                'hit_ratio': round(hits / lookups, 4) if lookups else 0.0
+            }
+        return result
+
+    def reset(self):
+        self._counters.clear()
+
+
+@dataclass
+class CachedResponse:
+    """
+    Pre-serialized response body plus the headers that belong to it.
+    """
+    body: bytes
+    headers: dict[str, str] = field(default_factory=dict)
+
+    def pack(self) -> str:
+        # body is JSON without raw newlines, so the first line holds the headers
+        return json.dumps(self.headers) + '\n' + self.body.decode('utf-8')
+
+    @classmethod
+    def unpack(cls, raw: str | bytes) -> 'CachedResponse':
+        if isinstance(raw, bytes):
+            raw = raw.decode('utf-8')
+        headers, _, body = raw.partition('\n')
+        return cls(body=body.encode('utf-8'), headers=json.loads(headers))
+
+
+class RedisCache:
+    """
+    Base class for redis backed caches.
+    Redis errors never break a request: the cache is skipped for
+    `CACHE_RETRY_AFTER` seconds and the caller falls back to the database.
+    """
+
+    def __init__(self, redis_client: RedisClient):
+        self.redis_client = redis_client
+        self._retry_at = 0.0
+
+    def _key(self, *parts) -> str:
+        return ':'.join([settings.CACHE_PREFIX, *map(str, parts)])
+
+    async def _get_client(self) -> redis.Redis | None:
+        if not settings.CACHE_ENABLED or time.monotonic() < self._retry_at:
+            return None
+        return await self.redis_client.get_redis_client()
+
+    def _disable_for_a_while(self, err: Exception):
+        self._retry_at = time.monotonic() + settings.CACHE_RETRY_AFTER
+        logger.warning(f'Redis cache unavailable: {str(err)}')
+
+
+class CacheVersions(RedisCache):
+    """
+    Generation counters used for invalidation.
+    Cache keys embed the current generations, so bumping a counter makes
+    every dependent entry unreachable without scanning keys.
+    """
+
+    async def current(self, *scopes: CacheScope) -> list[int] | None:
+        client = await self._get_client()
+        if client is None:
+            return None
+        try:
+            values = await client.mget(
+                [self._key('gen', scope.value) for scope in scopes]
+            )
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+            return None
+        return [int(value or 0) for value in values]
+
+    async def bump(self, *scopes: CacheScope):
+        client = await self._get_client()
+        if client is None:
+            return
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                for scope in scopes:
+                    pipe.incr(self._key('gen', scope.value))
+                await pipe.execute()
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+
+
+class ResponseCache(RedisCache):
+    """
+    Cache of pre-serialized responses with single-flight protection.
+
+    Concurrent misses for the same key inside one process share a single
+    future. Across processes a short redis lock lets only one worker run
+    the producer while the others wait for the stored value.
+    """
+
+    poll_interval = 0.05
+
+    def __init__(
+            self,
+            redis_client: RedisClient,
+            versions: CacheVersions,
+            metrics: CacheMetrics
+    ):
+        super().__init__(redis_client)
+        self.versions = versions
+        self.metrics = metrics
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def make_digest(params: dict) -> str:
+        """Stable digest of already normalized request parameters."""
+        raw = json.dumps(params, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    async def get_or_set(
+            self,
+            namespace: str,
+            params: dict,
+            scopes: Iterable[CacheScope],
+            producer: Callable[[], Awaitable[CachedResponse]],
+            ttl: int,
+    ) -> tuple[CachedResponse, bool]:
+        """
+        Return a cached response or build it with `producer`.
+
+        Returns:
+            tuple: (response, True if it was served from the cache)
+        """
+        generations = await self.versions.current(*scopes)
+        client = await self._get_client()
+        if generations is None or client is None:
+            self.metrics.incr(namespace, 'bypass')
+            return await producer(), False
+
+        key = self._key(
+            'resp',
+            namespace,
+            '.'.join(map(str, generations)),
+            self.make_digest(params)
+        )
+        try:
+            raw = await client.get(key)
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+            self.metrics.incr(namespace, 'errors')
+            return await producer(), False
+
+        if raw is not None:
+            self.metrics.incr(namespace, 'hits')
+            return CachedResponse.unpack(raw), True
+
+        self.metrics.incr(namespace, 'misses')
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.metrics.incr(namespace, 'coalesced')
+            return await asyncio.shield(inflight), False
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            response = await self._fill(client, namespace, key, producer, ttl)
+            future.set_result(response)
+            return response, False
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as err:
+            future.set_exception(err)
+            # followers re-raise it, the leader must not log "never retrieved"
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _fill(
+            self,
+            client: redis.Redis,
+            namespace: str,
+            key: str,
+            producer: Callable[[], Awaitable[CachedResponse]],
+            ttl: int,
+    ) -> CachedResponse:
+        lock_key = key + ':lock'
+        token = uuid.uuid4().hex
+        try:
+            acquired = await client.set(
+                lock_key, token, nx=True, px=settings.CACHE_LOCK_TTL_MS
+            )
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+            return await producer()
+
+        if not acquired:
+            waited = await self._wait_for_value(client, key)
+            if waited is not None:
+                self.metrics.incr(namespace, 'coalesced')
+                return waited
+
+        response = await producer()
+        try:
+            await client.set(key, response.pack(), ex=ttl)
+            if acquired and await client.get(lock_key) in (token, token.encode()):
+                await client.delete(lock_key)
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+        return response
+
+    async def _wait_for_value(
+            self,
+            client: redis.Redis,
+            key: str
+    ) -> CachedResponse | None:
+        """Poll for a value another worker is computing, up to the lock ttl."""
+        deadline = time.monotonic() + settings.CACHE_LOCK_TTL_MS / 1000
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                raw = await client.get(key)
+            except (RedisError, OSError) as err:
+                self._disable_for_a_while(err)
+                return None
+            if raw is not None:
+                return CachedResponse.unpack(raw)
+        return None
+
+
+cache_redis_client = RedisClient(socket_timeout=settings.CACHE_SOCKET_TIMEOUT)
+cache_metrics = CacheMetrics()
+cache_versions = CacheVersions(cache_redis_client)
+response_cache = ResponseCache(cache_redis_client, cache_versions, cache_metrics)
+
+cache_events_total = registry.counter(
+    'cache_events_total', 'Response cache events by namespace.', ('namespace', 'event')
+)
+cache_hit_ratio = registry.gauge(
+    'cache_hit_ratio', 'Hits over lookups of the response cache.', ('namespace',)
+)
+
+
+@registry.on_scrape
+def _export_cache_metrics():
+    for namespace, counters in cache_metrics.snapshot().items():
+        for event, value in counters.items():
+            if event == 'hit_ratio':
+                cache_hit_ratio.set(value, namespace)
+            else:
+                cache_events_total.set_total(value, namespace, event)
@@ -0,0 +1,190 @@
+"""
+Redis side of the feed: timelines of image ids and serialized image cards.
+"""
+from dataclasses import dataclass
+
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+
+from app.config import settings
+from app.services.cache_service import cache_redis_client, RedisCache
+
+
+@dataclass
+class FeedPage:
+    ready: bool
+    ids: list[int]
+    # older ids were trimmed away, pages past the tail come from the database
+    truncated: bool
+
+
+class FeedTimeline(RedisCache):
+    """
+    Newest image ids in redis sorted sets, one global and one per owner.
+    The score is the image id, ids grow with upload time, so a page is a
+    ZREVRANGEBYSCORE below the cursor: O(log N + page) whatever the table size.
+    Every set is trimmed to `FEED_MAX_LENGTH`. A set only counts once the
+    `ready` marker is written by `fill`, until then ids pushed by `add`
+    may be an incomplete tail. The `trimmed` marker stays once older ids
+    were dropped, deletes shrinking the set later do not bring them back.
+    """
+
+    def _feed_key(self, owner_id: int | None) -> str:
+        if owner_id is None:
+            return self._key('feed', 'global')
+        return self._key('feed', 'user', owner_id)
+
+    async def _trimmed(self, client: redis.Redis, entries: dict[str, dict[str, int]]):
+        async with client.pipeline(transaction=False) as pipe:
+            for key, members in entries.items():
+                pipe.zadd(key, members)
+                pipe.zremrangebyrank(key, 0, -settings.FEED_MAX_LENGTH - 1)
+            removed = (await pipe.execute())[1::2]
+        trimmed = [key for key, count in zip(entries, removed) if count]
+        if trimmed:
+            await self._mark_trimmed(client, trimmed)
+
+    async def _mark_trimmed(self, client: redis.Redis, keys: list[str]):
+        async with client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.set(key + ':trimmed', 1)
+            await pipe.execute()
+
+    async def add(self, image_id: int, owner_id: int):
+        client = await self._get_client()
+        if client is None:
+            return
+        members = {str(image_id): image_id}
+        try:
+            await self._trimmed(client, {
+                self._feed_key(None): members,
+                self._feed_key(owner_id): members,
+            })
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+
+    async def add_many(self, image_ids_by_owner: dict[int, list[int]]):
+        """`add` for a batch of new images, one pipeline for all owners."""
+        client = await self._get_client()
+        if client is None or not image_ids_by_owner:
+            return
+        entries = {self._feed_key(None): {}}
+        for owner_id, image_ids in image_ids_by_owner.items():
+            members = {str(image_id): image_id for image_id in image_ids}
+            entries[self._feed_key(None)].update(members)
+            entries[self._feed_key(owner_id)] = members
+        try:
+            await self._trimmed(client, entries)
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+
+    async def remove(self, image_id: int, owner_id: int):
+        await self.remove_many([image_id], owner_id)
+
+    async def remove_many(self, image_ids: list[int], owner_id: int):
+        client = await self._get_client()
+        if client is None or not image_ids:
+            return
+        members = [str(image_id) for image_id in image_ids]
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.zrem(self._feed_key(None), *members)
+                pipe.zrem(self._feed_key(owner_id), *members)
+                await pipe.execute()
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+
+    async def fill(self, owner_id: int | None, image_ids: list[int]):
+        """Load the newest ids from the database and mark the feed ready."""
+        client = await self._get_client()
+        if client is None:
+            return
+        key = self._feed_key(owner_id)
+        try:
+            if image_ids:
+                await self._trimmed(
+                    client, {key: {str(image_id): image_id for image_id in image_ids}}
+                )
+            if len(image_ids) >= settings.FEED_MAX_LENGTH:
+                # the database may hold older ids than the ones loaded
+                await self._mark_trimmed(client, [key])
+            await client.set(key + ':ready', 1)
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+
+    async def page(
+            self,
+            owner_id: int | None,
+            limit: int,
+            before_id: int | None = None
+    ) -> FeedPage | None:
+        """
+        Ids of the next page, newest first.
+
+        Returns:
+            FeedPage | None: None when redis is unavailable.
+        """
+        client = await self._get_client()
+        if client is None:
+            return None
+        key = self._feed_key(owner_id)
+        upper = '+inf' if before_id is None else f'({before_id}'
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.exists(key + ':ready')
+                pipe.zrevrangebyscore(key, upper, '-inf', start=0, num=limit)
+                pipe.exists(key + ':trimmed')
+                ready, ids, trimmed = await pipe.execute()
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+            return None
+        return FeedPage(ready=bool(ready), ids=[int(i) for i in ids], truncated=bool(trimmed))
+
+
+class ImageCardCache(RedisCache):
+    """
+    Serialized image cards by id, so feed pages are hydrated with one MGET.
+    Writers drop the card together with the ('image', id) ETag stamp.
+    """
+
+    async def get_many(self, image_ids: list[int]) -> dict[int, bytes]:
+        client = await self._get_client()
+        if client is None or not image_ids:
+            return {}
+        try:
+            values = await client.mget(
+                [self._key('card', image_id) for image_id in image_ids]
+            )
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+            return {}
+        return {
+            image_id: value.encode('utf-8') if isinstance(value, str) else value
+            for image_id, value in zip(image_ids, values)
+            if value is not None
+        }
+
+    async def set_many(self, cards: dict[int, bytes]):
+        client = await self._get_client()
+        if client is None or not cards:
+            return
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                for image_id, body in cards.items():
+                    pipe.set(self._key('card', image_id), body, ex=settings.FEED_CARD_TTL)
+                await pipe.execute()
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+
+    async def invalidate(self, *image_ids: int):
+        client = await self._get_client()
+        if client is None or not image_ids:
+            return
+        try:
+            await client.delete(*[self._key('card', image_id) for image_id in image_ids])
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+
+
+feed_timeline = FeedTimeline(cache_redis_client)
+image_card_cache = ImageCardCache(cache_redis_client)
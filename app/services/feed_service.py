@@ -0,0 +1,102 @@
+from fastapi import HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.repository.images import crud_images
+from app.repository.pagination import decode_cursor, encode_cursor
+from app.services.feed_cache import feed_timeline, image_card_cache
+from app.services.search_service import image_cards_serializer
+from app.utils.fast_json import RawJSONResponse
+
+
+def _decode_feed_cursor(cursor: str | None) -> int | None:
+    if not cursor:
+        return None
+    (before_id,) = decode_cursor(cursor, size=1)
+    if not isinstance(before_id, int):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='Invalid cursor'
+        )
+    return before_id
+
+
+async def _feed_ids(
+        session: AsyncSession,
+        owner_id: int | None,
+        limit: int,
+        before_id: int | None
+) -> list[int]:
+    """
+    Ids of one feed page, from redis when the timeline is there.
+
+    A cold timeline is filled with the newest `FEED_MAX_LENGTH` ids,
+    pages past the trimmed end are read from the database.
+    """
+    page = await feed_timeline.page(owner_id, limit, before_id)
+    if page is None:
+        return await crud_images.get_latest_image_ids(
+            session, user_id=owner_id, before_id=before_id, limit=limit
+        )
+
+    if not page.ready:
+        latest = await crud_images.get_latest_image_ids(
+            session, user_id=owner_id, limit=settings.FEED_MAX_LENGTH
+        )
+        await feed_timeline.fill(owner_id, latest)
+        ids = [i for i in latest if before_id is None or i < before_id][:limit]
+        truncated = len(latest) >= settings.FEED_MAX_LENGTH
+    else:
+        ids = page.ids
+        truncated = page.truncated
+
+    if len(ids) < limit and truncated:
+        ids += await crud_images.get_latest_image_ids(
+            session,
+            user_id=owner_id,
+            before_id=ids[-1] if ids else before_id,
+            limit=limit - len(ids)
+        )
+    return ids
+
+
+async def hydrate_image_cards(
+        session: AsyncSession,
+        image_ids: list[int]
+) -> dict[int, bytes]:
+    """
+    Serialized cards by image id, missing ones loaded in a single query.
+    Images deleted after their id was read are simply absent.
+    """
+    cached = await image_card_cache.get_many(image_ids)
+    missing = [image_id for image_id in image_ids if image_id not in cached]
+    if missing:
+        loaded = {
+            card.id: image_cards_serializer.dump_one(card)
+            for card in await crud_images.get_image_cards_by_ids(missing, session)
+        }
+        await image_card_cache.set_many(loaded)
+        cached.update(loaded)
+    return cached
+
+
+async def feed_page(
+        session: AsyncSession,
+        owner_id: int | None = None,
+        limit: int | None = None,
+        cursor: str | None = None,
+) -> RawJSONResponse:
+    """
+    Newest images first, of everybody or of one owner.
+    The next page cursor travels in the `X-Next-Cursor` header.
+    """
+    limit = limit or settings.FEED_PAGE_SIZE
+    ids = await _feed_ids(session, owner_id, limit, _decode_feed_cursor(cursor))
+    headers = {}
+    if len(ids) == limit:
+        headers['X-Next-Cursor'] = encode_cursor(ids[-1])
+    cards = await hydrate_image_cards(session, ids)
+    return RawJSONResponse(
+        content=image_cards_serializer.join([cards[i] for i in ids if i in cards]),
+        headers=headers
+    )
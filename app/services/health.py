@@ -0,0 +1,104 @@
+"""
+Readiness checks for load balancer probes.
+
+The dependency checks run in parallel, each bounded by
+`READINESS_TIMEOUT`, and the outcome is cached for `READINESS_CACHE_TTL`
+seconds. Probes arriving while a check is running wait for that run
+instead of starting their own, so the probe rate never reaches Postgres.
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+from sqlalchemy import text
+
+from app.config import settings
+from app.database.connection import sessionmanager
+from app.services.cache_service import cache_redis_client
+
+Check = Callable[[], Awaitable[dict | None]]
+
+
+class ReadinessProbe:
+
+    def __init__(self, ttl: float, timeout: float, required: list[str]):
+        self.ttl = ttl
+        self.timeout = timeout
+        self.required = required
+        self.checks: dict[str, Check] = {}
+        self._result: dict | None = None
+        self._expires_at = 0.0
+        self._pending: asyncio.Task | None = None
+
+    def register(self, name: str):
+        """Add a check; it raises on failure and may return details."""
+        def decorator(check: Check) -> Check:
+            self.checks[name] = check
+            return check
+        return decorator
+
+    def invalidate(self):
+        self._result = None
+
+    async def status(self) -> dict:
+        if self._result is not None and time.monotonic() < self._expires_at:
+            return self._result
+        if self._pending is None:
+            self._pending = asyncio.create_task(self._run_checks())
+        # a cancelled probe must not cancel the run the others wait for
+        return await asyncio.shield(self._pending)
+
+    async def _run_checks(self) -> dict:
+        try:
+            names = list(self.checks)
+            outcomes = await asyncio.gather(*(self._run(self.checks[name]) for name in names))
+            checks = dict(zip(names, outcomes))
+            if any(not checks[name]['ok'] for name in self.required if name in checks):
+                status = 'unavailable'
+            elif all(outcome['ok'] for outcome in outcomes):
+                status = 'ready'
+            else:
+                status = 'degraded'
+            self._result = {'status': status, 'checked_at': time.time(), 'checks': checks}
+            self._expires_at = time.monotonic() + self.ttl
+            return self._result
+        finally:
+            self._pending = None
+
+    async def _run(self, check: Check) -> dict:
+        started = time.perf_counter()
+        try:
+            details = await asyncio.wait_for(check(), self.timeout)
+        except Exception as err:
+            # the endpoint is public: the exception type only, no hosts
+            return {'ok': False, 'error': type(err).__name__}
+        outcome = {'ok': True, 'latency_ms': round((time.perf_counter() - started) * 1000, 2)}
+        if details:
+            outcome.update(details)
+        return outcome
+
+
+readiness = ReadinessProbe(
+    settings.READINESS_CACHE_TTL, settings.READINESS_TIMEOUT, settings.READINESS_REQUIRED
+)
+
+
+@readiness.register('database')
+async def check_database():
+    async with sessionmanager.session() as session:
+        await session.execute(text('SELECT 1'))
+    return {'pool': sessionmanager.pool_status()}
+
+
+@readiness.register('redis')
+async def check_redis():
+    client = await cache_redis_client.get_redis_client()
+    await client.ping()
+
+
+@readiness.register('storage')
+async def check_storage():
+    """DNS and a TCP connection to the Cloudinary API; the Admin API is rate limited."""
+    _, writer = await asyncio.open_connection(settings.READINESS_STORAGE_HOST, 443)
+    writer.close()
+    await writer.wait_closed()
@@ -0,0 +1,203 @@
+import hashlib
+from dataclasses import dataclass
+
+from fastapi import Request, Response, status
+from redis.exceptions import RedisError
+
+from app.config import settings
+from app.services.cache_service import cache_redis_client, RedisCache
+
+# authenticated JSON: may be stored by the client, but revalidated every time
+REVALIDATE = 'private, no-cache'
+
+
+@dataclass
+class VersionStamp:
+    etag: str
+    owner_id: int | None = None
+
+
+class VersionStamps(RedisCache):
+    """
+    Last known ETag of a resource, so conditional requests can be
+    answered with 304 without loading the entity.
+
+    Every resource has a generation counter that writers bump when they
+    drop the stamp. Readers take the generation before loading the entity
+    and store it with the fresh stamp; a stamp is only used while its
+    generation is current, so a load that raced a writer never leaves a
+    stale stamp behind.
+    """
+
+    def _keys(self, resource: str, key) -> tuple[str, str]:
+        return self._key('etag', resource, key), self._key('etag_gen', resource, key)
+
+    async def lookup(self, resource: str, key) -> tuple[VersionStamp | None, int | None]:
+        """
+        Current stamp of a resource and its generation, in one round trip.
+
+        Returns:
+            tuple: (stamp or None, generation to pass to `set`, None when redis is down)
+        """
+        client = await self._get_client()
+        if client is None:
+            return None, None
+        try:
+            raw, generation = await client.mget(self._keys(resource, key))
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+            return None, None
+        generation = int(generation or 0)
+        if raw is None:
+            return None, generation
+        if isinstance(raw, bytes):
+            raw = raw.decode('utf-8')
+        parts = raw.split(' ', 2)
+        if len(parts) != 3 or parts[0] != str(generation):
+            return None, generation
+        _, owner_id, etag = parts
+        return VersionStamp(etag=etag, owner_id=int(owner_id) if owner_id else None), generation
+
+    async def set(self, resource: str, key, stamp: VersionStamp, generation: int):
+        """Store a stamp built from an entity loaded after `lookup` returned `generation`."""
+        client = await self._get_client()
+        if client is None:
+            return
+        stamp_key, generation_key = self._keys(resource, key)
+        owner_id = '' if stamp.owner_id is None else str(stamp.owner_id)
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.set(stamp_key, f'{generation} {owner_id} {stamp.etag}', ex=settings.ETAG_STAMP_TTL)
+                # the counter outlives the stamps of its generation
+                pipe.expire(generation_key, 2 * settings.ETAG_STAMP_TTL)
+                await pipe.execute()
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+
+    async def invalidate(self, *resources: tuple[str, object]):
+        """Bump the generation and drop stamps given as (resource, key) pairs in one round trip."""
+        client = await self._get_client()
+        if client is None or not resources:
+            return
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                for resource, key in resources:
+                    stamp_key, generation_key = self._keys(resource, key)
+                    pipe.incr(generation_key)
+                    pipe.expire(generation_key, 2 * settings.ETAG_STAMP_TTL)
+                    pipe.delete(stamp_key)
+                await pipe.execute()
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+
+
+etag_stamps = VersionStamps(cache_redis_client)
+
+
+def make_etag(*parts) -> str:
+    """Strong ETag built from the values that define a representation."""
+    raw = '\x1f'.join(map(str, parts))
+    return '"' + hashlib.blake2b(raw.encode('utf-8'), digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Check an If-None-Match header against a strong ETag.
+    Weak validators compare equal, as RFC 9110 requires for GET.
+    """
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def not_modified(etag: str, cache_control: str = REVALIDATE) -> Response:
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers={'ETag': etag, 'Cache-Control': cache_control}
+    )
+
+
+def _generations(request: Request) -> dict[tuple[str, object], int | None]:
+    generations = getattr(request.state, 'etag_generations', None)
+    if generations is None:
+        generations = request.state.etag_generations = {}
+    return generations
+
+
+async def stamped_not_modified(
+        request: Request,
+        resource: str,
+        key,
+        viewer_id: int | None = None,
+        cache_control: str = REVALIDATE,
+) -> Response | None:
+    """
+    Answer 304 from the stamp stored in redis, before touching the database.
+
+    When the stamp carries an owner, only that user may get the 304,
+    everyone else goes through the normal permission checks.
+    """
+    stamp, generation = await etag_stamps.lookup(resource, key)
+    # read before the entity is loaded, `apply_etag` stores the stamp with it
+    _generations(request)[resource, key] = generation
+    if_none_match = request.headers.get('if-none-match')
+    if not if_none_match or stamp is None:
+        return None
+    if stamp.owner_id is not None and stamp.owner_id != viewer_id:
+        return None
+    if etag_matches(if_none_match, stamp.etag):
+        return not_modified(stamp.etag, cache_control)
+    return None
+
+
+async def apply_etag(
+        request: Request,
+        response: Response,
+        resource: str,
+        key,
+        etag: str,
+        owner_id: int | None = None,
+        cache_control: str = REVALIDATE,
+) -> Response | None:
+    """
+    Remember the ETag of a freshly loaded entity and set validator headers.
+    The stamp is only stored when `stamped_not_modified` read the
+    generation of the resource before the load.
+
+    Returns:
+        Response | None: 304 response if the client already has this version.
+    """
+    generation = _generations(request).get((resource, key))
+    if generation is not None:
+        await etag_stamps.set(
+            resource, key, VersionStamp(etag=etag, owner_id=owner_id), generation
+        )
+    return check_etag(request, response, etag, cache_control)
+
+
+def check_etag(
+        request: Request,
+        response: Response,
+        etag: str,
+        cache_control: str = REVALIDATE,
+) -> Response | None:
+    """
+    Set validator headers without storing a stamp, for representations
+    that writers cannot invalidate one by one (pages, optional fields).
+
+    Returns:
+        Response | None: 304 response if the client already has this version.
+    """
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return not_modified(etag, cache_control)
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = cache_control
+    return None
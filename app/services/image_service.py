@@ -1,14 +1,26 @@
+import asyncio
+import logging
+
 import cloudinary  
 import cloudinary.uploader  
 import cloudinary.api 
 import cloudinary.exceptions 
 import cloudinary.utils
 from fastapi import HTTPException, UploadFile, status
+from redis.exceptions import RedisError
 from abc import ABC, abstractmethod
 
 from app.config import settings
+from app.services.cache_service import cache_redis_client, RedisCache
+from app.services.metrics import cloudinary_metrics
+from app.services.tracing import tracer
 from app.database.models import Image
 
+logger = logging.getLogger(__name__)
+
+# public ids per Admin API delete_resources call
+CLOUDINARY_DELETE_LIMIT = 100
+
 class Transformation:
     """
     Base class for tarnsformation
@@ -157,7 +169,8 @@ class CloudinaryService(IcloudinaryService):
                 Detail includes specific error message from Cloudinary.
         """
         try:
-            result = cloudinary.uploader.upload(file.file, folder=folder)
+            with cloudinary_metrics.time('upload'), tracer.span('cloudinary upload'):
+                result = cloudinary.uploader.upload(file.file, folder=folder)
             return {
                 "secure_url": result.get("secure_url"),
                 "public_id": result.get("public_id"),
@@ -212,11 +225,12 @@ class CloudinaryService(IcloudinaryService):
                     grayscale=grayscale
                 )
 
-                transformed_image = cloudinary.uploader.explicit(
-                image.public_id,
-                type="upload",
-                eager=[transformation_params]      
-                )
+                with cloudinary_metrics.time('explicit'), tracer.span('cloudinary explicit'):
+                    transformed_image = cloudinary.uploader.explicit(
+                    image.public_id,
+                    type="upload",
+                    eager=[transformation_params]      
+                    )
             eager_transformations = transformed_image.get("eager", [])
             transformed_url = eager_transformations[0].get("secure_url") if eager_transformations else None
             
@@ -236,4 +250,171 @@ class CloudinaryService(IcloudinaryService):
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Cloudinary transformation error: {str(e)}"
-            )
\ No newline at end of file
+            )
+
+
+def destroy_assets(public_ids: list[str]):
+    """
+    Delete Cloudinary assets, `CLOUDINARY_DELETE_LIMIT` per Admin API call.
+    Blocking: run it in a thread.
+    """
+    for start in range(0, len(public_ids), CLOUDINARY_DELETE_LIMIT):
+        with cloudinary_metrics.time('delete_resources'), tracer.span('cloudinary delete_resources'):
+            cloudinary.api.delete_resources(public_ids[start:start + CLOUDINARY_DELETE_LIMIT])
+
+
+class StorageDeletions(RedisCache):
+    """
+    Public ids of Cloudinary assets whose images are already gone from
+    the database, destroyed in bulk by the storage janitor.
+
+    `take` moves ids into a processing list with RPOPLPUSH (any redis
+    version) and `ack` drops them once destroyed, so a crash in between
+    leaves them there; `requeue` puts them back when the janitor starts.
+    Destroying an asset twice is harmless.
+    """
+
+    def _queue_keys(self) -> tuple[str, str]:
+        return self._key('storage', 'deletions'), self._key('storage', 'deletions', 'processing')
+
+    async def push(self, public_ids: list[str]) -> bool:
+        """
+        Returns:
+            bool: False when redis is unavailable and the caller has to
+            destroy the assets itself.
+        """
+        if not public_ids:
+            return True
+        client = await self._get_client()
+        if client is None:
+            return False
+        try:
+            await client.rpush(self._queue_keys()[0], *public_ids)
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+            return False
+        return True
+
+    async def take(self, count: int) -> list[str]:
+        """Up to `count` queued ids, kept in the processing list until `ack`."""
+        client = await self._get_client()
+        if client is None:
+            return []
+        queue, processing = self._queue_keys()
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                for _ in range(count):
+                    pipe.rpoplpush(queue, processing)
+                public_ids = await pipe.execute()
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+            return []
+        return [public_id for public_id in public_ids if public_id is not None]
+
+    async def ack(self, public_ids: list[str]):
+        """Forget ids whose assets were destroyed."""
+        await self._settle(public_ids, requeue=False)
+
+    async def release(self, public_ids: list[str]):
+        """Queue taken ids again, e.g. after a failed call."""
+        await self._settle(public_ids, requeue=True)
+
+    async def _settle(self, public_ids: list[str], requeue: bool):
+        client = await self._get_client()
+        if client is None or not public_ids:
+            return
+        queue, processing = self._queue_keys()
+        try:
+            async with client.pipeline(transaction=True) as pipe:
+                if requeue:
+                    pipe.rpush(queue, *public_ids)
+                for public_id in public_ids:
+                    pipe.lrem(processing, 1, public_id)
+                await pipe.execute()
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+
+    async def requeue(self) -> int:
+        """
+        Move ids left in the processing list by a crashed run back to the queue.
+
+        Returns:
+            int: number of ids moved.
+        """
+        client = await self._get_client()
+        if client is None:
+            return 0
+        queue, processing = self._queue_keys()
+        moved = 0
+        try:
+            while await client.rpoplpush(processing, queue) is not None:
+                moved += 1
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+        return moved
+
+
+storage_deletions = StorageDeletions(cache_redis_client)
+
+
+class StorageJanitor:
+    """
+    Background task destroying the assets queued in `storage_deletions`
+    every `STORAGE_DELETE_INTERVAL` seconds, `STORAGE_DELETE_BATCH` public
+    ids per call. A failed batch goes back to the queue for the next run,
+    ids taken by a run that crashed are queued again on start.
+    """
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        try:
+            if moved := await storage_deletions.requeue():
+                logger.info(f'Requeued {moved} asset deletions of an interrupted run')
+        except Exception:
+            logger.exception('Requeueing storage deletions failed')
+        while True:
+            await asyncio.sleep(settings.STORAGE_DELETE_INTERVAL)
+            try:
+                await self.flush_once()
+            except Exception:
+                logger.exception('Storage deletion failed')
+
+    async def flush_once(self) -> int:
+        """
+        Destroy queued assets until the queue is empty or a call fails.
+
+        Returns:
+            int: number of assets destroyed.
+        """
+        batch_size = min(settings.STORAGE_DELETE_BATCH, CLOUDINARY_DELETE_LIMIT)
+        destroyed = 0
+        while public_ids := await storage_deletions.take(batch_size):
+            try:
+                await asyncio.to_thread(destroy_assets, public_ids)
+            except Exception:
+                # rate limited or unreachable: keep them for the next run
+                await storage_deletions.release(public_ids)
+                logger.exception(f'Could not destroy {len(public_ids)} assets')
+                break
+            await storage_deletions.ack(public_ids)
+            destroyed += len(public_ids)
+        return destroyed
+
+
+storage_janitor = StorageJanitor()
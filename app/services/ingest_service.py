@@ -0,0 +1,133 @@
+"""
+Metadata of uploaded images.
+
+Decoding and hashing are CPU bound, so they run in a process pool of
+`IMAGE_METADATA_WORKERS` workers (in a thread when it is 0) and the event
+loop only waits for the result. For every upload we keep the dimensions
+as displayed (EXIF orientation applied), the format, the EXIF orientation
+and capture time, a SHA-256 of the bytes for exact duplicates and a 64-bit
+difference hash (dHash) for near duplicates: two images are alike when
+their hashes differ in a few bits.
+
+A file Pillow cannot decode still gets its SHA-256, the other fields stay
+null. Metadata never fails an upload: if extraction raises or the pool
+breaks, the image is stored without it.
+"""
+import asyncio
+import hashlib
+import io
+import logging
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from datetime import datetime
+
+from PIL import Image as Im, ImageOps
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+EXIF_ORIENTATION = 0x0112
+EXIF_DATETIME = 0x0132
+EXIF_IFD = 0x8769
+EXIF_DATETIME_ORIGINAL = 0x9003
+# orientations 5 to 8 rotate by 90 degrees
+TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+HASH_SIZE = 8
+
+
+@dataclass(slots=True)
+class ImageMetadata:
+    content_hash: str
+    width: int | None = None
+    height: int | None = None
+    format: str | None = None
+    orientation: int | None = None
+    taken_at: datetime | None = None
+    phash: int | None = None
+
+
+def _taken_at(exif: Im.Exif) -> datetime | None:
+    value = exif.get_ifd(EXIF_IFD).get(EXIF_DATETIME_ORIGINAL) or exif.get(EXIF_DATETIME)
+    if not isinstance(value, str):
+        return None
+    try:
+        return datetime.strptime(value.strip('\x00 '), '%Y:%m:%d %H:%M:%S')
+    except ValueError:
+        return None
+
+
+def difference_hash(image: Im.Image) -> int:
+    """
+    dHash: brightness gradients of a 9x8 grayscale thumbnail, one bit per
+    neighbouring pair. Signed, so it fits a Postgres BIGINT.
+    """
+    pixels = image.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Im.Resampling.LANCZOS).tobytes()
+    value = 0
+    for row in range(HASH_SIZE):
+        for column in range(HASH_SIZE):
+            left = pixels[row * (HASH_SIZE + 1) + column]
+            value = value << 1 | (left > pixels[row * (HASH_SIZE + 1) + column + 1])
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def extract_metadata(data: bytes) -> ImageMetadata:
+    """Runs in a worker process: keep it free of app state."""
+    metadata = ImageMetadata(content_hash=hashlib.sha256(data).hexdigest())
+    try:
+        with Im.open(io.BytesIO(data)) as image:
+            width, height = image.size
+            exif = image.getexif()
+            orientation = exif.get(EXIF_ORIENTATION)
+            metadata.format = image.format
+            metadata.orientation = orientation
+            metadata.taken_at = _taken_at(exif)
+            if orientation in TRANSPOSED_ORIENTATIONS:
+                width, height = height, width
+            metadata.width, metadata.height = width, height
+            # JPEG decodes at 1/8 scale when asked: the hash needs 9x8 pixels
+            image.draft('L', (HASH_SIZE * 8, HASH_SIZE * 8))
+            metadata.phash = difference_hash(ImageOps.exif_transpose(image))
+    except (OSError, SyntaxError, ValueError, Im.DecompressionBombError) as err:
+        logger.info(f'Image metadata unavailable: {str(err)}')
+    return metadata
+
+
+class ImageIngest:
+    """Process pool for `extract_metadata`, started on the first upload."""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._pool: Executor | None = None
+
+    def _executor(self) -> Executor | None:
+        if self.workers and self._pool is None:
+            # spawn: forking a process with running threads is unsafe
+            self._pool = ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._pool
+
+    async def extract(self, data: bytes) -> ImageMetadata | None:
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor(), extract_metadata, data)
+        except BrokenProcessPool:
+            # a worker died: the next upload gets a new pool
+            logger.exception('Image metadata pool broke')
+            self.shutdown()
+            return None
+        except Exception:
+            # Pillow raises more than it documents on malformed files
+            logger.exception('Image metadata extraction failed')
+            return None
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+image_ingest = ImageIngest(settings.IMAGE_METADATA_WORKERS)
@@ -0,0 +1,309 @@
+"""
+Redis side of the leaderboards: per window buckets of rating sums and counts.
+"""
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import Awaitable, Callable
+
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+
+from app.config import settings
+from app.services.cache_service import cache_redis_client, RedisCache
+
+
+class LeaderboardWindow(str, Enum):
+    day = 'day'
+    week = 'week'
+    all = 'all'
+
+    def since(self, now: datetime) -> datetime | None:
+        """Start of the current window, UTC calendar day or ISO week."""
+        day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        if self is LeaderboardWindow.day:
+            return day
+        if self is LeaderboardWindow.week:
+            return day - timedelta(days=day.weekday())
+        return None
+
+    def bucket(self, moment: datetime) -> str:
+        if self is LeaderboardWindow.day:
+            return moment.strftime('%Y%m%d')
+        if self is LeaderboardWindow.week:
+            year, week, _ = moment.isocalendar()
+            return f'{year}w{week:02d}'
+        return 'all'
+
+    @property
+    def ttl(self) -> int | None:
+        # a bucket outlives its window a little, expired ones are never read
+        if self is LeaderboardWindow.day:
+            return 2 * 24 * 3600
+        if self is LeaderboardWindow.week:
+            return 8 * 24 * 3600
+        return None
+
+
+@dataclass
+class LeaderboardEntry:
+    image_id: int
+    average_rating: float
+    votes: int
+
+
+class Leaderboard(RedisCache):
+    """
+    Top rated images per window, maintained vote by vote.
+
+    Every window bucket keeps rating sums and counts in two hashes and a
+    sorted set of averages for images with at least `LEADERBOARD_MIN_VOTES`
+    votes, so reading the top N is a ZREVRANGE plus one HMGET.
+    Buckets are only read once `rebuild` wrote them from the database
+    (the `ready` marker). The `fresh` marker expires every
+    `LEADERBOARD_REBUILD_INTERVAL`; the bucket keeps serving while it is
+    rebuilt in the background, so no drift lasts.
+    """
+
+    def _bucket_key(self, window: LeaderboardWindow, moment: datetime) -> str:
+        return self._key('leaderboard', window.value, window.bucket(moment))
+
+    @staticmethod
+    def _apply(pipe, key: str, deltas: list[tuple[str, float, int]]):
+        """Queue the increments of (member, sum delta, count delta) on a bucket."""
+        for member, total, votes in deltas:
+            pipe.hincrbyfloat(key + ':sum', member, total)
+            pipe.hincrby(key + ':count', member, votes)
+
+    async def _refresh_averages(
+            self,
+            client: redis.Redis,
+            buckets: list[tuple[str, int | None]],
+            members: list[str],
+            totals: list
+    ):
+        """Re-rank members after `_apply`, `totals` are its replies in order."""
+        async with client.pipeline(transaction=False) as pipe:
+            index = 0
+            for key, ttl in buckets:
+                for member in members:
+                    total, count = float(totals[index]), int(totals[index + 1])
+                    index += 2
+                    if count >= settings.LEADERBOARD_MIN_VOTES:
+                        pipe.zadd(key, {member: total / count})
+                    else:
+                        pipe.zrem(key, member)
+                    if count <= 0:
+                        pipe.hdel(key + ':sum', member)
+                        pipe.hdel(key + ':count', member)
+                if ttl:
+                    for suffix in ('', ':sum', ':count'):
+                        pipe.expire(key + suffix, ttl)
+            await pipe.execute()
+
+    async def record(self, image_id: int, value: float, rated_at: datetime, votes: int = 1):
+        """Add a vote, or remove it with `votes=-1` and the same `value`."""
+        client = await self._get_client()
+        if client is None:
+            return
+        buckets = [
+            (self._bucket_key(window, rated_at), window.ttl)
+            for window in LeaderboardWindow
+        ]
+        member = str(image_id)
+        try:
+            # called after the commit: a rebuild that started later reads
+            # this vote from the database, an earlier one gets it replayed
+            rebuilds = await client.mget([key + ':rebuilding' for key, _ in buckets])
+            async with client.pipeline(transaction=True) as pipe:
+                for (key, _), token in zip(buckets, rebuilds):
+                    self._apply(pipe, key, [(member, value * votes, votes)])
+                    if token:
+                        journal = f'{key}:journal:{token}'
+                        pipe.rpush(journal, f'{member}|{value * votes}|{votes}')
+                        pipe.expire(journal, settings.LEADERBOARD_REBUILD_TIMEOUT)
+                replies = await pipe.execute()
+            totals = []
+            position = 0
+            for token in rebuilds:
+                totals.extend(replies[position:position + 2])
+                position += 4 if token else 2
+            await self._refresh_averages(client, buckets, [member], totals)
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+
+    async def remove_image(self, image_id: int, now: datetime):
+        await self.remove_images([image_id], now)
+
+    async def remove_images(self, image_ids: list[int], now: datetime):
+        client = await self._get_client()
+        if client is None or not image_ids:
+            return
+        members = [str(image_id) for image_id in image_ids]
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                for window in LeaderboardWindow:
+                    key = self._bucket_key(window, now)
+                    pipe.zrem(key, *members)
+                    pipe.hdel(key + ':sum', *members)
+                    pipe.hdel(key + ':count', *members)
+                await pipe.execute()
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+
+    async def is_due(self, window: LeaderboardWindow, now: datetime) -> bool | None:
+        """Whether the bucket should be rebuilt; None when redis is unavailable."""
+        client = await self._get_client()
+        if client is None:
+            return None
+        try:
+            return not await client.exists(self._bucket_key(window, now) + ':fresh')
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+            return None
+
+    async def rebuild(
+            self,
+            window: LeaderboardWindow,
+            now: datetime,
+            load_totals: Callable[[], Awaitable[list[tuple[int, float, int]]]]
+    ) -> bool:
+        """
+        Replace a bucket with the (image_id, sum, count) rows returned by
+        `load_totals`.
+
+        The rows go to a temporary key renamed over the bucket in one
+        transaction. Votes recorded while they are read are also written
+        to a journal and replayed on the new bucket after the swap.
+
+        Returns:
+            bool: False when redis is unavailable or another rebuild of
+            the bucket is running.
+        """
+        client = await self._get_client()
+        if client is None:
+            return False
+        key = self._bucket_key(window, now)
+        token = uuid.uuid4().hex
+        journal = f'{key}:journal:{token}'
+        try:
+            if not await client.set(
+                key + ':rebuilding', token, nx=True, ex=settings.LEADERBOARD_REBUILD_TIMEOUT
+            ):
+                return False
+            # exists from the start, so the swap can always rename it
+            await client.rpush(journal, '')
+            await client.expire(journal, settings.LEADERBOARD_REBUILD_TIMEOUT)
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+            return False
+
+        try:
+            totals = await load_totals()
+        except Exception:
+            await self._abandon_rebuild(client, key, token)
+            raise
+
+        temporary = f'{key}:tmp:{token}'
+        replay = f'{key}:replay:{token}'
+        board = {
+            str(i): s / c for i, s, c in totals if c >= settings.LEADERBOARD_MIN_VOTES
+        }
+        try:
+            async with client.pipeline(transaction=True) as pipe:
+                if totals:
+                    pipe.hset(temporary + ':sum', mapping={str(i): s for i, s, _ in totals})
+                    pipe.hset(temporary + ':count', mapping={str(i): c for i, _, c in totals})
+                if board:
+                    pipe.zadd(temporary, board)
+                await pipe.execute()
+            async with client.pipeline(transaction=True) as pipe:
+                for suffix, written in (('', board), (':sum', totals), (':count', totals)):
+                    if written:
+                        pipe.rename(temporary + suffix, key + suffix)
+                        if window.ttl:
+                            pipe.expire(key + suffix, window.ttl)
+                    else:
+                        pipe.delete(key + suffix)
+                pipe.rename(journal, replay)
+                pipe.set(key + ':ready', 1, ex=window.ttl)
+                pipe.set(key + ':fresh', 1, ex=settings.LEADERBOARD_REBUILD_INTERVAL)
+                pipe.delete(key + ':rebuilding')
+                await pipe.execute()
+            await self._replay(client, key, window.ttl, replay)
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+            return False
+        return True
+
+    async def _replay(self, client: redis.Redis, key: str, ttl: int | None, replay: str):
+        deltas: dict[str, list] = {}
+        for entry in await client.lrange(replay, 0, -1):
+            if not entry:
+                continue
+            member, total, votes = entry.split('|')
+            delta = deltas.setdefault(member, [0.0, 0])
+            delta[0] += float(total)
+            delta[1] += int(votes)
+        await client.delete(replay)
+        if not deltas:
+            return
+        async with client.pipeline(transaction=True) as pipe:
+            self._apply(pipe, key, [(m, s, c) for m, (s, c) in deltas.items()])
+            totals = await pipe.execute()
+        await self._refresh_averages(client, [(key, ttl)], list(deltas), totals)
+
+    async def _abandon_rebuild(self, client: redis.Redis, key: str, token: str):
+        try:
+            if await client.get(key + ':rebuilding') == token:
+                await client.delete(key + ':rebuilding')
+            await client.delete(f'{key}:journal:{token}')
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+
+    async def top(
+            self,
+            window: LeaderboardWindow,
+            now: datetime,
+            limit: int,
+            min_votes: int
+    ) -> list[LeaderboardEntry] | None:
+        """
+        Best averages first.
+
+        Returns:
+            list | None: None when redis is unavailable, the bucket is not
+            built, or `min_votes` filters out so many entries that finding
+            `limit` of them takes more than `LEADERBOARD_SCAN_LIMIT`.
+        """
+        client = await self._get_client()
+        if client is None:
+            return None
+        key = self._bucket_key(window, now)
+        entries: list[LeaderboardEntry] = []
+        start = 0
+        try:
+            if not await client.exists(key + ':ready'):
+                return None
+            # min_votes above the board threshold filters while scanning
+            while len(entries) < limit:
+                if start >= settings.LEADERBOARD_SCAN_LIMIT:
+                    return None
+                chunk = await client.zrevrange(
+                    key, start, start + 2 * limit - 1, withscores=True
+                )
+                if not chunk:
+                    break
+                counts = await client.hmget(key + ':count', [m for m, _ in chunk])
+                for (member, score), count in zip(chunk, counts):
+                    if int(count or 0) >= min_votes:
+                        entries.append(LeaderboardEntry(int(member), score, int(count)))
+                start += len(chunk)
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+            return None
+        return entries[:limit]
+
+
+leaderboard = Leaderboard(cache_redis_client)
@@ -0,0 +1,102 @@
+import asyncio
+import contextvars
+import json
+import logging
+from datetime import datetime, timezone
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database.connection import sessionmanager
+from app.repository.ratings import crud_ratings
+from app.services.leaderboard_cache import leaderboard, LeaderboardEntry, LeaderboardWindow
+from app.services.feed_service import hydrate_image_cards
+from app.utils.fast_json import RawJSONResponse
+
+logger = logging.getLogger(__name__)
+
+# one background rebuild per window in this process, redis keeps it to one overall
+_rebuilds: dict[LeaderboardWindow, asyncio.Task] = {}
+
+
+async def _rebuild(window: LeaderboardWindow, now: datetime):
+    since = window.since(now)
+    try:
+        async with sessionmanager.session() as session:
+            await leaderboard.rebuild(
+                window, now, lambda: crud_ratings.get_rating_totals(session, since)
+            )
+    except Exception:
+        logger.exception(f'Leaderboard rebuild of {window.value} failed')
+
+
+def _rebuild_in_background(window: LeaderboardWindow, now: datetime):
+    task = _rebuilds.get(window)
+    if task is not None and not task.done():
+        return
+    _rebuilds[window] = asyncio.get_running_loop().create_task(
+        _rebuild(window, now), context=contextvars.Context()
+    )
+
+
+async def _top_entries(
+        session: AsyncSession,
+        window: LeaderboardWindow,
+        limit: int,
+        min_votes: int,
+        now: datetime
+) -> list[LeaderboardEntry]:
+    entries = await leaderboard.top(window, now, limit, min_votes)
+    if await leaderboard.is_due(window, now):
+        # a built bucket keeps serving while it is replaced
+        _rebuild_in_background(window, now)
+    if entries is not None:
+        return entries
+
+    since = window.since(now)
+    # no bucket yet (or redis is down): the aggregate, until the rebuild lands
+    return [
+        LeaderboardEntry(image_id, average, votes)
+        for image_id, average, votes in await crud_ratings.get_top_rated(
+            session, limit, min_votes, since
+        )
+    ]
+
+
+async def rebuild_leaderboards(session: AsyncSession):
+    """Rebuild the current bucket of every window, after ratings were removed in bulk."""
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    for window in LeaderboardWindow:
+        since = window.since(now)
+        await leaderboard.rebuild(
+            window, now, lambda since=since: crud_ratings.get_rating_totals(session, since)
+        )
+
+
+async def top_rated(
+        session: AsyncSession,
+        window: LeaderboardWindow = LeaderboardWindow.all,
+        limit: int = 10,
+        min_votes: int | None = None,
+) -> RawJSONResponse:
+    """
+    Best average ratings of the window with the image cards embedded.
+    `min_votes` below `LEADERBOARD_MIN_VOTES` is raised to it.
+    """
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    min_votes = max(min_votes or 0, settings.LEADERBOARD_MIN_VOTES)
+    entries = await _top_entries(session, window, limit, min_votes, now)
+    cards = await hydrate_image_cards(session, [entry.image_id for entry in entries])
+
+    parts = []
+    for rank, entry in enumerate(
+        [entry for entry in entries if entry.image_id in cards], start=1
+    ):
+        head = json.dumps({
+            'rank': rank,
+            'image_id': entry.image_id,
+            'average_rating': round(entry.average_rating, 4),
+            'votes': entry.votes,
+        }, separators=(',', ':'))
+        parts.append(head[:-1].encode('utf-8') + b',"image":' + cards[entry.image_id] + b'}')
+    return RawJSONResponse(content=b'[' + b','.join(parts) + b']')
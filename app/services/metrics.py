@@ -0,0 +1,240 @@
+"""
+Prometheus text-format metrics without a client library.
+
+Samples live in plain dicts keyed by label tuples, so recording one is a
+dict lookup and an addition. Values owned by other components (pool
+stats, cache counters) are copied into gauges by scrape callbacks.
+"""
+import asyncio
+import bisect
+import contextlib
+import logging
+import time
+from typing import Callable, Iterator
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple, object] = {}
+
+    def clear(self):
+        self._values.clear()
+
+    def render(self) -> Iterator[str]:
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} {self.kind}'
+        yield from self._samples()
+
+    def _samples(self) -> Iterator[str]:
+        for labels, value in self._values.items():
+            yield f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def set_total(self, value: float, *labels):
+        """Copy a total counted elsewhere, from a scrape callback."""
+        self._values[labels] = value
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value: float, *labels):
+        self._values[labels] = value
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: tuple = (),
+            buckets: tuple = LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        # per-bucket counts followed by the sum, made cumulative on render
+        state = self._values.get(labels)
+        if state is None:
+            state = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def _samples(self) -> Iterator[str]:
+        for labels, state in self._values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float('inf')), state):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield (
+                    f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} '
+                    f'{cumulative}'
+                )
+            label_text = _format_labels(self.labelnames, labels)
+            yield f'{self.name}_sum{label_text} {_format_value(state[-1])}'
+            yield f'{self.name}_count{label_text} {cumulative}'
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: list[Metric] = []
+        self._callbacks: list[Callable[[], None]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: tuple = (),
+            buckets: tuple = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def on_scrape(self, callback: Callable[[], None]):
+        """Run `callback` before every render, to refresh gauges."""
+        self._callbacks.append(callback)
+        return callback
+
+    def render(self) -> str:
+        for callback in self._callbacks:
+            try:
+                callback()
+            except Exception as err:
+                logger.warning(f'Metrics callback {callback.__name__} failed: {str(err)}')
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+class OperationMetrics:
+    """Latency histogram and error counter of calls to a dependency."""
+
+    def __init__(self, prefix: str, what: str, label: str = 'operation', buckets=LATENCY_BUCKETS):
+        self.duration = registry.histogram(
+            f'{prefix}_duration_seconds', f'Latency of {what}.', (label,), buckets
+        )
+        self.errors = registry.counter(
+            f'{prefix}_errors_total', f'Failed {what}.', (label,)
+        )
+
+    @contextlib.contextmanager
+    def time(self, operation: str):
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.errors.inc(operation)
+            raise
+        finally:
+            self.duration.observe(time.perf_counter() - start, operation)
+
+
+http_requests_total = registry.counter(
+    'http_requests_total', 'HTTP responses by route template and status.',
+    ('method', 'route', 'status')
+)
+http_request_duration = registry.histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route template.',
+    ('method', 'route')
+)
+http_requests_in_flight = registry.gauge(
+    'http_requests_in_flight', 'HTTP requests being processed.'
+)
+redis_metrics = OperationMetrics('redis_command', 'redis commands', 'command', FAST_BUCKETS)
+cloudinary_metrics = OperationMetrics('cloudinary_request', 'Cloudinary API calls')
+event_loop_lag = registry.histogram(
+    'event_loop_lag_seconds', 'Delay of a timer on the event loop.', buckets=FAST_BUCKETS
+)
+event_loop_lag_last = registry.gauge(
+    'event_loop_lag_last_seconds', 'Last measured event loop delay.'
+)
+
+
+class LoopLagMonitor:
+    """
+    Sleeps `METRICS_LOOP_LAG_INTERVAL` seconds in a loop and records how
+    late it wakes up: anything blocking the loop shows up as lag.
+    """
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+
+    def start(self, interval: float):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(interval))
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    @staticmethod
+    async def _run(interval: float):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + interval
+            await asyncio.sleep(interval)
+            lag = max(loop.time() - expected, 0.0)
+            event_loop_lag.observe(lag)
+            event_loop_lag_last.set(lag)
+
+
+loop_lag_monitor = LoopLagMonitor()
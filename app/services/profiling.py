@@ -0,0 +1,212 @@
+"""
+On-demand sampling profiler for single requests.
+
+A profiled request gets a sampler thread that reads the event loop
+thread's stack every `PROFILING_INTERVAL` seconds. Only samples taken
+while the request's own task runs keep their stack; the rest (the loop
+waiting on I/O or running other requests) are counted as one `<waiting>`
+frame, so the profile adds up to the request's wall time. Work pushed to
+the threadpool shows up as waiting too.
+
+Profiles are stored in the speedscope format; folded stacks for
+flamegraph.pl are rendered from it on demand.
+"""
+import asyncio
+import json
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from app.config import settings
+
+WAITING_FRAME = '<waiting>'
+PROFILE_ID = re.compile(r'[0-9a-f]{32}')
+# the running task per loop; private, so profiles fall back to the whole
+# thread stack where it does not exist
+_current_tasks: dict | None = getattr(asyncio.tasks, '_current_tasks', None)
+
+
+@dataclass(slots=True)
+class ProfileInfo:
+    id: str
+    method: str
+    path: str
+    route: str | None
+    trigger: str
+    started_at: float
+    duration_ms: float = 0.0
+    samples: int = 0
+
+
+@dataclass(slots=True)
+class _Samples:
+    frames: list[dict] = field(default_factory=list)
+    frame_index: dict[tuple, int] = field(default_factory=dict)
+    stacks: list[list[int]] = field(default_factory=list)
+    weights: list[float] = field(default_factory=list)
+
+    def frame(self, key: tuple) -> int:
+        index = self.frame_index.get(key)
+        if index is None:
+            index = self.frame_index[key] = len(self.frames)
+            name, file, line = key
+            self.frames.append({'name': name, 'file': file, 'line': line} if file else {'name': name})
+        return index
+
+
+class RequestSampler:
+    """Samples the calling thread while the calling task runs."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples = _Samples()
+        self._stop = threading.Event()
+        self._thread_id = threading.get_ident()
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.current_task()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+        self.started = self.stopped = 0.0
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.stopped = time.perf_counter()
+
+    def _run(self):
+        last = self.started
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            self._sample(now - last)
+            last = now
+
+    def _sample(self, weight: float):
+        samples = self.samples
+        running = _current_tasks.get(self._loop) if _current_tasks is not None else self._task
+        frame = sys._current_frames().get(self._thread_id) if running is self._task else None
+        if frame is None:
+            stack = [samples.frame((WAITING_FRAME, None, None))]
+        else:
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(samples.frame((code.co_qualname, code.co_filename, code.co_firstlineno)))
+                frame = frame.f_back
+            stack.reverse()
+        samples.stacks.append(stack)
+        samples.weights.append(weight)
+
+
+def speedscope(info: ProfileInfo, samples: _Samples) -> dict:
+    total = sum(samples.weights)
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': f'{info.method} {info.path}',
+        'exporter': settings.PROJECT_NAME,
+        'shared': {'frames': samples.frames},
+        'profiles': [{
+            'type': 'sampled',
+            'name': f'{info.method} {info.route or info.path} ({info.duration_ms:.1f}ms)',
+            'unit': 'seconds',
+            'startValue': 0,
+            'endValue': total,
+            'samples': samples.stacks,
+            'weights': samples.weights,
+        }],
+    }
+
+
+def collapsed(raw: bytes) -> str:
+    """Folded stacks (`a;b;c <microseconds>`) of a speedscope document."""
+    document = json.loads(raw)
+    frames = [frame['name'] for frame in document['shared']['frames']]
+    totals: dict[str, int] = {}
+    for profile in document['profiles']:
+        for stack, weight in zip(profile['samples'], profile['weights']):
+            key = ';'.join(frames[index] for index in stack)
+            totals[key] = totals.get(key, 0) + round(weight * 1_000_000)
+    return ''.join(f'{stack} {value}\n' for stack, value in totals.items())
+
+
+class Profiler:
+    """
+    Armed routes and the stored profiles. Profile files
+    are written to `PROFILING_DIR`; only the last `PROFILING_KEEP` are
+    kept and listed.
+    """
+
+    def __init__(self, directory: Path, keep: int, interval: float):
+        self.directory = directory
+        self.interval = interval
+        self.armed: dict[str, int] = {}
+        self._profiles: deque[ProfileInfo] = deque()
+        self._keep = keep
+        self._lock = threading.Lock()
+
+    def arm(self, route: str, count: int):
+        """Profile the next `count` requests matching the route template."""
+        self.armed[route] = count
+
+    def disarm(self, route: str) -> bool:
+        return self.armed.pop(route, None) is not None
+
+    def take(self, route: str) -> bool:
+        remaining = self.armed.get(route)
+        if not remaining:
+            return False
+        if remaining == 1:
+            del self.armed[route]
+        else:
+            self.armed[route] = remaining - 1
+        return True
+
+    def start(self, method: str, path: str, trigger: str):
+        info = ProfileInfo(uuid.uuid4().hex, method, path, None, trigger, time.time())
+        sampler = RequestSampler(self.interval)
+        sampler.start()
+        return info, sampler
+
+    def finish(self, info: ProfileInfo, sampler: RequestSampler, route: str | None):
+        """Stop sampling; the caller saves the result off the event loop."""
+        sampler.stop()
+        info.route = route
+        info.duration_ms = round((sampler.stopped - sampler.started) * 1000, 3)
+        info.samples = len(sampler.samples.stacks)
+        return speedscope(info, sampler.samples)
+
+    def save(self, info: ProfileInfo, document: dict):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._path(info.id).write_text(json.dumps(document), encoding='utf-8')
+        with self._lock:
+            self._profiles.append(info)
+            while len(self._profiles) > self._keep:
+                self._path(self._profiles.popleft().id).unlink(missing_ok=True)
+
+    def profiles(self) -> list[ProfileInfo]:
+        with self._lock:
+            return list(reversed(self._profiles))
+
+    def load(self, profile_id: str) -> bytes | None:
+        """The stored speedscope JSON, None for unknown or malformed ids."""
+        if not PROFILE_ID.fullmatch(profile_id):
+            return None
+        path = self._path(profile_id)
+        if not path.is_file():
+            return None
+        return path.read_bytes()
+
+    def _path(self, profile_id: str) -> Path:
+        return self.directory / f'{profile_id}.speedscope.json'
+
+
+profiler = Profiler(
+    Path(settings.PROFILING_DIR), settings.PROFILING_KEEP, settings.PROFILING_INTERVAL
+)
@@ -0,0 +1,193 @@
+"""
+Admin purge of everything a user posted.
+
+A purge runs as a background task of this process and walks the user's
+images, then comments, then ratings, `PURGE_BATCH_SIZE` rows at a time.
+Ids are streamed through a server-side cursor on one session while every
+batch is deleted set-wise and committed on another, so memory and
+transaction size stay flat however much the user posted. Images take
+their comments, ratings and tag links with them (ON DELETE CASCADE) and
+their assets are queued for the storage janitor. Rating averages of the
+touched images are recomputed per batch, the leaderboards once at the end.
+"""
+import asyncio
+import contextvars
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import AsyncContextManager, Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.repository.comments import crud_comments
+from app.repository.images import crud_images
+from app.repository.ratings import crud_ratings
+from app.repository.users import crud_users
+from app.services.cache_service import cache_versions, CacheScope
+from app.services.http_cache import etag_stamps
+from app.services.feed_cache import image_card_cache
+from app.services.rating_cache import pending_ratings
+from app.services.image_service import destroy_assets, storage_deletions
+from app.services.leaderboard_service import rebuild_leaderboards
+
+logger = logging.getLogger(__name__)
+
+SessionFactory = Callable[[], AsyncContextManager[AsyncSession]]
+
+
+@dataclass(slots=True)
+class PurgeJob:
+    id: str
+    user_id: int
+    requested_by: int
+    status: str = 'queued'
+    images_deleted: int = 0
+    comments_deleted: int = 0
+    ratings_deleted: int = 0
+    assets_queued: int = 0
+    assets_destroyed: int = 0
+    assets_failed: int = 0
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    error: str | None = None
+
+    @property
+    def active(self) -> bool:
+        return self.status in ('queued', 'running')
+
+
+class PurgeJobs:
+    """The last `keep` purge jobs of this process and their tasks."""
+
+    def __init__(self, keep: int):
+        self.keep = keep
+        self._jobs: OrderedDict[str, PurgeJob] = OrderedDict()
+        self._tasks: set[asyncio.Task] = set()
+
+    def get(self, job_id: str) -> PurgeJob | None:
+        return self._jobs.get(job_id)
+
+    def jobs(self) -> list[PurgeJob]:
+        """Newest first."""
+        return list(reversed(self._jobs.values()))
+
+    def active_for(self, user_id: int) -> PurgeJob | None:
+        for job in self._jobs.values():
+            if job.user_id == user_id and job.active:
+                return job
+        return None
+
+    def start(self, user_id: int, requested_by: int, session_factory: SessionFactory) -> PurgeJob:
+        job = PurgeJob(uuid.uuid4().hex, user_id, requested_by)
+        self._jobs[job.id] = job
+        finished = [old for old in self._jobs.values() if not old.active]
+        for old in finished[:max(len(self._jobs) - self.keep, 0)]:
+            del self._jobs[old.id]
+        # a fresh context: the job outlives the request that started it
+        task = asyncio.get_running_loop().create_task(
+            run_purge(job, session_factory), context=contextvars.Context()
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for job in self._jobs.values():
+            # cancelled before they ever ran
+            if job.active:
+                job.status = 'failed'
+                job.error = 'Interrupted by shutdown'
+
+
+async def run_purge(job: PurgeJob, session_factory: SessionFactory):
+    job.status = 'running'
+    job.started_at = time.time()
+    logger.info(f'Purge {job.id} of user {job.user_id} started', extra={'purge_job': job.id})
+    try:
+        async with session_factory() as reader, session_factory() as writer:
+            await _purge_images(job, reader, writer)
+            await _purge_comments(job, reader, writer)
+            await _purge_ratings(job, reader, writer)
+            if job.images_deleted or job.ratings_deleted:
+                await rebuild_leaderboards(writer)
+            await crud_users.invalidate_profile_stamp(job.user_id, writer)
+    except asyncio.CancelledError:
+        job.status = 'failed'
+        job.error = 'Interrupted by shutdown'
+        raise
+    except Exception as err:
+        job.status = 'failed'
+        job.error = f'{type(err).__name__}: {str(err)}'
+        logger.exception(f'Purge {job.id} of user {job.user_id} failed', extra={'purge_job': job.id})
+    else:
+        job.status = 'done'
+        logger.info(
+            f'Purge {job.id} of user {job.user_id} done: {job.images_deleted} images, '
+            f'{job.comments_deleted} comments, {job.ratings_deleted} ratings',
+            extra={'purge_job': job.id}
+        )
+    finally:
+        job.finished_at = time.time()
+
+
+async def _purge_images(job: PurgeJob, reader: AsyncSession, writer: AsyncSession):
+    async for rows in crud_images.stream_user_images(job.user_id, reader, settings.PURGE_BATCH_SIZE):
+        image_ids = [row.id for row in rows]
+        contributors = await crud_images.get_contributor_ids(image_ids, writer)
+        tag_names = await crud_images.get_image_tag_names(image_ids, writer)
+        job.images_deleted += await crud_images.delete_image_rows(image_ids, writer)
+        await writer.commit()
+        await _queue_assets(job, [row.public_id for row in rows])
+        await crud_images.forget_deleted_images(image_ids, job.user_id, writer, tag_names)
+        await crud_users.invalidate_profile_stamps(contributors, writer)
+    # end the read transaction between phases
+    await reader.rollback()
+
+
+async def _queue_assets(job: PurgeJob, public_ids: list[str]):
+    if await storage_deletions.push(public_ids):
+        job.assets_queued += len(public_ids)
+        return
+    # redis is unavailable, the janitor would never see them
+    try:
+        await asyncio.to_thread(destroy_assets, public_ids)
+    except Exception:
+        job.assets_failed += len(public_ids)
+        logger.exception(f'Purge {job.id} could not destroy {len(public_ids)} assets')
+    else:
+        job.assets_destroyed += len(public_ids)
+
+
+async def _purge_comments(job: PurgeJob, reader: AsyncSession, writer: AsyncSession):
+    async for rows in crud_comments.stream_user_comments(job.user_id, reader, settings.PURGE_BATCH_SIZE):
+        image_ids = list({row.image_id for row in rows})
+        job.comments_deleted += await crud_comments.delete_comments(
+            [row.id for row in rows], image_ids, writer
+        )
+        await writer.commit()
+        await crud_comments.forget_images_comments(image_ids)
+    await reader.rollback()
+
+
+async def _purge_ratings(job: PurgeJob, reader: AsyncSession, writer: AsyncSession):
+    async for rows in crud_ratings.stream_user_ratings(job.user_id, reader, settings.PURGE_BATCH_SIZE):
+        image_ids = list({row.image_id for row in rows})
+        job.ratings_deleted += await crud_ratings.delete_ratings(
+            [row.id for row in rows], image_ids, writer
+        )
+        await writer.commit()
+        await pending_ratings.forget_many([(row.image_id, job.user_id, row.value) for row in rows])
+        await cache_versions.bump(CacheScope.ratings)
+        await etag_stamps.invalidate(*[('image', image_id) for image_id in image_ids])
+        await image_card_cache.invalidate(*image_ids)
+    await reader.rollback()
+
+
+purge_jobs = PurgeJobs(settings.PURGE_JOBS_KEEP)
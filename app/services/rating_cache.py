@@ -0,0 +1,306 @@
+"""
+Redis side of write-behind ratings: votes waiting for the flusher.
+"""
+from redis.exceptions import RedisError
+
+from app.config import settings
+from app.services.cache_service import cache_redis_client, RedisCache
+
+
+class PendingRatings(RedisCache):
+    """
+    Ratings accepted in write-behind mode and not yet in the database.
+
+    Per image: `voters` (everyone who rated, persisted or pending) for
+    de-duplication, `pending` (user -> value) waiting for the flusher,
+    `flushing` (a batch left by older versions, flushed with `pending`) and
+    `totals` (sum and count of the persisted ratings) so reads can merge
+    both without a query. `voters` and `totals` are seeded from the
+    database and seeded again after `RATINGS_SEED_TTL`, so writes they
+    missed while redis was away do not stick.
+
+    An image stays in the `dirty` set until its votes are in the database:
+    a flusher that dies mid-batch leaves it there for the next one. A
+    flusher holds a `lock` lease on the image while it writes.
+    """
+
+    def _rating_key(self, kind: str, image_id: int) -> str:
+        return self._key('ratings', kind, image_id)
+
+    async def is_seeded(self, image_id: int) -> bool | None:
+        client = await self._get_client()
+        if client is None:
+            return None
+        try:
+            return bool(await client.exists(self._rating_key('seeded', image_id)))
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+            return None
+
+    async def seed(self, image_id: int, voters: list[int], total: float, count: int):
+        """Store the persisted ratings of an image, replacing what redis had."""
+        client = await self._get_client()
+        if client is None:
+            return
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.hkeys(self._rating_key('pending', image_id))
+                pipe.hkeys(self._rating_key('flushing', image_id))
+                pending, flushing = await pipe.execute()
+            voters = {str(user_id) for user_id in voters} | set(pending) | set(flushing)
+            async with client.pipeline(transaction=True) as pipe:
+                pipe.delete(self._rating_key('voters', image_id))
+                if voters:
+                    pipe.sadd(self._rating_key('voters', image_id), *voters)
+                pipe.hset(
+                    self._rating_key('totals', image_id),
+                    mapping={'sum': total, 'count': count}
+                )
+                pipe.set(
+                    self._rating_key('seeded', image_id), 1, ex=settings.RATINGS_SEED_TTL
+                )
+                await pipe.execute()
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+
+    async def accept(self, image_id: int, user_id: int, value: int) -> bool | None:
+        """
+        Queue a vote.
+
+        Returns:
+            bool | None: False if the user already rated the image,
+            None when redis is unavailable.
+        """
+        client = await self._get_client()
+        if client is None:
+            return None
+        try:
+            if not await client.sadd(self._rating_key('voters', image_id), user_id):
+                return False
+            async with client.pipeline(transaction=True) as pipe:
+                pipe.hset(self._rating_key('pending', image_id), str(user_id), value)
+                pipe.sadd(self._key('ratings', 'dirty'), image_id)
+                await pipe.execute()
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+            return None
+        return True
+
+    async def persisted(self, image_id: int, user_id: int, value: float):
+        """A rating was written synchronously: count it in the seeded state."""
+        client = await self._get_client()
+        if client is None:
+            return
+        try:
+            if not await client.exists(self._rating_key('seeded', image_id)):
+                return
+            async with client.pipeline(transaction=True) as pipe:
+                pipe.sadd(self._rating_key('voters', image_id), user_id)
+                pipe.hincrbyfloat(self._rating_key('totals', image_id), 'sum', value)
+                pipe.hincrby(self._rating_key('totals', image_id), 'count', 1)
+                await pipe.execute()
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+
+    async def averages(self, image_ids: list[int]) -> dict[int, float]:
+        """
+        Averages including pending votes, only for images that have some.
+        """
+        client = await self._get_client()
+        if client is None or not image_ids:
+            return {}
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                for image_id in image_ids:
+                    pipe.hmget(self._rating_key('totals', image_id), ['sum', 'count'])
+                    pipe.hgetall(self._rating_key('pending', image_id))
+                    pipe.hgetall(self._rating_key('flushing', image_id))
+                replies = await pipe.execute()
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+            return {}
+        result = {}
+        for index, image_id in enumerate(image_ids):
+            (total, count), pending, flushing = replies[3 * index:3 * index + 3]
+            # a vote in both while an old batch drains counts once
+            votes = [float(value) for value in {**flushing, **pending}.values()]
+            if not votes:
+                continue
+            result[image_id] = (
+                (float(total or 0) + sum(votes)) / (int(count or 0) + len(votes))
+            )
+        return result
+
+    async def take_dirty(self, count: int) -> list[int]:
+        """Some images with pending votes. They stay dirty until `settle`."""
+        client = await self._get_client()
+        if client is None:
+            return []
+        try:
+            image_ids = await client.srandmember(self._key('ratings', 'dirty'), count)
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+            return []
+        return [int(image_id) for image_id in image_ids or []]
+
+    async def claim(self, image_id: int, token: str) -> dict[int, int] | None:
+        """
+        Take the flush lease of an image and read its `pending` and
+        `flushing` votes. Nothing is moved: `committed` removes exactly
+        the votes that were written.
+
+        Returns:
+            dict | None: user id -> value, None when another flusher holds
+            the lease or redis is unavailable.
+        """
+        client = await self._get_client()
+        if client is None:
+            return None
+        try:
+            locked = await client.set(
+                self._rating_key('lock', image_id), token,
+                nx=True, px=int(settings.RATINGS_FLUSH_LEASE * 1000)
+            )
+            if not locked:
+                return None
+            async with client.pipeline(transaction=True) as pipe:
+                pipe.hgetall(self._rating_key('flushing', image_id))
+                pipe.hgetall(self._rating_key('pending', image_id))
+                flushing, pending = await pipe.execute()
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+            return None
+        return {
+            int(user_id): int(float(value))
+            for user_id, value in {**flushing, **pending}.items()
+        }
+
+    async def committed(
+            self,
+            image_id: int,
+            user_ids: list[int],
+            total: float,
+            count: int,
+            token: str
+    ):
+        """
+        The claimed votes are in the database. `total` and `count` are
+        the image's persisted sum and count read in the same transaction.
+        """
+        client = await self._get_client()
+        if client is None:
+            return
+        try:
+            async with client.pipeline(transaction=True) as pipe:
+                pipe.delete(self._rating_key('flushing', image_id))
+                if user_ids:
+                    pipe.hdel(self._rating_key('pending', image_id), *map(str, user_ids))
+                pipe.hset(
+                    self._rating_key('totals', image_id),
+                    mapping={'sum': total, 'count': count}
+                )
+                await pipe.execute()
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+            return
+        await self.settle(image_id, token)
+
+    async def settle(self, image_id: int, token: str):
+        """
+        Drop the lease, and the image from `dirty` unless votes arrived
+        meanwhile. Removed first and added back, so an `accept` racing
+        with the check always leaves the image dirty.
+        """
+        client = await self._get_client()
+        if client is None:
+            return
+        dirty = self._key('ratings', 'dirty')
+        try:
+            await client.srem(dirty, image_id)
+            if await client.exists(
+                self._rating_key('pending', image_id), self._rating_key('flushing', image_id)
+            ):
+                await client.sadd(dirty, image_id)
+            await self.release(image_id, token)
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+
+    async def release(self, image_id: int, token: str):
+        """
+        Drop the lease, the image stays dirty. A lease that expired and
+        was taken by another flusher is left alone.
+        """
+        client = await self._get_client()
+        if client is None:
+            return
+        lock = self._rating_key('lock', image_id)
+        try:
+            if await client.get(lock) == token:
+                await client.delete(lock)
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+
+    async def forget(self, image_id: int, user_id: int, value: float):
+        """A persisted rating was deleted."""
+        client = await self._get_client()
+        if client is None:
+            return
+        try:
+            if not await client.exists(self._rating_key('seeded', image_id)):
+                return
+            async with client.pipeline(transaction=True) as pipe:
+                pipe.srem(self._rating_key('voters', image_id), user_id)
+                pipe.hincrbyfloat(self._rating_key('totals', image_id), 'sum', -value)
+                pipe.hincrby(self._rating_key('totals', image_id), 'count', -1)
+                await pipe.execute()
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+
+    async def forget_many(self, votes: list[tuple[int, int, float]]):
+        """`forget` for (image_id, user_id, value) rows, in two round trips."""
+        client = await self._get_client()
+        if client is None or not votes:
+            return
+        image_ids = list({image_id for image_id, _, _ in votes})
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                for image_id in image_ids:
+                    pipe.exists(self._rating_key('seeded', image_id))
+                seeded = {
+                    image_id for image_id, found in zip(image_ids, await pipe.execute())
+                    if found
+                }
+            if not seeded:
+                return
+            async with client.pipeline(transaction=True) as pipe:
+                for image_id, user_id, value in votes:
+                    if image_id not in seeded:
+                        continue
+                    pipe.srem(self._rating_key('voters', image_id), user_id)
+                    pipe.hincrbyfloat(self._rating_key('totals', image_id), 'sum', -value)
+                    pipe.hincrby(self._rating_key('totals', image_id), 'count', -1)
+                await pipe.execute()
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+
+    async def drop_image(self, image_id: int):
+        await self.drop_images([image_id])
+
+    async def drop_images(self, image_ids: list[int]):
+        client = await self._get_client()
+        if client is None or not image_ids:
+            return
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.delete(*[
+                    self._rating_key(kind, image_id)
+                    for image_id in image_ids
+                    for kind in ('seeded', 'voters', 'totals', 'pending', 'flushing', 'lock')
+                ])
+                pipe.srem(self._key('ratings', 'dirty'), *image_ids)
+                await pipe.execute()
+        except (RedisError, OSError) as err:
+            self._disable_for_a_while(err)
+
+
+pending_ratings = PendingRatings(cache_redis_client)
@@ -1 +1,155 @@
-# calculate rating
\ No newline at end of file
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone
+
+from fastapi import HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database.connection import sessionmanager
+from app.repository.images import crud_images
+from app.repository.ratings import crud_ratings
+from app.repository.users import crud_users
+from app.services.cache_service import cache_versions, CacheScope
+from app.services.http_cache import etag_stamps
+from app.services.feed_cache import image_card_cache
+from app.services.leaderboard_cache import leaderboard
+from app.services.rating_cache import pending_ratings
+
+logger = logging.getLogger(__name__)
+
+
+async def accept_rating(
+        image_id: int,
+        user_id: int,
+        value: int,
+        session: AsyncSession,
+        detail: str = 'You have already rated this image.'
+) -> dict | None:
+    """
+    Write-behind version of `crud_ratings.add_rating`: the vote is queued
+    in redis and written by the flusher.
+
+    Returns:
+        dict | None: same body as add_rating, None when redis is unavailable
+        and the caller has to fall back to the synchronous path.
+
+    Raises:
+        HTTPException: 404 for unknown images, 403 for own images,
+        400 if the user already rated the image.
+    """
+    owner_id = await crud_images.get_image_owner_id(image_id, session)
+    crud_images._has_permission(
+        image_obj_user_id=owner_id,
+        current_user_id=user_id
+    )
+
+    seeded = await pending_ratings.is_seeded(image_id)
+    if seeded is None:
+        return None
+    if not seeded:
+        await pending_ratings.seed(
+            image_id, *await crud_ratings.get_votes(image_id, session)
+        )
+
+    accepted = await pending_ratings.accept(image_id, user_id, value)
+    if accepted is None:
+        return None
+    if not accepted:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=detail
+        )
+
+    await image_card_cache.invalidate(image_id)
+    averages = await pending_ratings.averages([image_id])
+    return {
+        "message": "Rating accepted",
+        "average_rating": averages.get(image_id, float(value))
+    }
+
+
+class RatingFlusher:
+    """
+    Background task writing queued ratings to the database every
+    `RATINGS_FLUSH_INTERVAL` seconds, `RATINGS_FLUSH_BATCH` images at a time.
+    """
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+        # owner of the flush leases taken by this process
+        self._token = uuid.uuid4().hex
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        # write what was accepted just before shutdown
+        async with sessionmanager.session() as session:
+            await self.flush_once(session)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.RATINGS_FLUSH_INTERVAL)
+            try:
+                async with sessionmanager.session() as session:
+                    await self.flush_once(session)
+            except Exception:
+                logger.exception('Rating flush failed')
+
+    async def flush_once(self, session: AsyncSession) -> int:
+        """
+        Persist one batch of images with pending votes.
+
+        Returns:
+            int: number of ratings written.
+        """
+        image_ids = await pending_ratings.take_dirty(settings.RATINGS_FLUSH_BATCH)
+        written, flushed = 0, []
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        for image_id in image_ids:
+            votes = await pending_ratings.claim(image_id, self._token)
+            if votes is None:
+                # another worker is flushing it
+                continue
+            if not votes:
+                await pending_ratings.settle(image_id, self._token)
+                continue
+            try:
+                persisted = await crud_ratings.persist_pending(image_id, votes, session)
+            except Exception:
+                await session.rollback()
+                await pending_ratings.release(image_id, self._token)
+                logger.exception(f'Could not persist ratings of image {image_id}')
+                continue
+            await pending_ratings.committed(
+                image_id, list(votes), persisted.total_sum, persisted.total_count, self._token
+            )
+            count = persisted.inserted_count
+            if count:
+                await leaderboard.record(
+                    image_id, persisted.inserted_sum / count, rated_at=now, votes=count
+                )
+            written += count
+            flushed.append(image_id)
+            for user_id in votes:
+                await crud_users.invalidate_profile_stamp(user_id, session)
+
+        if flushed:
+            await cache_versions.bump(CacheScope.ratings)
+            await etag_stamps.invalidate(*[('image', image_id) for image_id in flushed])
+            await image_card_cache.invalidate(*flushed)
+        return written
+
+
+rating_flusher = RatingFlusher()
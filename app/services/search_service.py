@@ -0,0 +1,82 @@
+from fastapi import Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.repository.images import crud_images, ImageCard
+from app.services.cache_service import response_cache, CachedResponse, CacheScope
+from app.utils.fast_json import TrustedRowsSerializer, RawJSONResponse
+
+SEARCH_SCOPES = (
+    CacheScope.images, CacheScope.tags, CacheScope.ratings, CacheScope.comments
+)
+
+image_cards_serializer = TrustedRowsSerializer(ImageCard)
+
+
+def normalize_search_params(
+        query: str | None,
+        tag: str | None,
+        order_by: str,
+        cursor: str | None,
+        limit: int | None,
+) -> dict:
+    """
+    Collapse equivalent searches into one cache key.
+    `ilike` ignores case, empty filters mean "no filter" and every
+    order other than rating falls back to date.
+    """
+    return {
+        'query': (query or '').lower(),
+        'tag': tag or '',
+        'order_by': 'rating' if order_by == 'rating' else 'date',
+        'cursor': cursor or '',
+        'limit': limit or 0,
+    }
+
+
+async def cached_image_search(
+        session: AsyncSession,
+        query: str | None = None,
+        tag: str | None = None,
+        order_by: str = 'date',
+        limit: int | None = None,
+        cursor: str | None = None,
+) -> Response:
+    """
+    Run `crud_images.search_images` through the response cache.
+
+    The next page cursor travels in the `X-Next-Cursor` header,
+    `X-Cache` tells whether the body came from redis.
+    """
+    params = normalize_search_params(query, tag, order_by, cursor, limit)
+
+    async def produce() -> CachedResponse:
+        images = await crud_images.search_images(
+            session=session,
+            query=query,
+            tag=tag,
+            order_by=params['order_by'],
+            limit=limit,
+            cursor=cursor,
+            merge_pending=False,
+        )
+        headers = {}
+        if limit and len(images) == limit:
+            headers['X-Next-Cursor'] = crud_images.search_cursor(
+                images[-1], params['order_by']
+            )
+        await crud_images.merge_pending_ratings(images)
+        body = image_cards_serializer.dump(images)
+        return CachedResponse(body=body, headers=headers)
+
+    cached, hit = await response_cache.get_or_set(
+        namespace='image_search',
+        params=params,
+        scopes=SEARCH_SCOPES,
+        producer=produce,
+        ttl=settings.SEARCH_CACHE_TTL,
+    )
+    return RawJSONResponse(
+        content=cached.body,
+        headers={**cached.headers, 'X-Cache': 'HIT' if hit else 'MISS'}
+    )
@@ -12,6 +12,7 @@ from app.database.connection import get_conn_db
 from app.repository.users import crud_users
 from app.services.security.secure_token.manager import token_manager, TokenType
 from app.database.models import User
+from app.utils.logger import bind_log_context
 
 
 class ConstructionAuthService(ABC):
@@ -64,6 +65,7 @@ class AuthService(ConstructionAuthService):
                     detail='User is banned'
                 )
             
+            bind_log_context(user_id=user.id)
             return user
         
         except JWTError:
@@ -0,0 +1,167 @@
+import asyncio
+import bisect
+import contextvars
+import heapq
+import logging
+import time
+from typing import Awaitable, Callable, Iterable
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class TagPrefixIndex:
+    """
+    In-process autocomplete index over tag names.
+
+    Names are kept in one sorted list of (lowercase name, name), so the
+    tags starting with a prefix are a contiguous slice found by bisect.
+    Short prefixes match huge slices; their best `MEMO_SIZE` tags by
+    usage are computed at load time and kept up to date on every change.
+    Every worker holds its own copy: tags created elsewhere show up
+    after the next reload, at most `TAG_INDEX_REFRESH` seconds later.
+
+    Reloads are single-flight. The new index is built in a thread and
+    swapped in at once, so requests keep suggesting from the old one
+    meanwhile; usage recorded during the reload is replayed on the new one.
+    """
+
+    SCAN_LIMIT = 512
+    MEMO_SIZE = 50
+
+    def __init__(self):
+        self._entries: list[tuple[str, str]] = []
+        self._usage: dict[str, int] = {}
+        self._memo: dict[str, list[tuple[str, int]]] = {}
+        self.loaded_at: float | None = None
+        self._reloading: asyncio.Lock | None = None
+        self._missed: list[tuple[list[str], int]] | None = None
+        self._task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def load(self, rows: Iterable[tuple[str, int]]):
+        """Replace the index with (name, usage) rows."""
+        usage = {name: count or 0 for name, count in rows}
+        self._entries = sorted((name.lower(), name) for name in usage)
+        self._usage = usage
+        self._memo = {}
+        self._warm_memo()
+        self.loaded_at = time.monotonic()
+
+    def _warm_memo(self):
+        """Remember the best tags of every prefix matching more than SCAN_LIMIT."""
+        pending = [('', 0, len(self._entries))]
+        while pending:
+            prefix, lo, hi = pending.pop()
+            if hi - lo <= self.SCAN_LIMIT:
+                continue
+            if prefix:
+                self._memo[prefix] = self._best(lo, hi, self.MEMO_SIZE)
+            depth = len(prefix)
+            i = lo
+            while i < hi:
+                key = self._entries[i][0]
+                if len(key) <= depth:
+                    i += 1
+                    continue
+                child = key[:depth + 1]
+                j = bisect.bisect_left(self._entries, (child + '\U0010ffff',), i, hi)
+                pending.append((child, i, j))
+                i = j
+
+    async def reload(self, loader: Callable[[], Awaitable[list[tuple[str, int]]]]):
+        """
+        Replace the index with the rows returned by `loader`, unless a
+        reload is already running. The first load waits for a running one.
+        """
+        if self._reloading is None:
+            self._reloading = asyncio.Lock()
+        if self._reloading.locked() and self.loaded_at is not None:
+            return
+        async with self._reloading:
+            if not self.is_stale():
+                return
+            self._missed = []
+            try:
+                rows = await loader()
+                fresh = TagPrefixIndex()
+                fresh.SCAN_LIMIT, fresh.MEMO_SIZE = self.SCAN_LIMIT, self.MEMO_SIZE
+                # sorting and memo warm-up are seconds of CPU on a big table
+                await asyncio.to_thread(fresh.load, rows)
+                self._entries, self._usage, self._memo = fresh._entries, fresh._usage, fresh._memo
+                self.loaded_at = fresh.loaded_at
+                missed = self._missed
+            finally:
+                self._missed = None
+            for names, delta in missed:
+                self.record_usage(names, delta)
+
+    def reload_in_background(self, loader: Callable[[], Awaitable[list[tuple[str, int]]]]):
+        """`reload` in its own task, the caller keeps using the current index."""
+        if self._task is not None and not self._task.done():
+            return
+        self._task = asyncio.get_running_loop().create_task(
+            self._reload_logged(loader), context=contextvars.Context()
+        )
+
+    async def _reload_logged(self, loader):
+        try:
+            await self.reload(loader)
+        except Exception:
+            logger.exception('Tag index reload failed')
+
+    def is_stale(self) -> bool:
+        return (
+            self.loaded_at is None
+            or time.monotonic() - self.loaded_at > settings.TAG_INDEX_REFRESH
+        )
+
+    def record_usage(self, names: Iterable[str], delta: int = 1):
+        """Add unknown tags and change the usage of the given ones."""
+        names = list(names)
+        if self._missed is not None:
+            self._missed.append((names, delta))
+        for name in names:
+            if name not in self._usage:
+                bisect.insort(self._entries, (name.lower(), name))
+                self._usage[name] = 0
+            self._usage[name] = max(self._usage[name] + delta, 0)
+            key = name.lower()
+            for end in range(1, len(key) + 1):
+                memo = self._memo.get(key[:end])
+                if memo is None:
+                    continue
+                if delta < 0:
+                    # the tag that moves up instead is unknown, rebuild on demand
+                    del self._memo[key[:end]]
+                    continue
+                memo[:] = [item for item in memo if item[0] != name]
+                memo.append((name, self._usage[name]))
+                memo.sort(key=lambda item: (-item[1], item[0].lower()))
+                del memo[self.MEMO_SIZE:]
+
+    def _best(self, lo: int, hi: int, limit: int) -> list[tuple[str, int]]:
+        best = heapq.nsmallest(
+            limit,
+            self._entries[lo:hi],
+            key=lambda entry: (-self._usage[entry[1]], entry[0])
+        )
+        return [(name, self._usage[name]) for _, name in best]
+
+    def suggest(self, prefix: str, limit: int = 10) -> list[tuple[str, int]]:
+        """Tags starting with `prefix`, case-insensitive, most used first."""
+        key = prefix.lower()
+        lo = bisect.bisect_left(self._entries, (key,))
+        hi = bisect.bisect_left(self._entries, (key + '\U0010ffff',), lo)
+        if hi - lo <= self.SCAN_LIMIT or limit > self.MEMO_SIZE:
+            return self._best(lo, hi, limit)
+        memo = self._memo.get(key)
+        if memo is None:
+            memo = self._memo[key] = self._best(lo, hi, self.MEMO_SIZE)
+        return memo[:limit]
+
+
+tag_index = TagPrefixIndex()
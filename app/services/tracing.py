@@ -0,0 +1,327 @@
+"""
+Span tracing without a tracing library.
+
+A trace starts at the edge (one per HTTP request) and the sampling
+decision is taken there, once: unsampled requests only pay for a
+contextvar lookup per instrumented call. The current span lives in a
+contextvar, so tasks created inside a span inherit it as their parent.
+Finished spans go to an exporter: an in-memory ring for tests and local
+inspection, or a JSON lines file written by a background thread.
+"""
+import functools
+import inspect
+import json
+import logging
+import queue
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Protocol
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.config import settings
+from app.services.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+trace_spans_dropped = registry.counter(
+    'trace_spans_dropped_total', 'Finished spans the exporter could not keep up with.'
+)
+
+_TRACEPARENT = re.compile(r'00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})')
+
+
+@dataclass(slots=True)
+class Span:
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    name: str
+    start: float
+    duration: float = 0.0
+    status: str = 'ok'
+    attributes: dict[str, Any] = field(default_factory=dict)
+
+    recording = True
+
+    def set_attribute(self, name: str, value: Any):
+        self.attributes[name] = value
+
+    def as_dict(self) -> dict:
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': self.start,
+            'duration_ms': round(self.duration * 1000, 3),
+            'status': self.status,
+            'attributes': self.attributes,
+        }
+
+
+class _NonRecordingSpan:
+    """Stands for an unsampled trace, so nested spans are skipped too."""
+    recording = False
+    trace_id = span_id = None
+
+    def set_attribute(self, name: str, value: Any):
+        pass
+
+
+NON_RECORDING_SPAN = _NonRecordingSpan()
+
+_current_span: ContextVar[Span | _NonRecordingSpan | None] = ContextVar(
+    'current_span', default=None
+)
+
+
+def current_span() -> Span | _NonRecordingSpan | None:
+    return _current_span.get()
+
+
+_current_operation: ContextVar[str | None] = ContextVar('current_operation', default=None)
+
+
+def current_operation() -> str | None:
+    """Innermost `traced` function running, whether the trace is sampled or not."""
+    return _current_operation.get()
+
+
+class _NoopScope:
+    def __enter__(self):
+        return NON_RECORDING_SPAN
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NOOP_SCOPE = _NoopScope()
+
+
+class _SpanScope:
+    __slots__ = ('_tracer', '_span', '_token', '_started')
+
+    def __init__(self, tracer: 'Tracer', span: Span | _NonRecordingSpan):
+        self._tracer = tracer
+        self._span = span
+
+    def __enter__(self):
+        self._token = _current_span.set(self._span)
+        self._started = time.perf_counter()
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self._token)
+        span = self._span
+        if span.recording:
+            span.duration = time.perf_counter() - self._started
+            if exc is not None:
+                span.status = 'error'
+                span.attributes['error'] = f'{exc_type.__name__}: {exc}'
+            self._tracer.export(span)
+        return False
+
+
+class Exporter(Protocol):
+    def export(self, span: Span): ...
+
+    def close(self): ...
+
+
+class InMemoryExporter:
+    """Keeps the last `max_spans` finished spans."""
+
+    def __init__(self, max_spans: int = 10_000):
+        self._spans: deque[Span] = deque(maxlen=max_spans)
+
+    def export(self, span: Span):
+        self._spans.append(span)
+
+    def spans(self, trace_id: str | None = None) -> list[Span]:
+        return [span for span in self._spans if trace_id is None or span.trace_id == trace_id]
+
+    def clear(self):
+        self._spans.clear()
+
+    def close(self):
+        pass
+
+
+class FileExporter:
+    """
+    Appends spans as JSON lines from a writer thread. The queue is
+    bounded: when the disk cannot keep up spans are dropped and counted.
+    """
+
+    _STOP = object()
+
+    def __init__(self, path: Path, queue_size: int = 10_000):
+        self.path = path
+        self._queue: queue.Queue = queue.Queue(queue_size)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._thread = threading.Thread(target=self._write, name='trace-exporter', daemon=True)
+        self._thread.start()
+
+    def export(self, span: Span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            trace_spans_dropped.inc()
+
+    def _write(self):
+        with open(self.path, 'a', encoding='utf-8') as file:
+            while True:
+                span = self._queue.get()
+                if span is self._STOP:
+                    return
+                file.write(json.dumps(span.as_dict(), default=str) + '\n')
+                if self._queue.empty():
+                    file.flush()
+
+    def close(self):
+        self._queue.put(self._STOP)
+        self._thread.join()
+
+
+def _new_id(bits: int) -> str:
+    return f'{random.getrandbits(bits):0{bits // 4}x}'
+
+
+class Tracer:
+
+    def __init__(self, exporter: Exporter, sample_rate: float = 1.0):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    def configure(self, exporter: Exporter | None = None, sample_rate: float | None = None):
+        if exporter is not None:
+            self.exporter.close()
+            self.exporter = exporter
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+
+    def export(self, span: Span):
+        try:
+            self.exporter.export(span)
+        except Exception as err:
+            logger.warning(f'Span export failed: {str(err)}')
+
+    def trace(
+            self,
+            name: str,
+            traceparent: str | None = None,
+            attributes: dict[str, Any] | None = None
+    ):
+        """
+        Root span of a trace. A valid W3C `traceparent` continues the
+        caller's trace and keeps its sampling decision; otherwise the
+        trace is sampled with probability `sample_rate`.
+        """
+        match = _TRACEPARENT.fullmatch(traceparent) if traceparent else None
+        if match:
+            trace_id, parent_id, flags = match.groups()
+            sampled = bool(int(flags, 16) & 1)
+        else:
+            trace_id, parent_id = _new_id(128), None
+            sampled = self.sample_rate >= 1 or random.random() < self.sample_rate
+        if not sampled:
+            return _SpanScope(self, NON_RECORDING_SPAN)
+        return _SpanScope(self, Span(
+            trace_id, _new_id(64), parent_id, name, time.time(), attributes=attributes or {}
+        ))
+
+    def span(self, name: str, attributes: dict[str, Any] | None = None):
+        """Child of the current span; does nothing outside a sampled trace."""
+        parent = _current_span.get()
+        if parent is None or not parent.recording:
+            return _NOOP_SCOPE
+        return _SpanScope(self, Span(
+            parent.trace_id, _new_id(64), parent.span_id, name, time.time(),
+            attributes=attributes or {}
+        ))
+
+    def record(self, name: str, duration: float, attributes: dict[str, Any] | None = None):
+        """Child span of something already timed, e.g. from engine events."""
+        parent = _current_span.get()
+        if parent is None or not parent.recording:
+            return
+        self.export(Span(
+            parent.trace_id, _new_id(64), parent.span_id, name,
+            time.time() - duration, duration, attributes=attributes or {}
+        ))
+
+
+def traced(name: str):
+    """
+    Run the decorated function, sync or async, inside a span. The name is
+    also the current operation, e.g. for the slow query log.
+    """
+    def decorator(func: Callable):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                token = _current_operation.set(name)
+                try:
+                    with tracer.span(name):
+                        return await func(*args, **kwargs)
+                finally:
+                    _current_operation.reset(token)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            token = _current_operation.set(name)
+            try:
+                with tracer.span(name):
+                    return func(*args, **kwargs)
+            finally:
+                _current_operation.reset(token)
+        return wrapper
+    return decorator
+
+
+def trace_methods(cls):
+    """
+    Class decorator: a span named `Class.method` around every coroutine
+    method defined on the class itself, private helpers included: they
+    hold the commit and refresh round trips worth seeing in a trace.
+    """
+    for attribute, value in list(vars(cls).items()):
+        if not attribute.startswith('__') and inspect.iscoroutinefunction(value):
+            setattr(cls, attribute, traced(f'{cls.__name__}.{attribute}')(value))
+    return cls
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    span = _current_span.get()
+    if context is not None and span is not None and span.recording:
+        context._trace_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_trace_started', None)
+    if started is not None:
+        tracer.record(
+            'sql', time.perf_counter() - started, {'db.statement': statement[:1000]}
+        )
+
+
+def trace_engine(engine: Engine | AsyncEngine):
+    """One `sql` span per statement executed inside a sampled trace."""
+    sync_engine = engine.sync_engine if isinstance(engine, AsyncEngine) else engine
+    if event.contains(sync_engine, 'before_cursor_execute', _before_cursor_execute):
+        return
+    event.listen(sync_engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(sync_engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+tracer = Tracer(InMemoryExporter(settings.TRACING_MEMORY_SPANS), settings.TRACING_SAMPLE_RATE)
@@ -1,23 +1,53 @@
 import redis.asyncio as redis
+from redis.asyncio.client import Pipeline
 from app.config import settings
+from app.services.metrics import redis_metrics
+from app.services.tracing import tracer
 from fastapi import Depends
 
+
+class InstrumentedPipeline(Pipeline):
+    """Pipeline reporting one latency sample per round trip."""
+
+    async def execute(self, raise_on_error: bool = True):
+        command = 'MULTI' if self.is_transaction else 'PIPELINE'
+        with redis_metrics.time(command), tracer.span(f'redis {command}'):
+            return await super().execute(raise_on_error)
+
+
+class InstrumentedRedis(redis.Redis):
+    """Redis client recording latency and errors per command name."""
+
+    async def execute_command(self, *args, **options):
+        command = str(args[0]).upper()
+        with redis_metrics.time(command), tracer.span(f'redis {command}'):
+            return await super().execute_command(*args, **options)
+
+    def pipeline(self, transaction: bool = True, shard_hint: str | None = None):
+        return InstrumentedPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint
+        )
+
+
 class RedisClient():
 
-    def __init__(self):
+    def __init__(self, socket_timeout: float | None = None):
         self.host = settings.REDIS_HOST
         self.port = settings.REDIS_PORT
         self.db = settings.REDIS_DB
         self.set = settings.REDIS_DECODE_RESPONSES
+        self.socket_timeout = socket_timeout
         self._client = None
 
     async def get_redis_client(self):
         if not self._client:
-            self._client = redis.Redis(
+            self._client = InstrumentedRedis(
                 host=self.host,
                 port=self.port,
                 db=self.db,
                 decode_responses=self.set,
+                socket_timeout=self.socket_timeout,
+                socket_connect_timeout=self.socket_timeout,
             )
         return self._client
     
@@ -1,40 +1,239 @@
+"""
+Non-blocking JSON logging for the `app` loggers.
+
+Log calls only build the record and put it on a bounded queue; a
+`QueueListener` thread formats the records as JSON lines and writes them
+to a rotating file. Request fields (request id, user id, route) are read
+from the request context when the record is created, because the
+listener thread does not share the request's contextvars.
+"""
+import contextlib
+import json
 import logging
+import logging.handlers
+import queue
+import traceback
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Optional
+from typing import Any, Iterator, Optional
 
+from app.config import settings
+from app.services.metrics import registry
 
-class LoggerSetup:
-    def __init__(self, directory: Path):
-        self.directory = directory 
-        self.log_file = self.directory / "app.log" 
-        self.logger: Optional[logging.Logger] = None
-        self._ensure_directory_and_file()
+CONTEXT_FIELDS = ('request_id', 'user_id', 'route')
+# attributes of every LogRecord, everything else came through `extra=`
+_RECORD_ATTRIBUTES = frozenset(
+    logging.LogRecord('', 0, '', 0, '', None, None).__dict__
+) | {'message', 'asctime', 'taskName'}
 
-    def _ensure_directory_and_file(self):
-        if not self.directory.exists():
-            self.directory.mkdir(parents=True, exist_ok=True)
+log_records_dropped = registry.counter(
+    'log_records_dropped_total',
+    'Log records dropped because the logging queue was full.',
+    ('level',)
+)
 
-        if not self.log_file.exists():
-            self.log_file.touch()
 
-    def setup_logger(self) -> logging.Logger:
-        if self.logger is None:
-            
-            formating = f"%(levelname)s - %(asctime)s  -%(filename)s - %(message)s"
-            formatter = logging.Formatter(formating)
+@dataclass(slots=True)
+class LogContext:
+    request_id: str | None = None
+    user_id: int | None = None
+    route: str | None = None
+    # ASGI scope of the request: the router writes the matched route there
+    scope: dict | None = None
+    extra: dict[str, Any] = field(default_factory=dict)
+
+    def current_route(self) -> str | None:
+        if self.route is None and self.scope is not None:
+            route = self.scope.get('route')
+            return route.path if route is not None else None
+        return self.route
+
+
+_log_context: ContextVar[LogContext | None] = ContextVar('log_context', default=None)
+
+
+def current_log_context() -> LogContext | None:
+    return _log_context.get()
+
+
+@contextlib.contextmanager
+def log_context(**values) -> Iterator[LogContext]:
+    """Bind request fields to every record logged inside the block."""
+    context = LogContext(**values)
+    token = _log_context.set(context)
+    try:
+        yield context
+    finally:
+        _log_context.reset(token)
+
+
+def bind_log_context(**values):
+    """
+    Add fields to the current request context, e.g. the user id once the
+    token is decoded. The context object is shared, so values bound in a
+    dependency are seen by the middleware that opened it.
+    """
+    context = _log_context.get()
+    if context is None:
+        return
+    for name, value in values.items():
+        if name in CONTEXT_FIELDS:
+            setattr(context, name, value)
+        else:
+            context.extra[name] = value
+
 
-            handler = logging.FileHandler(self.log_file)
-            handler.setFormatter(formatter)
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; `extra=` fields become top level keys."""
 
-            self.logger = logging.getLogger("global_log")
-            self.logger.setLevel(logging.INFO)
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec='milliseconds'
+            ),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for name, value in record.__dict__.items():
+            if name not in _RECORD_ATTRIBUTES and value is not None:
+                entry[name] = value
+        if record.exc_info:
+            entry['exc_info'] = ''.join(traceback.format_exception(*record.exc_info))
+        elif record.exc_text:
+            entry['exc_info'] = record.exc_text
+        if record.stack_info:
+            entry['stack_info'] = record.stack_info
+        return json.dumps(entry, default=str, ensure_ascii=False)
 
-            if not self.logger.hasHandlers():
-                self.logger.addHandler(handler)
 
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never waits for the writer thread.
+
+    Once the queue is `shed_ratio` full, DEBUG records are dropped so the
+    remaining room is kept for the ones that matter; when it is completely
+    full everything new is dropped. Drops are counted per level in
+    `log_records_dropped_total`.
+    """
+
+    def __init__(self, log_queue: queue.Queue, shed_ratio: float = 0.8):
+        super().__init__(log_queue)
+        self.shed_size = max(int(log_queue.maxsize * shed_ratio), 1) if log_queue.maxsize else 0
+
+    def enqueue(self, record: logging.LogRecord):
+        if (
+            self.shed_size
+            and record.levelno <= logging.DEBUG
+            and self.queue.qsize() >= self.shed_size
+        ):
+            log_records_dropped.inc(record.levelname)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_records_dropped.inc(record.levelname)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The base class formats the whole record here, on the caller's
+        # thread; only the message arguments have to be resolved now, the
+        # JSON and tracebacks are rendered by the listener.
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        context = _log_context.get()
+        if context is not None:
+            if getattr(record, 'request_id', None) is None:
+                record.request_id = context.request_id
+            if getattr(record, 'user_id', None) is None:
+                record.user_id = context.user_id
+            if getattr(record, 'route', None) is None:
+                record.route = context.current_route()
+            for name, value in context.extra.items():
+                record.__dict__.setdefault(name, value)
+        return record
+
+
+class LoggerSetup:
+    def __init__(
+            self,
+            directory: Path,
+            file_name: str = 'app.log',
+            level: str = 'INFO',
+            max_bytes: int = 10 * 1024 * 1024,
+            backup_count: int = 5,
+            rotate_when: str = '',
+            queue_size: int = 10_000,
+            logger_name: str = 'app'
+    ):
+        self.directory = directory
+        self.log_file = self.directory / file_name
+        self.level = level
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.rotate_when = rotate_when
+        self.queue_size = queue_size
+        self.logger_name = logger_name
+        self.logger: Optional[logging.Logger] = None
+        self._handler: Optional[NonBlockingQueueHandler] = None
+        self._listener: Optional[logging.handlers.QueueListener] = None
+        self._previous_level = logging.NOTSET
+
+    def _file_handler(self) -> logging.Handler:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if self.rotate_when:
+            handler = logging.handlers.TimedRotatingFileHandler(
+                self.log_file,
+                when=self.rotate_when,
+                backupCount=self.backup_count,
+                encoding='utf-8',
+                utc=True
+            )
+        else:
+            handler = logging.handlers.RotatingFileHandler(
+                self.log_file,
+                maxBytes=self.max_bytes,
+                backupCount=self.backup_count,
+                encoding='utf-8'
+            )
+        handler.setFormatter(JsonFormatter())
+        return handler
+
+    def setup_logger(self) -> logging.Logger:
+        """Attach the queue handler and start the writer thread."""
+        if self.logger is None:
+            log_queue: queue.Queue = queue.Queue(self.queue_size)
+            self._handler = NonBlockingQueueHandler(log_queue)
+            self._listener = logging.handlers.QueueListener(
+                log_queue, self._file_handler(), respect_handler_level=True
+            )
+            self.logger = logging.getLogger(self.logger_name)
+            self._previous_level = self.logger.level
+            self.logger.setLevel(self.level)
+            self.logger.addHandler(self._handler)
+            self._listener.start()
         return self.logger
 
+    def shutdown(self):
+        """Detach the handler and write out what is still queued."""
+        if self.logger is None:
+            return
+        self.logger.removeHandler(self._handler)
+        self.logger.setLevel(self._previous_level)
+        self._listener.stop()
+        for handler in self._listener.handlers:
+            handler.close()
+        self.logger = self._handler = self._listener = None
+
 
-path = Path(__file__).absolute().parent.parent
-logger_setup = LoggerSetup(path)
-logger = logger_setup.setup_logger()
+logger_setup = LoggerSetup(
+    Path(settings.LOG_DIR),
+    file_name=settings.LOG_FILE,
+    level=settings.LOG_LEVEL,
+    max_bytes=settings.LOG_MAX_BYTES,
+    backup_count=settings.LOG_BACKUP_COUNT,
+    rotate_when=settings.LOG_ROTATE_WHEN,
+    queue_size=settings.LOG_QUEUE_SIZE
+)
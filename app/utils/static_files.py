@@ -0,0 +1,114 @@
+"""
+Static files with precompressed variants.
+
+Build the variants once (e.g. in the Docker image) with
+
+    python -m app.utils.static_files [directory]
+
+`foo.css` gets `foo.css.br` (when the optional brotli package is
+installed) and `foo.css.gz` next to it, and PrecompressedStaticFiles
+serves them to clients that accept the encoding. Only text formats are
+considered; images such as the logo are already compressed and are
+served as they are, without looking for variants.
+"""
+import gzip
+import mimetypes
+import os
+import sys
+from pathlib import Path
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+from app.middleware.compression import brotli, negotiate_encoding
+
+STATIC_DIR = Path(__file__).absolute().parent.parent / 'templates' / 'static'
+
+PRECOMPRESSED_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+COMPRESSIBLE_EXTENSIONS = {
+    '.css', '.js', '.mjs', '.html', '.svg', '.json', '.txt', '.xml', '.map', '.ico'
+}
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    StaticFiles that answers with `<file>.br` or `<file>.gz` when present.
+    """
+
+    def file_response(
+            self,
+            full_path,
+            stat_result: os.stat_result,
+            scope: Scope,
+            status_code: int = 200,
+    ) -> Response:
+        full_path = str(full_path)
+        if os.path.splitext(full_path)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+            return super().file_response(full_path, stat_result, scope, status_code)
+        variants = {
+            coding: full_path + suffix
+            for coding, suffix in PRECOMPRESSED_SUFFIXES.items()
+            if os.path.isfile(full_path + suffix)
+        }
+        if not variants:
+            return super().file_response(full_path, stat_result, scope, status_code)
+
+        request_headers = Headers(scope=scope)
+        coding = negotiate_encoding(request_headers.get('accept-encoding'), variants)
+        if coding is None:
+            response = super().file_response(full_path, stat_result, scope, status_code)
+            response.headers.add_vary_header('Accept-Encoding')
+            return response
+
+        variant_path = variants[coding]
+        response = FileResponse(
+            variant_path,
+            status_code=status_code,
+            stat_result=os.stat(variant_path),
+            media_type=mimetypes.guess_type(full_path)[0] or 'text/plain',
+            headers={'Content-Encoding': coding, 'Vary': 'Accept-Encoding'},
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return Response(status_code=304, headers={
+                'ETag': response.headers['etag'],
+                'Vary': 'Accept-Encoding',
+            })
+        return response
+
+
+def precompress_directory(directory: Path, min_size: int = 256) -> list[Path]:
+    """
+    Write .gz and .br variants of compressible files that are out of date.
+
+    Returns:
+        list[Path]: variants that were (re)written.
+    """
+    written = []
+    for path in sorted(directory.rglob('*')):
+        if not path.is_file() or path.suffix.lower() not in COMPRESSIBLE_EXTENSIONS:
+            continue
+        stat = path.stat()
+        if stat.st_size < min_size:
+            continue
+        data = path.read_bytes()
+        encoders = {'.gz': lambda body: gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            encoders['.br'] = lambda body: brotli.compress(body, quality=11)
+        for suffix, compress in encoders.items():
+            target = path.with_name(path.name + suffix)
+            if target.exists() and target.stat().st_mtime >= stat.st_mtime:
+                continue
+            compressed = compress(data)
+            if len(compressed) >= stat.st_size:
+                continue
+            target.write_bytes(compressed)
+            written.append(target)
+    return written
+
+
+if __name__ == '__main__':
+    root = Path(sys.argv[1]) if len(sys.argv) > 1 else STATIC_DIR
+    for variant in precompress_directory(root):
+        print(variant)
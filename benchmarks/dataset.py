@@ -0,0 +1,281 @@
+"""
+Deterministic seeded datasets for the benchmark suite.
+
+Rows are generated arithmetically from their index, so the same volumes
+always give the same database and derived columns (average_rating,
+comment_count, last comment) are computed without reading rows back.
+
+Seeding the database of a running server before a load test:
+
+    python -m benchmarks.dataset --database-url URL [--preset small]
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta
+from typing import Iterator
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from app.config import RoleSet
+from app.database.models import (
+    BaseModel,
+    Comment,
+    Image,
+    Rating,
+    Tag,
+    User,
+    image_tag_association,
+)
+from app.services.security.secure_password import Hasher
+
+BENCH_PASSWORD = 'bench-password'
+BASE_TIME = datetime(2024, 1, 1)
+CHUNK_SIZE = 10_000
+
+
+@dataclass(frozen=True)
+class DatasetSize:
+    users: int
+    images: int
+    ratings: int
+    comments: int
+    tags: int = 200
+
+    def __post_init__(self):
+        if self.users < 2 or self.images < 1 or self.tags < 2:
+            raise ValueError('Need at least 2 users, 1 image and 2 tags')
+        if self.ratings > self.images * (self.users - 1):
+            raise ValueError('More ratings than (user, image) pairs')
+
+
+PRESETS = {
+    'tiny': DatasetSize(users=50, images=200, ratings=1_000, comments=500, tags=20),
+    'small': DatasetSize(users=1_000, images=10_000, ratings=100_000, comments=20_000),
+    'large': DatasetSize(users=10_000, images=500_000, ratings=5_000_000, comments=1_000_000),
+}
+
+
+def username(index: int) -> str:
+    return f'user{index}'
+
+
+def email(index: int) -> str:
+    return f'user{index}@bench.example.com'
+
+
+def tag_name(index: int) -> str:
+    return f'tag{index}'
+
+
+def image_owner(size: DatasetSize, image_index: int) -> int:
+    return image_index % size.users
+
+
+def rating_pair(size: DatasetSize, k: int) -> tuple[int, int, int]:
+    """(user index, image index, value) of the k-th rating; pairs never repeat
+    and nobody rates their own image."""
+    image_index = k % size.images
+    owner = image_owner(size, image_index)
+    user_index = (owner + 1 + k // size.images) % size.users
+    value = (k * 2654435761 >> 7) % 5 + 1
+    return user_index, image_index, value
+
+
+def image_tag_indexes(size: DatasetSize, image_index: int) -> tuple[int, int]:
+    first = image_index % size.tags
+    second = (first + 1 + image_index // size.tags % (size.tags - 1)) % size.tags
+    return first, second
+
+
+def _chunks(rows: Iterator[dict]) -> Iterator[list[dict]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _comment_text(k: int) -> str:
+    return f'comment {k}'
+
+
+def _users(size: DatasetSize, password_hash: str) -> Iterator[dict]:
+    for i in range(size.users):
+        yield {
+            'id': i + 1,
+            'username': username(i),
+            'email': email(i),
+            'password_hash': password_hash,
+            'role': RoleSet.admin if i == 0 else RoleSet.user,
+            'is_active': True,
+            'register_on': BASE_TIME + timedelta(hours=i),
+            'bio': f'bio of {username(i)}',
+        }
+
+
+def _images(size: DatasetSize) -> Iterator[dict]:
+    sums = [0] * size.images
+    counts = [0] * size.images
+    for k in range(size.ratings):
+        _, image_index, value = rating_pair(size, k)
+        sums[image_index] += value
+        counts[image_index] += 1
+
+    full_rounds, remainder = divmod(size.comments, size.images)
+    for i in range(size.images):
+        comment_count = full_rounds + (1 if i < remainder else 0)
+        snapshot = {
+            'last_comment_id': None,
+            'last_comment_text': None,
+            'last_comment_user_id': None,
+            'last_comment_at': None,
+        }
+        if comment_count:
+            last = i + (comment_count - 1) * size.images
+            snapshot = {
+                'last_comment_id': last + 1,
+                'last_comment_text': _comment_text(last),
+                'last_comment_user_id': last % size.users + 1,
+                'last_comment_at': BASE_TIME + timedelta(seconds=last),
+            }
+        yield {
+            'id': i + 1,
+            'description': f'image {i} of {username(image_owner(size, i))}',
+            'image_url': f'https://res.cloudinary.com/bench/image/upload/{i}.jpg',
+            'public_id': f'bench/{i}',
+            'user_id': image_owner(size, i) + 1,
+            'created_at': BASE_TIME + timedelta(minutes=i),
+            'updated_at': BASE_TIME + timedelta(minutes=i),
+            'average_rating': sums[i] / counts[i] if counts[i] else 0.0,
+            'comment_count': comment_count,
+            **snapshot,
+        }
+
+
+def _ratings(size: DatasetSize) -> Iterator[dict]:
+    for k in range(size.ratings):
+        user_index, image_index, value = rating_pair(size, k)
+        yield {
+            'id': k + 1,
+            'value': value,
+            'user_id': user_index + 1,
+            'image_id': image_index + 1,
+            'created_at': BASE_TIME + timedelta(seconds=k),
+        }
+
+
+def _comments(size: DatasetSize) -> Iterator[dict]:
+    for k in range(size.comments):
+        created_at = BASE_TIME + timedelta(seconds=k)
+        yield {
+            'id': k + 1,
+            'text': _comment_text(k),
+            'user_id': k % size.users + 1,
+            'image_id': k % size.images + 1,
+            'created_at': created_at,
+            'updated_at': created_at,
+        }
+
+
+def _image_tags(size: DatasetSize) -> Iterator[dict]:
+    for i in range(size.images):
+        for tag_index in image_tag_indexes(size, i):
+            yield {'image_id': i + 1, 'tag_id': tag_index + 1}
+
+
+async def seed(engine: AsyncEngine, size: DatasetSize) -> dict[str, float]:
+    """
+    Recreate the schema and fill it.
+
+    Returns:
+        dict: seconds spent per table.
+    """
+    async with engine.begin() as conn:
+        await conn.run_sync(BaseModel.metadata.drop_all)
+        await conn.run_sync(BaseModel.metadata.create_all)
+
+    # one bcrypt hash shared by every user, hashing 10k passwords would
+    # dominate the seeding time
+    password_hash = Hasher.get_password_hash(BENCH_PASSWORD)
+    tables = [
+        ('users', User, _users(size, password_hash)),
+        ('tags', Tag, ({'id': i + 1, 'name': tag_name(i)} for i in range(size.tags))),
+        ('images', Image, _images(size)),
+        ('image_tag', image_tag_association, _image_tags(size)),
+        ('ratings', Rating, _ratings(size)),
+        ('comments', Comment, _comments(size)),
+    ]
+    timings = {}
+    for name, target, rows in tables:
+        start = time.perf_counter()
+        statement = insert(target)
+        for chunk in _chunks(rows):
+            async with engine.begin() as conn:
+                await conn.execute(statement, chunk)
+        timings[name] = round(time.perf_counter() - start, 3)
+
+    if engine.dialect.name == 'postgresql':
+        # explicit ids leave the sequences at 1
+        async with engine.begin() as conn:
+            for table in ('users', 'tags', 'images', 'ratings', 'comments'):
+                await conn.exec_driver_sql(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                    f"(SELECT COALESCE(MAX(id), 1) FROM {table}))"
+                )
+            await conn.exec_driver_sql('ANALYZE')
+    return timings
+
+
+VOLUMES = ('users', 'images', 'ratings', 'comments', 'tags')
+
+
+def add_dataset_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--preset', choices=PRESETS, default='small')
+    for field in VOLUMES:
+        parser.add_argument(f'--{field}', type=int, help='override the preset volume')
+    parser.add_argument('--database-url', help='defaults to a temporary SQLite file')
+
+
+def size_from_args(args: argparse.Namespace) -> DatasetSize:
+    return replace(PRESETS[args.preset], **{
+        field: value for field in VOLUMES
+        if (value := getattr(args, field)) is not None
+    })
+
+
+def temporary_database_url() -> str:
+    return f'sqlite+aiosqlite:///{Path(tempfile.mkdtemp()) / "bench.db"}'
+
+
+async def seed_database(url: str, size: DatasetSize) -> dict[str, float]:
+    engine = create_async_engine(url)
+    start = time.perf_counter()
+    try:
+        timings = await seed(engine, size)
+    finally:
+        await engine.dispose()
+    timings['total'] = round(time.perf_counter() - start, 3)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    add_dataset_arguments(parser)
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error('--database-url is required, its tables are dropped and recreated')
+    timings = asyncio.run(seed_database(args.database_url, size_from_args(args)))
+    print(json.dumps(timings))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Stand-ins for the external services, so benchmarks measure the app only.
+"""
+import asyncio
+import time
+import uuid
+
+from app.config import settings
+from app.database.connection import sessionmanager
+from app.main import app
+from app.services.cache_service import cache_redis_client
+from app.services.image_service import CloudinaryService, IcloudinaryService
+from app.services.user_service import redis_client
+from tests.fake_redis import FakeRedis
+
+
+class FakeCloudinaryService(IcloudinaryService):
+    """
+    Reads the upload like the SDK does and answers with a made-up URL.
+
+    `latency` seconds are spent per call to simulate the network. The real
+    service calls the synchronous SDK inside the coroutine, so by default
+    the delay blocks the event loop too; with `blocking = False` it is
+    awaited instead, which is what an async client would give.
+    """
+
+    latency: float = 0.0
+    blocking: bool = True
+
+    async def _network(self):
+        if not self.latency:
+            return
+        if self.blocking:
+            time.sleep(self.latency)
+        else:
+            await asyncio.sleep(self.latency)
+
+    async def upload_image(self, file, folder) -> dict:
+        file.file.read()
+        await self._network()
+        public_id = f'{folder}/{uuid.uuid4().hex}'
+        return {
+            'secure_url': f'https://res.cloudinary.com/bench/image/upload/{public_id}.jpg',
+            'public_id': public_id,
+        }
+
+    async def transform_image(
+        self,
+        image,
+        transformation_params: dict | None = None,
+        crop: bool = False,
+        blur: bool = False,
+        circular: bool = False,
+        grayscale: bool = False
+    ) -> dict:
+        await self._network()
+        return {
+            'transformed_url': f'{image.image_url}?t=bench',
+            'public_id': image.public_id,
+            'original_image_id': image.id,
+        }
+
+
+def install_fake_redis() -> FakeRedis:
+    """Point the cache and token blacklist clients at one in-memory redis."""
+    fake = FakeRedis()
+    cache_redis_client._client = fake
+    redis_client._client = fake
+    return fake
+
+
+def use_fakes(database_url: str, cache: bool = True) -> FakeRedis:
+    """
+    Wire `app.main.app` for in-process runs: the real get_conn_db pointed
+    at the bench database, fake redis and fake Cloudinary.
+    """
+    sessionmanager._url = database_url
+    settings.CACHE_ENABLED = cache
+    app.dependency_overrides[CloudinaryService] = FakeCloudinaryService
+    return install_fake_redis()
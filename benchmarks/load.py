@@ -0,0 +1,362 @@
+"""
+Load test with a weighted mix of user scenarios.
+
+    python -m benchmarks.load [--concurrency 20] [--duration 60] [--ramp-up 10]
+        [--mix search=35,view_image=25,...] [--cloudinary-latency 0.2]
+        [--url http://localhost:8000] [--output report.json]
+
+By default `app.main.app` runs in-process behind an httpx ASGI transport
+on a freshly seeded database, with fake redis and a fake Cloudinary
+delayed by --cloudinary-latency seconds per call. With --url requests go
+to a running server instead; seed its database first with
+`python -m benchmarks.dataset` using the same volumes.
+
+Every virtual user logs in as one seeded user, then picks scenarios by
+weight until the duration is over. Users start evenly over --ramp-up.
+Prints throughput, latency percentiles and status codes per scenario.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Awaitable, Callable
+
+import httpx
+
+from benchmarks.dataset import (
+    BENCH_PASSWORD,
+    DatasetSize,
+    add_dataset_arguments,
+    email,
+    seed_database,
+    size_from_args,
+    tag_name,
+    temporary_database_url,
+    username,
+)
+from benchmarks.fakes import FakeCloudinaryService, use_fakes
+from benchmarks.suite import PNG_BYTES, percentile
+
+from app.main import app
+
+DEFAULT_MIX = {
+    'search': 35,
+    'view_image': 25,
+    'read_comments': 20,
+    'rate': 8,
+    'comment': 6,
+    'upload': 3,
+    'transform': 3,
+}
+
+
+@dataclass
+class VirtualUser:
+    index: int
+    client: httpx.AsyncClient
+    size: DatasetSize
+    rng: random.Random
+    headers: dict = field(default_factory=dict)
+    rated: int = 0
+    transformed: int = 0
+
+    def popular_image(self) -> int:
+        """Image id with a skewed popularity: low ids are the hot ones."""
+        return int(self.size.images * self.rng.random() ** 3) + 1
+
+
+@dataclass
+class ScenarioStats:
+    latencies: list[float] = field(default_factory=list)
+    statuses: Counter = field(default_factory=Counter)
+    errors: Counter = field(default_factory=Counter)
+
+
+async def _search(vu: VirtualUser) -> httpx.Response:
+    params = {'limit': 20, 'order_by': vu.rng.choice(['date', 'rating'])}
+    if vu.rng.random() < 0.7:
+        params['tag'] = tag_name(int(vu.size.tags * vu.rng.random() ** 2))
+    else:
+        params['query'] = f'of {username(vu.rng.randrange(vu.size.users))}'
+    return await vu.client.get('/app/search/images/', params=params, headers=vu.headers)
+
+
+async def _view_image(vu: VirtualUser) -> httpx.Response:
+    # image-info is owner only, viewers get the redirect to the file
+    return await vu.client.get(f'/app/get_image/{vu.popular_image()}/', headers=vu.headers)
+
+
+async def _read_comments(vu: VirtualUser) -> httpx.Response:
+    return await vu.client.get(
+        f'/app/comments/image/{vu.popular_image()}/',
+        params={'include_author': 'true'},
+        headers=vu.headers,
+    )
+
+
+def fresh_rating_target(size: DatasetSize, user_index: int, n: int) -> int | None:
+    """
+    Image index the user neither owns nor rated in the seeded data.
+    Seeded ratings give image i to the users `owner + 1 .. owner + rounds`,
+    so owners further away than `rounds` are safe.
+    """
+    rounds = -(-size.ratings // size.images)
+    distances = size.users - rounds - 1
+    if distances <= 0:
+        return None
+    owner = (user_index - 1 - rounds - n % distances) % size.users
+    image_index = owner + size.users * (n // distances)
+    return image_index if image_index < size.images else None
+
+
+async def _rate(vu: VirtualUser) -> httpx.Response:
+    image_index = fresh_rating_target(vu.size, vu.index, vu.rated)
+    vu.rated += 1
+    if image_index is None:
+        # nothing left to rate, measure the duplicate path instead
+        image_index = vu.popular_image() - 1
+    return await vu.client.post(
+        f'/app/rate_image/{image_index + 1}/',
+        params={'value': vu.rng.randint(1, 5)},
+        headers=vu.headers,
+    )
+
+
+async def _comment(vu: VirtualUser) -> httpx.Response:
+    return await vu.client.post(
+        f'/app/comments/{vu.popular_image()}/',
+        json={'text': f'comment from {username(vu.index)}'},
+        headers=vu.headers,
+    )
+
+
+async def _upload(vu: VirtualUser) -> httpx.Response:
+    return await vu.client.post(
+        '/app/upload_image',
+        data={'description': f'load test upload by {username(vu.index)}'},
+        params={'tags': [tag_name(vu.rng.randrange(vu.size.tags)), 'loadtest']},
+        files={'file': ('load.png', PNG_BYTES, 'image/png')},
+        headers=vu.headers,
+    )
+
+
+async def _transform(vu: VirtualUser) -> httpx.Response:
+    # seeded image i belongs to user i % users
+    owned = max(1, (vu.size.images - vu.index + vu.size.users - 1) // vu.size.users)
+    image_index = vu.index + vu.size.users * (vu.transformed % owned)
+    vu.transformed += 1
+    return await vu.client.post(
+        f'/app/transform_image/{image_index + 1}/',
+        json={'grayscale': True},
+        headers=vu.headers,
+    )
+
+
+SCENARIOS: dict[str, Callable[[VirtualUser], Awaitable[httpx.Response]]] = {
+    'search': _search,
+    'view_image': _view_image,
+    'read_comments': _read_comments,
+    'rate': _rate,
+    'comment': _comment,
+    'upload': _upload,
+    'transform': _transform,
+}
+
+
+def parse_mix(text: str) -> dict[str, float]:
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f'unknown scenario {name!r}')
+        mix[name] = float(weight)
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError('at least one scenario needs a weight')
+    return mix
+
+
+class LoadRun:
+    def __init__(
+            self,
+            client: httpx.AsyncClient,
+            size: DatasetSize,
+            mix: dict[str, float],
+            think_time: float,
+            seed: int
+    ):
+        self.client = client
+        self.size = size
+        self.names = [name for name, weight in mix.items() if weight > 0]
+        self.weights = [mix[name] for name in self.names]
+        self.think_time = think_time
+        self.seed = seed
+        self.stats = {name: ScenarioStats() for name in self.names}
+        self.login_failures = 0
+
+    async def _login(self, vu: VirtualUser) -> bool:
+        response = await self.client.post(
+            '/app/auth/login',
+            data={'username': email(vu.index), 'password': BENCH_PASSWORD}
+        )
+        if response.status_code != 200:
+            self.login_failures += 1
+            return False
+        vu.headers = {'Authorization': f'Bearer {response.json()["access_token"]}'}
+        return True
+
+    async def virtual_user(self, number: int, start_delay: float, stop_at: float):
+        await asyncio.sleep(start_delay)
+        # user 0 is the admin, keep the traffic on regular users
+        vu = VirtualUser(
+            index=number % (self.size.users - 1) + 1,
+            client=self.client,
+            size=self.size,
+            rng=random.Random(self.seed * 100_003 + number),
+        )
+        if not await self._login(vu):
+            return
+        while time.perf_counter() < stop_at:
+            name = vu.rng.choices(self.names, self.weights)[0]
+            stats = self.stats[name]
+            start = time.perf_counter()
+            try:
+                response = await SCENARIOS[name](vu)
+            except httpx.HTTPError as err:
+                stats.errors[type(err).__name__] += 1
+            else:
+                stats.statuses[response.status_code] += 1
+            stats.latencies.append(time.perf_counter() - start)
+            if self.think_time:
+                await asyncio.sleep(vu.rng.expovariate(1 / self.think_time))
+
+    async def run(self, concurrency: int, duration: float, ramp_up: float) -> float:
+        start = time.perf_counter()
+        stop_at = start + ramp_up + duration
+        await asyncio.gather(*[
+            self.virtual_user(number, ramp_up * number / concurrency, stop_at)
+            for number in range(concurrency)
+        ])
+        return time.perf_counter() - start
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {}
+        for name, stats in self.stats.items():
+            if not stats.latencies:
+                continue
+            ordered = sorted(stats.latencies)
+            endpoints[name] = {
+                'requests': len(ordered),
+                'rps': round(len(ordered) / elapsed, 2),
+                'p50_ms': round(percentile(ordered, 0.50) * 1000, 2),
+                'p90_ms': round(percentile(ordered, 0.90) * 1000, 2),
+                'p99_ms': round(percentile(ordered, 0.99) * 1000, 2),
+                'max_ms': round(ordered[-1] * 1000, 2),
+                'statuses': {str(code): count for code, count in sorted(stats.statuses.items())},
+                'errors': dict(stats.errors),
+            }
+        everything = sorted(
+            latency for stats in self.stats.values() for latency in stats.latencies
+        )
+        total = {
+            'requests': len(everything),
+            'rps': round(len(everything) / elapsed, 2),
+            'login_failures': self.login_failures,
+        }
+        if everything:
+            total.update({
+                'p50_ms': round(percentile(everything, 0.50) * 1000, 2),
+                'p99_ms': round(percentile(everything, 0.99) * 1000, 2),
+            })
+        return {'total': total, 'endpoints': endpoints}
+
+
+def print_table(report: dict):
+    columns = ('requests', 'rps', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms')
+    print(f'{"scenario":<14}' + ''.join(f'{name:>10}' for name in columns), file=sys.stderr)
+    for name, row in report['endpoints'].items():
+        print(
+            f'{name:<14}' + ''.join(f'{row[column]:>10}' for column in columns)
+            + f'  {row["statuses"]} {row["errors"] or ""}',
+            file=sys.stderr
+        )
+    print(f'total: {report["total"]}', file=sys.stderr)
+
+
+async def run(args: argparse.Namespace) -> dict:
+    size = size_from_args(args)
+    if args.concurrency >= size.users:
+        raise SystemExit('--concurrency must be lower than the number of seeded users')
+    meta = {
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'ramp_up': args.ramp_up,
+        'think_time': args.think_time,
+        'mix': args.mix,
+        'dataset': size.__dict__,
+    }
+
+    if args.url:
+        meta['target'] = args.url
+        limits = httpx.Limits(max_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=30) as client:
+            load = LoadRun(client, size, args.mix, args.think_time, args.seed)
+            elapsed = await load.run(args.concurrency, args.duration, args.ramp_up)
+        return {'meta': meta, **load.report(elapsed)}
+
+    url = args.database_url or temporary_database_url()
+    meta.update({
+        'target': 'in-process',
+        'database': url.split(':', 1)[0],
+        'cloudinary_latency': args.cloudinary_latency,
+        'cloudinary_blocking': not args.cloudinary_async,
+        'seeding_seconds': await seed_database(url, size),
+    })
+    use_fakes(url)
+    FakeCloudinaryService.latency = args.cloudinary_latency
+    FakeCloudinaryService.blocking = not args.cloudinary_async
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://load') as client:
+            load = LoadRun(client, size, args.mix, args.think_time, args.seed)
+            elapsed = await load.run(args.concurrency, args.duration, args.ramp_up)
+    app.dependency_overrides.clear()
+    return {'meta': meta, **load.report(elapsed)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    add_dataset_arguments(parser)
+    parser.set_defaults(preset='tiny')
+    parser.add_argument('--url', help='base URL of a running server')
+    parser.add_argument('--concurrency', type=int, default=20, help='virtual users')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds after ramp-up')
+    parser.add_argument('--ramp-up', type=float, default=5.0, help='seconds to start all users')
+    parser.add_argument('--think-time', type=float, default=0.0,
+                        help='mean pause between actions of a user, in seconds')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help='scenario weights, e.g. search=50,rate=10')
+    parser.add_argument('--cloudinary-latency', type=float, default=0.2,
+                        help='seconds per fake Cloudinary call (in-process only)')
+    parser.add_argument('--cloudinary-async', action='store_true',
+                        help='await the fake latency instead of blocking the loop')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', type=Path, help='write the JSON report there')
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_table(report)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
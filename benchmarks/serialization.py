@@ -0,0 +1,130 @@
+"""
+Serialization cost of list responses: validated schemas vs trusted rows.
+
+    python -m benchmarks.serialization [--sizes 1000 10000] [--repeat 5]
+
+Prints one JSON object per line with the best time of every strategy.
+"""
+import argparse
+import json
+import time
+from datetime import datetime
+
+import app.schemas as sch
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.repository.images import ImageCard
+from app.services.search_service import image_cards_serializer
+
+schema_list_adapter = TypeAdapter(list[sch.ImageResponseSchema])
+
+
+def make_cards(size: int) -> list[ImageCard]:
+    now = datetime(2025, 2, 20, 10, 0, 0)
+    return [
+        ImageCard(
+            id=i,
+            description=f'image number {i}',
+            image_url=f'https://res.cloudinary.com/demo/image/upload/{i}.jpg',
+            user_id=i % 50,
+            tags=['nature', 'city', f'tag{i % 7}'],
+            average_rating=(i % 5) + 0.5,
+            created_at=now,
+            comment_count=i % 3,
+            last_comment=None,
+            width=1200,
+            height=800,
+        )
+        for i in range(size)
+    ]
+
+
+def schema_per_row(cards: list[ImageCard]) -> bytes:
+    """What the routers did before: build a schema per row, then FastAPI
+    validates the list against response_model and json-encodes it."""
+    items = [
+        sch.ImageResponseSchema(
+            id=card.id,
+            description=card.description,
+            image_url=card.image_url,
+            user_id=card.user_id,
+            tags=card.tags,
+            average_rating=card.average_rating,
+            created_at=card.created_at,
+            comment_count=card.comment_count,
+            last_comment=card.last_comment,
+            width=card.width,
+            height=card.height
+        )
+        for card in cards
+    ]
+    validated = schema_list_adapter.validate_python(items)
+    return json.dumps(
+        jsonable_encoder(schema_list_adapter.dump_python(validated, by_alias=True))
+    ).encode('utf-8')
+
+
+def schema_dump_json(cards: list[ImageCard]) -> bytes:
+    items = [
+        sch.ImageResponseSchema(
+            id=card.id,
+            description=card.description,
+            image_url=card.image_url,
+            user_id=card.user_id,
+            tags=card.tags,
+            average_rating=card.average_rating,
+            created_at=card.created_at,
+            comment_count=card.comment_count,
+            last_comment=card.last_comment,
+            width=card.width,
+            height=card.height
+        )
+        for card in cards
+    ]
+    return schema_list_adapter.dump_json(items, by_alias=True)
+
+
+def trusted_rows(cards: list[ImageCard]) -> bytes:
+    return image_cards_serializer.dump(cards)
+
+
+STRATEGIES = {
+    'schema_per_row': schema_per_row,
+    'schema_dump_json': schema_dump_json,
+    'trusted_rows': trusted_rows,
+}
+
+
+def best_of(func, cards, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(cards)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        cards = make_cards(size)
+        baseline = None
+        for name, func in STRATEGIES.items():
+            seconds = best_of(func, cards, args.repeat)
+            baseline = baseline or seconds
+            print(json.dumps({
+                'items': size,
+                'strategy': name,
+                'best_ms': round(seconds * 1000, 3),
+                'speedup': round(baseline / seconds, 2),
+                'bytes': len(func(cards)),
+            }))
+
+
+if __name__ == '__main__':
+    main()
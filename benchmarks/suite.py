@@ -0,0 +1,267 @@
+"""
+End-to-end latency of the main endpoints on a seeded database.
+
+    python -m benchmarks.suite [--preset small] [--database-url URL]
+        [--iterations 200] [--output results.json]
+        [--baseline baseline.json] [--tolerance 0.25]
+
+Requests go through the real ASGI app and dependencies. Cloudinary is
+replaced by `FakeCloudinaryService` and redis by an in-memory fake, so
+numbers reflect the app and the database only. Without --database-url
+a throwaway SQLite file is used; pass a postgresql+asyncpg URL to
+benchmark Postgres (its tables are dropped and recreated).
+
+Prints the results as JSON. With --baseline, operations whose p50
+grew by more than --tolerance are reported and the exit code is 1.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Awaitable, Callable
+
+import httpx
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from benchmarks.dataset import (
+    BENCH_PASSWORD,
+    DatasetSize,
+    add_dataset_arguments,
+    email,
+    seed_database,
+    size_from_args,
+    tag_name,
+    temporary_database_url,
+    username,
+)
+from benchmarks.fakes import use_fakes
+
+from app.database.models import User
+from app.main import app
+from app.services.security.secure_password import Hasher
+
+# 1x1 transparent png
+PNG_BYTES = bytes.fromhex(
+    '89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+    '1f15c4890000000d49444154789c6360000002000154a24f5d00000000'
+    '49454e44ae426082'
+)
+BENCH_EMAIL = 'bench@bench.example.com'
+
+
+@dataclass
+class Context:
+    client: httpx.AsyncClient
+    size: DatasetSize
+    headers: dict
+    rated: int = 0
+
+
+@dataclass(frozen=True)
+class Operation:
+    call: Callable[[Context, int], Awaitable[httpx.Response]]
+    expected: int = 200
+    # bcrypt makes login ~100x slower than the rest
+    max_iterations: int | None = None
+
+
+async def _search_images(ctx: Context, i: int) -> httpx.Response:
+    params = {'limit': 20, 'order_by': 'rating' if i % 2 else 'date'}
+    if i % 3:
+        params['tag'] = tag_name(i % ctx.size.tags)
+    else:
+        params['query'] = f'of {username(i % ctx.size.users)}'
+    return await ctx.client.get('/app/search/images/', params=params, headers=ctx.headers)
+
+
+async def _upload_image(ctx: Context, i: int) -> httpx.Response:
+    return await ctx.client.post(
+        '/app/upload_image',
+        data={'description': f'benchmark upload {i}'},
+        params={'tags': [tag_name(i % ctx.size.tags), 'benchmark']},
+        files={'file': ('bench.png', PNG_BYTES, 'image/png')},
+        headers=ctx.headers,
+    )
+
+
+async def _add_rating(ctx: Context, i: int) -> httpx.Response:
+    # the bench user owns nothing and has rated nothing yet
+    ctx.rated += 1
+    return await ctx.client.post(
+        f'/app/rate_image/{ctx.rated}/',
+        params={'value': i % 5 + 1},
+        headers=ctx.headers,
+    )
+
+
+async def _get_user_profile(ctx: Context, i: int) -> httpx.Response:
+    return await ctx.client.get(
+        f'/app/users/{username(i % ctx.size.users)}', headers=ctx.headers
+    )
+
+
+async def _get_comments_for_image(ctx: Context, i: int) -> httpx.Response:
+    return await ctx.client.get(
+        f'/app/comments/image/{i % min(ctx.size.images, ctx.size.comments or 1) + 1}/',
+        params={'include_author': 'true'},
+        headers=ctx.headers,
+    )
+
+
+async def _login(ctx: Context, i: int) -> httpx.Response:
+    return await ctx.client.post(
+        '/app/auth/login',
+        data={'username': email(i % ctx.size.users), 'password': BENCH_PASSWORD},
+    )
+
+
+OPERATIONS = {
+    'search_images': Operation(_search_images),
+    'upload_image': Operation(_upload_image),
+    'add_rating': Operation(_add_rating),
+    'get_user_profile': Operation(_get_user_profile),
+    'get_comments_for_image': Operation(_get_comments_for_image),
+    'login': Operation(_login, max_iterations=20),
+}
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+def summarize(latencies: list[float]) -> dict:
+    ordered = sorted(latencies)
+    total = sum(ordered)
+    return {
+        'iterations': len(ordered),
+        'mean_ms': round(total / len(ordered) * 1000, 3),
+        'p50_ms': round(percentile(ordered, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3),
+        'ops_per_sec': round(len(ordered) / total, 1),
+    }
+
+
+async def measure(ctx: Context, operation: Operation, iterations: int, warmup: int) -> dict:
+    if operation.max_iterations:
+        iterations = min(iterations, operation.max_iterations)
+        warmup = min(warmup, operation.max_iterations // 4)
+    latencies = []
+    for i in range(warmup + iterations):
+        start = time.perf_counter()
+        response = await operation.call(ctx, i)
+        elapsed = time.perf_counter() - start
+        if response.status_code != operation.expected:
+            raise RuntimeError(
+                f'{operation.call.__name__} answered {response.status_code}: {response.text[:200]}'
+            )
+        if i >= warmup:
+            latencies.append(elapsed)
+    return summarize(latencies)
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Operations whose p50 regressed by more than `tolerance` (0.25 = 25%)."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        ratio = current['p50_ms'] / previous['p50_ms']
+        if ratio > 1 + tolerance:
+            regressions.append(
+                f'{name}: p50 {previous["p50_ms"]}ms -> {current["p50_ms"]}ms (x{ratio:.2f})'
+            )
+    return regressions
+
+
+async def _add_bench_user(url: str, size: DatasetSize):
+    engine = create_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.execute(insert(User), [{
+            'id': size.users + 1,
+            'username': 'bench',
+            'email': BENCH_EMAIL,
+            'password_hash': Hasher.get_password_hash(BENCH_PASSWORD),
+        }])
+    await engine.dispose()
+
+
+async def run(args: argparse.Namespace) -> dict:
+    size = size_from_args(args)
+    if args.iterations > size.images:
+        raise SystemExit('add_rating needs --iterations <= number of images')
+
+    url = args.database_url or temporary_database_url()
+    seeding = await seed_database(url, size)
+    await _add_bench_user(url, size)
+    use_fakes(url, cache=not args.no_cache)
+
+    selected = args.only or list(OPERATIONS)
+    results = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+            login = await client.post(
+                '/app/auth/login',
+                data={'username': BENCH_EMAIL, 'password': BENCH_PASSWORD}
+            )
+            login.raise_for_status()
+            headers = {'Authorization': f'Bearer {login.json()["access_token"]}'}
+            ctx = Context(client=client, size=size, headers=headers)
+            for name in selected:
+                results[name] = await measure(
+                    ctx, OPERATIONS[name], args.iterations, args.warmup
+                )
+                print(f'{name}: {results[name]}', file=sys.stderr)
+    app.dependency_overrides.clear()
+
+    return {
+        'meta': {
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'dialect': url.split(':', 1)[0],
+            'dataset': size.__dict__,
+            'cache': not args.no_cache,
+            'python': platform.python_version(),
+            'seeding_seconds': seeding,
+        },
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    add_dataset_arguments(parser)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--only', nargs='+', choices=OPERATIONS)
+    parser.add_argument('--no-cache', action='store_true', help='disable the redis caches')
+    parser.add_argument('--output', type=Path, help='write the JSON report there')
+    parser.add_argument('--baseline', type=Path, help='report to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text + '\n')
+    print(text)
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        regressions = compare(report['results'], baseline['results'], args.tolerance)
+        for line in regressions:
+            print(f'REGRESSION {line}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Lookup latency of the in-process tag autocomplete index.
+
+    python -m benchmarks.tag_autocomplete [--tags 1000000] [--lookups 20000]
+
+Prints one JSON object with p50/p99/max latency in microseconds.
+"""
+import argparse
+import json
+import random
+import string
+import time
+
+from app.services.tag_index import TagPrefixIndex
+
+
+def make_tags(count: int, rng: random.Random) -> list[tuple[str, int]]:
+    names = set()
+    while len(names) < count:
+        length = rng.randint(3, 12)
+        names.add(''.join(rng.choices(string.ascii_lowercase, k=length)))
+    # usage is heavy-tailed like real tags
+    return [(name, int(rng.paretovariate(1.2))) for name in names]
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--tags', type=int, default=1_000_000)
+    parser.add_argument('--lookups', type=int, default=20_000)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rows = make_tags(args.tags, rng)
+    index = TagPrefixIndex()
+    start = time.perf_counter()
+    index.load(rows)
+    load_seconds = time.perf_counter() - start
+
+    prefixes = [
+        ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(1, 4)))
+        for _ in range(args.lookups)
+    ]
+    timings = []
+    for prefix in prefixes:
+        start = time.perf_counter()
+        index.suggest(prefix, 10)
+        timings.append((time.perf_counter() - start) * 1_000_000)
+    timings.sort()
+
+    print(json.dumps({
+        'tags': args.tags,
+        'lookups': args.lookups,
+        'load_s': round(load_seconds, 2),
+        'p50_us': round(percentile(timings, 0.50), 1),
+        'p99_us': round(percentile(timings, 0.99), 1),
+        'max_us': round(timings[-1], 1),
+    }))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,5 @@
+import contextlib
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy.pool import StaticPool
@@ -6,9 +8,12 @@ from sqlalchemy import text
 import pytest_asyncio
 
 from app.main import app
-from app.database.connection import get_conn_db
+from app.database.connection import enable_foreign_keys, get_conn_db, sessionmanager
 from app.services.security.secure_password import Hasher
 from app.database.models import BaseModel, User, Image
+from app.database.query_stats import add_listener, instrument_engine, remove_listener
+from app.database.slow_queries import slow_query_log
+from app.services.tracing import trace_engine
 
 SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
 
@@ -17,6 +22,10 @@ engine = create_async_engine(
     connect_args={"check_same_thread": False},
     poolclass=StaticPool
 )
+enable_foreign_keys(engine)
+instrument_engine(engine)
+trace_engine(engine)
+slow_query_log.instrument(engine)
 
 TestingSessionLocal = async_sessionmaker(
     autocommit=False,
@@ -25,6 +34,9 @@ TestingSessionLocal = async_sessionmaker(
     bind=engine,
     class_=AsyncSession
 )
+# code that opens its own sessions (background jobs, middleware) uses the test database too
+sessionmanager._engine = engine
+sessionmanager._session_maker = TestingSessionLocal
 
 test_user = {
     "username": "test",
@@ -71,8 +83,7 @@ async def initialize_db():
 
     # clear data after tests
     async with engine.begin() as conn:
-        await conn.execute(text("DELETE FROM users"))
-        await conn.commit()
+        await conn.run_sync(BaseModel.metadata.drop_all)
 
 @pytest_asyncio.fixture(scope="function")
 async def db_session():
@@ -96,3 +107,38 @@ def client():
     app.dependency_overrides[get_conn_db] = override_get_db
     yield TestClient(app)
     app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def query_budget():
+    """
+    Fail the test when a request inside the block runs more than
+    `max_queries` SQL statements:
+
+        with query_budget(3):
+            client.get('/app/...')
+    """
+    @contextlib.contextmanager
+    def budget(max_queries: int):
+        seen = []
+
+        def listener(route, stats):
+            seen.append((route, stats))
+
+        add_listener(listener)
+        try:
+            yield seen
+        finally:
+            remove_listener(listener)
+        over = [(route, stats) for route, stats in seen if stats.count > max_queries]
+        if over:
+            report = []
+            for route, stats in over:
+                report.append(f'{route}: {stats.count} queries, budget {max_queries}')
+                report.extend(
+                    f'  {times}x {" ".join(statement.split())[:200]}'
+                    for statement, times in stats.statements.most_common()
+                )
+            pytest.fail('Query budget exceeded\n' + '\n'.join(report))
+
+    return budget
@@ -0,0 +1,307 @@
+"""
+In-memory stand-in for `redis.asyncio.Redis` with decode_responses=True.
+
+Covers the commands the caches use. Pipelines queue calls and run them
+in order on `execute`, which is enough to exercise the code paths
+without a server. Expiry is ignored.
+"""
+import fnmatch
+from collections import defaultdict
+
+from redis.exceptions import ResponseError
+
+
+def _s(value) -> str:
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+class FakePipeline:
+    def __init__(self, redis: 'FakeRedis'):
+        self._redis = redis
+        self._calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self._calls = []
+
+    def multi(self):
+        pass
+
+    def __getattr__(self, name):
+        command = getattr(self._redis, name)
+
+        def queue(*args, **kwargs):
+            self._calls.append((command, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self):
+        calls, self._calls = self._calls, []
+        return [await command(*args, **kwargs) for command, args, kwargs in calls]
+
+
+class FakeRedis:
+    def __init__(self):
+        self.strings: dict[str, str] = {}
+        self.hashes: dict[str, dict[str, str]] = defaultdict(dict)
+        self.sets: dict[str, set[str]] = defaultdict(set)
+        self.zsets: dict[str, dict[str, float]] = defaultdict(dict)
+        self.lists: dict[str, list[str]] = defaultdict(list)
+        self.commands = 0
+
+    def pipeline(self, transaction: bool = True):
+        return FakePipeline(self)
+
+    def _stores(self):
+        return (self.strings, self.hashes, self.sets, self.zsets, self.lists)
+
+    def _count(self):
+        self.commands += 1
+
+    async def ping(self):
+        self._count()
+        return True
+
+    async def aclose(self):
+        pass
+
+    # keys
+    async def exists(self, *keys):
+        self._count()
+        return sum(any(key in store and store[key] not in ({}, set(), [])
+                       for store in self._stores()) for key in keys)
+
+    async def delete(self, *keys):
+        self._count()
+        removed = 0
+        for key in keys:
+            for store in self._stores():
+                if key in store:
+                    del store[key]
+                    removed += 1
+        return removed
+
+    async def expire(self, key, seconds):
+        self._count()
+        return True
+
+    async def rename(self, src, dst):
+        self._count()
+        for store in self._stores():
+            if src in store and store[src] not in ({}, set(), []):
+                store[dst] = store.pop(src)
+                return True
+        raise ResponseError('no such key')
+
+    async def scan_iter(self, match='*'):
+        for store in self._stores():
+            for key in list(store):
+                if fnmatch.fnmatch(key, match):
+                    yield key
+
+    # strings
+    async def get(self, key):
+        self._count()
+        return self.strings.get(key)
+
+    async def mget(self, keys):
+        self._count()
+        return [self.strings.get(key) for key in keys]
+
+    async def set(self, key, value, ex=None, px=None, nx=False):
+        self._count()
+        if nx and key in self.strings:
+            return None
+        self.strings[key] = _s(value)
+        return True
+
+    async def setex(self, key, seconds, value):
+        return await self.set(key, value, ex=seconds)
+
+    async def incr(self, key, amount=1):
+        self._count()
+        value = int(self.strings.get(key, 0)) + amount
+        self.strings[key] = str(value)
+        return value
+
+    # hashes
+    async def hset(self, key, field=None, value=None, mapping=None):
+        self._count()
+        items = dict(mapping or {})
+        if field is not None:
+            items[field] = value
+        added = sum(1 for f in items if _s(f) not in self.hashes[key])
+        for f, v in items.items():
+            self.hashes[key][_s(f)] = _s(v)
+        return added
+
+    async def hgetall(self, key):
+        self._count()
+        return dict(self.hashes.get(key, {}))
+
+    async def hkeys(self, key):
+        self._count()
+        return list(self.hashes.get(key, {}))
+
+    async def hmget(self, key, fields):
+        self._count()
+        values = self.hashes.get(key, {})
+        return [values.get(_s(f)) for f in fields]
+
+    async def hvals(self, key):
+        self._count()
+        return list(self.hashes.get(key, {}).values())
+
+    async def hdel(self, key, *fields):
+        self._count()
+        values = self.hashes.get(key, {})
+        return sum(1 for f in fields if values.pop(_s(f), None) is not None)
+
+    async def hincrby(self, key, field, amount=1):
+        self._count()
+        value = int(self.hashes[key].get(_s(field), 0)) + amount
+        self.hashes[key][_s(field)] = str(value)
+        return value
+
+    async def hincrbyfloat(self, key, field, amount=1.0):
+        self._count()
+        value = float(self.hashes[key].get(_s(field), 0)) + amount
+        self.hashes[key][_s(field)] = repr(value)
+        return value
+
+    # sets
+    async def sadd(self, key, *members):
+        self._count()
+        before = len(self.sets[key])
+        self.sets[key].update(_s(m) for m in members)
+        return len(self.sets[key]) - before
+
+    async def srem(self, key, *members):
+        self._count()
+        before = len(self.sets[key])
+        self.sets[key].difference_update(_s(m) for m in members)
+        return before - len(self.sets[key])
+
+    async def smembers(self, key):
+        self._count()
+        return set(self.sets.get(key, set()))
+
+    async def srandmember(self, key, count=None):
+        self._count()
+        members = sorted(self.sets.get(key, set()))[:count or 1]
+        return members if count is not None else (members[0] if members else None)
+
+    async def spop(self, key, count=None):
+        self._count()
+        members = self.sets.get(key, set())
+        popped = sorted(members)[:count or 1]
+        members.difference_update(popped)
+        return popped if count is not None else (popped[0] if popped else None)
+
+    # lists
+    async def rpush(self, key, *values):
+        self._count()
+        self.lists[key].extend(_s(value) for value in values)
+        return len(self.lists[key])
+
+    async def lpop(self, key, count=None):
+        self._count()
+        values = self.lists.get(key, [])
+        popped, values[:] = values[:count or 1], values[count or 1:]
+        if count is None:
+            return popped[0] if popped else None
+        return popped or None
+
+    async def rpoplpush(self, src, dst):
+        self._count()
+        values = self.lists.get(src)
+        if not values:
+            return None
+        value = values.pop()
+        self.lists[dst].insert(0, value)
+        return value
+
+    async def lrem(self, key, count, value):
+        """Removes from the head; negative counts are not used by the caches."""
+        self._count()
+        values = self.lists.get(key, [])
+        removed, kept = 0, []
+        for item in values:
+            if item == _s(value) and (count == 0 or removed < count):
+                removed += 1
+            else:
+                kept.append(item)
+        values[:] = kept
+        return removed
+
+    async def lrange(self, key, start, end):
+        self._count()
+        return list(self.lists.get(key, [])[start:None if end == -1 else end + 1])
+
+    # sorted sets
+    def _ordered(self, key, reverse):
+        return sorted(
+            self.zsets.get(key, {}).items(),
+            key=lambda item: (item[1], item[0]),
+            reverse=reverse
+        )
+
+    async def zadd(self, key, mapping):
+        self._count()
+        added = sum(1 for m in mapping if _s(m) not in self.zsets[key])
+        for member, score in mapping.items():
+            self.zsets[key][_s(member)] = float(score)
+        return added
+
+    async def zrem(self, key, *members):
+        self._count()
+        return sum(1 for m in members if self.zsets[key].pop(_s(m), None) is not None)
+
+    async def zcard(self, key):
+        self._count()
+        return len(self.zsets.get(key, {}))
+
+    async def zremrangebyrank(self, key, start, end):
+        self._count()
+        ordered = self._ordered(key, reverse=False)
+        size = len(ordered)
+        start = start + size if start < 0 else start
+        end = end + size if end < 0 else end
+        doomed = ordered[max(start, 0):end + 1] if end >= 0 else []
+        for member, _ in doomed:
+            del self.zsets[key][member]
+        return len(doomed)
+
+    async def zrevrange(self, key, start, end, withscores=False):
+        self._count()
+        ordered = self._ordered(key, reverse=True)
+        chunk = ordered[start:None if end == -1 else end + 1]
+        return chunk if withscores else [member for member, _ in chunk]
+
+    async def zrevrangebyscore(self, key, max, min, start=None, num=None, withscores=False):
+        self._count()
+
+        def bound(value, default):
+            value = _s(value)
+            if value in ('+inf', '-inf'):
+                return float(value), False
+            if value.startswith('('):
+                return float(value[1:]), True
+            return float(value), False
+
+        high, high_open = bound(max, float('inf'))
+        low, low_open = bound(min, float('-inf'))
+        chunk = [
+            (member, score) for member, score in self._ordered(key, reverse=True)
+            if (score < high if high_open else score <= high)
+            and (score > low if low_open else score >= low)
+        ]
+        if start is not None:
+            chunk = chunk[start:start + num]
+        return chunk if withscores else [member for member, _ in chunk]
@@ -0,0 +1,31 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).absolute().parent.parent
+
+
+def run_benchmark(module: str, *args: str) -> list[dict]:
+    result = subprocess.run(
+        [sys.executable, '-m', module, *args],
+        cwd=ROOT, capture_output=True, text=True, timeout=120
+    )
+    assert result.returncode == 0, result.stderr
+    return [json.loads(line) for line in result.stdout.splitlines()]
+
+
+@pytest.mark.parametrize('module, args', [
+    ('benchmarks.serialization', ['--sizes', '20', '--repeat', '1']),
+    ('benchmarks.tag_autocomplete', ['--tags', '200', '--lookups', '50']),
+])
+def test_benchmark_smoke(module, args):
+    assert run_benchmark(module, *args)
+
+
+def test_trusted_rows_match_schema_json():
+    rows = run_benchmark('benchmarks.serialization', '--sizes', '20', '--repeat', '1')
+    sizes = {row['strategy']: row['bytes'] for row in rows}
+    assert sizes['trusted_rows'] == sizes['schema_dump_json']
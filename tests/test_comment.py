@@ -3,6 +3,7 @@ from fastapi import status
 from sqlalchemy import select
 
 from app.database.models import Comment, Image
+from app.repository.comments import crud_comments
 
 @pytest.mark.asyncio
 async def test_create_comment(client, db_session):
@@ -265,6 +266,38 @@ async def test_get_comments_for_image(client, db_session):
         assert comment["text"] == f"Comment {i + 1}"
         assert comment["image_id"] == image_from_db.id
 
+
+@pytest.mark.asyncio
+async def test_get_comments_for_image_paginated(client, db_session):
+    login_data = {"username": "deadpool@example.com", "password": "123"}
+    response_login = client.post("/app/auth/login", data=login_data)
+    headers = {"Authorization": f"Bearer {response_login.json()['access_token']}"}
+
+    first_page = client.get(
+        "/app/comments/image/1/",
+        params={"limit": 2, "include_author": True},
+        headers=headers
+    )
+    assert first_page.status_code == 200
+    assert [c["text"] for c in first_page.json()] == ["Comment 1", "Comment 2"]
+    assert first_page.json()[0]["author"] == {"username": "test", "avatar_url": None}
+    cursor = first_page.headers["X-Next-Cursor"]
+
+    second_page = client.get(
+        "/app/comments/image/1/",
+        params={"limit": 2, "cursor": cursor},
+        headers=headers
+    )
+    assert second_page.status_code == 200
+    assert [c["text"] for c in second_page.json()] == ["Comment 3"]
+    assert "author" not in second_page.json()[0]
+    assert "X-Next-Cursor" not in second_page.headers
+
+    bad_cursor = client.get(
+        "/app/comments/image/1/", params={"cursor": "bad"}, headers=headers
+    )
+    assert bad_cursor.status_code == 400
+
 @pytest.mark.asyncio
 async def test_empty_comment(client, db_session):
 
@@ -297,4 +330,47 @@ async def test_empty_comment(client, db_session):
     error_detail = response.json()['detail'][0]
     assert error_detail['loc'] == ['body', 'text']
     assert error_detail['msg'] == 'String should have at least 1 character'
-    
\ No newline at end of file
+    
+
+@pytest.mark.asyncio
+async def test_comment_counters_follow_writes_and_repair(client, db_session):
+    async def image_stats():
+        result = await db_session.execute(
+            select(Image.comment_count, Image.last_comment_id).where(Image.id == 1)
+        )
+        return tuple(result.one())
+
+    async def actual_stats():
+        ids = (await db_session.execute(
+            select(Comment.id)
+            .where(Comment.image_id == 1)
+            .order_by(Comment.created_at, Comment.id)
+        )).scalars().all()
+        return len(ids), ids[-1] if ids else None
+
+    # earlier tests deleted comments behind the repository's back
+    after_id = 0
+    while True:
+        _, after_id = await crud_comments.repair_comment_stats(
+            db_session, after_id=after_id, batch_size=1
+        )
+        if not after_id:
+            break
+    assert await image_stats() == await actual_stats()
+    count_before, last_before = await image_stats()
+
+    login_data = {"username": "deadpool@example.com", "password": "123"}
+    response_login = client.post("/app/auth/login", data=login_data)
+    headers = {"Authorization": f"Bearer {response_login.json()['access_token']}"}
+
+    created = client.post("/app/comments/1/", json={"text": "Newest"}, headers=headers)
+    assert created.status_code == 201
+    assert await image_stats() == (count_before + 1, created.json()["id"])
+
+    info = client.get("/app/image-info", params={"image_id": 1}, headers=headers).json()
+    assert info["comment_count"] == count_before + 1
+    assert info["last_comment"]["text"] == "Newest"
+
+    deleted = client.delete(f"/app/comments/{created.json()['id']}/", headers=headers)
+    assert deleted.status_code == 204
+    assert await image_stats() == (count_before, last_before)
@@ -0,0 +1,92 @@
+import gzip
+
+from fastapi import FastAPI, Response
+from fastapi.testclient import TestClient
+
+from app.middleware.compression import CompressionMiddleware, negotiate_encoding
+from app.utils.static_files import PrecompressedStaticFiles, precompress_directory
+
+BIG_JSON = b'[' + b','.join([b'{"id":1,"tags":["sea","sky"]}'] * 200) + b']'
+
+compressed_app = FastAPI()
+compressed_app.add_middleware(CompressionMiddleware)
+
+
+@compressed_app.get("/big")
+async def big():
+    return Response(BIG_JSON, media_type="application/json", headers={"ETag": '"v1"'})
+
+
+@compressed_app.get("/small")
+async def small():
+    return Response(b'{"id":1}', media_type="application/json")
+
+
+@compressed_app.get("/qr")
+async def qr():
+    return Response(b"\x89PNG" + b"\x00" * 4096, media_type="image/png")
+
+
+def test_negotiate_encoding():
+    assert negotiate_encoding("gzip, deflate", ["br", "gzip"]) == "gzip"
+    assert negotiate_encoding("br;q=0.5, gzip", ["br", "gzip"]) == "gzip"
+    assert negotiate_encoding("br, gzip", ["br", "gzip"]) == "br"
+    assert negotiate_encoding("gzip;q=0", ["gzip"]) is None
+    assert negotiate_encoding("*", ["gzip"]) == "gzip"
+    assert negotiate_encoding(None, ["gzip"]) is None
+
+
+def test_large_json_is_gzipped_and_etag_weakened():
+    client = TestClient(compressed_app)
+
+    response = client.get("/big", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert response.headers["ETag"] == 'W/"v1"'
+    assert int(response.headers["Content-Length"]) < len(BIG_JSON)
+    assert response.content == BIG_JSON
+
+
+def test_small_identity_and_images_are_not_compressed():
+    client = TestClient(compressed_app)
+
+    for path in ("/small", "/qr"):
+        response = client.get(path, headers={"Accept-Encoding": "gzip"})
+        assert "Content-Encoding" not in response.headers
+
+    response = client.get("/big", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["ETag"] == '"v1"'
+
+
+def test_precompressed_static_variant(tmp_path):
+    css = b"body { color: black; }\n" * 100
+    (tmp_path / "site.css").write_bytes(css)
+
+    written = precompress_directory(tmp_path)
+
+    assert tmp_path / "site.css.gz" in written
+    assert gzip.decompress((tmp_path / "site.css.gz").read_bytes()) == css
+
+    static_app = FastAPI()
+    static_app.mount("/static", PrecompressedStaticFiles(directory=tmp_path))
+    client = TestClient(static_app)
+
+    response = client.get("/static/site.css", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Content-Type"].startswith("text/css")
+    assert response.content == css
+
+    plain = client.get("/static/site.css", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in plain.headers
+    assert plain.content == css
+
+    # images are already compressed: no variant is written or served
+    logo = b"RIFF\x00\x00\x00\x00WEBP" * 100
+    (tmp_path / "logo.webp").write_bytes(logo)
+    (tmp_path / "logo.webp.gz").write_bytes(gzip.compress(logo))
+    assert precompress_directory(tmp_path) == []
+    image = client.get("/static/logo.webp", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in image.headers
+    assert image.content == logo
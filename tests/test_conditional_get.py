@@ -0,0 +1,87 @@
+from unittest.mock import AsyncMock
+
+import pytest
+from fastapi import status
+
+from app.repository.images import crud_images
+from app.services.http_cache import etag_stamps
+from app.services.http_cache import etag_matches, make_etag
+from tests.fake_redis import FakeRedis
+
+
+def test_etag_matching():
+    etag = make_etag(1, "2025-02-20 10:00:00", "cat")
+
+    assert etag.startswith('"') and etag.endswith('"')
+    assert etag == make_etag(1, "2025-02-20 10:00:00", "cat")
+    assert etag != make_etag(1, "2025-02-20 10:00:01", "cat")
+    assert etag_matches(f'"other", {etag}', etag)
+    assert etag_matches(f'W/{etag}', etag)
+    assert etag_matches('*', etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches('"other"', etag)
+
+
+@pytest.mark.asyncio
+async def test_image_info_returns_304_for_current_etag(client, db_session):
+    login_data = {
+        "username": "deadpool@example.com",
+        "password": "123"
+    }
+    response_login = client.post("/app/auth/login", data=login_data)
+    assert response_login.status_code == status.HTTP_200_OK
+    headers = {"Authorization": f"Bearer {response_login.json()['access_token']}"}
+
+    first = client.get("/app/image-info", params={"image_id": 1}, headers=headers)
+    assert first.status_code == status.HTTP_200_OK
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "private, no-cache"
+
+    second = client.get(
+        "/app/image-info",
+        params={"image_id": 1},
+        headers={**headers, "If-None-Match": etag}
+    )
+    assert second.status_code == status.HTTP_304_NOT_MODIFIED
+    assert second.headers["ETag"] == etag
+    assert second.content == b""
+
+    stale = client.get(
+        "/app/image-info",
+        params={"image_id": 1},
+        headers={**headers, "If-None-Match": '"stale"'}
+    )
+    assert stale.status_code == status.HTTP_200_OK
+    assert stale.json()["id"] == 1
+
+
+@pytest.mark.asyncio
+async def test_stamp_of_a_load_that_raced_a_writer_is_not_used(client, db_session, monkeypatch):
+    monkeypatch.setattr(etag_stamps, "_get_client", AsyncMock(return_value=FakeRedis()))
+    response_login = client.post(
+        "/app/auth/login", data={"username": "deadpool@example.com", "password": "123"}
+    )
+    headers = {"Authorization": f"Bearer {response_login.json()['access_token']}"}
+
+    first = client.get("/app/image-info", params={"image_id": 1}, headers=headers)
+    stamp, generation = await etag_stamps.lookup("image", 1)
+    assert stamp.etag == first.headers["ETag"] and stamp.owner_id == 1
+
+    load = crud_images.get_image_obj
+
+    async def load_then_write(*args, **kwargs):
+        image = await load(*args, **kwargs)
+        # a writer commits and drops the stamp while this request renders
+        await etag_stamps.invalidate(("image", 1))
+        return image
+
+    monkeypatch.setattr(crud_images, "get_image_obj", load_then_write)
+    client.get("/app/image-info", params={"image_id": 1}, headers=headers)
+
+    stamp, current = await etag_stamps.lookup("image", 1)
+    assert stamp is None and current == generation + 1
+
+    monkeypatch.setattr(crud_images, "get_image_obj", load)
+    client.get("/app/image-info", params={"image_id": 1}, headers=headers)
+    stamp, _ = await etag_stamps.lookup("image", 1)
+    assert stamp.etag == first.headers["ETag"]
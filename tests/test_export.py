@@ -0,0 +1,78 @@
+import csv
+import io
+import json
+
+import pytest
+
+from app.config import settings
+from app.database.models import Comment, Image, Rating, Tag, User
+
+
+@pytest.fixture(scope="module")
+def headers(client):
+    response = client.post(
+        "/app/auth/login",
+        data={"username": "deadpool@example.com", "password": "123"}
+    )
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.mark.asyncio
+async def test_images_stream_as_ndjson_in_batches(client, headers, db_session, monkeypatch):
+    monkeypatch.setattr(settings, "EXPORT_BATCH_SIZE", 2)
+    other = User(username="other", email="other@example.com", password_hash="x")
+    db_session.add(other)
+    await db_session.flush()
+    images = [
+        Image(description=f"export {n}", image_url="u", user_id=1, public_id=f"export-{n}",
+              tags=[Tag(name=f"export-{n}")])
+        for n in range(4)
+    ]
+    db_session.add_all([*images, Image(description="not mine", image_url="u",
+                                       user_id=other.id, public_id="other")])
+    await db_session.flush()
+    db_session.add_all([
+        Comment(text='say "hi", then leave', user_id=1, image_id=images[0].id),
+        Rating(value=3, user_id=1, image_id=images[1].id),
+    ])
+    await db_session.commit()
+
+    response = client.get("/app/export/images", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["description"] for row in rows] == [
+        "Test Image", "export 0", "export 1", "export 2", "export 3"
+    ]
+    assert rows[1]["tags"] == ["export-0"]
+    assert set(rows[1]) == {
+        "id", "description", "image_url", "tags", "average_rating",
+        "comment_count", "created_at", "updated_at"
+    }
+
+    resumed = client.get(
+        "/app/export/images", params={"after_id": rows[2]["id"]}, headers=headers
+    )
+    assert [json.loads(line)["id"] for line in resumed.text.splitlines()] == [
+        row["id"] for row in rows[3:]
+    ]
+
+
+def test_comments_and_ratings_stream_as_csv(client, headers):
+    response = client.get("/app/export/comments", params={"format": "csv"}, headers=headers)
+    assert response.headers["content-type"].startswith("text/csv")
+    assert "comments-1.csv" in response.headers["content-disposition"]
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["text"] for row in rows] == ['say "hi", then leave']
+
+    ratings = client.get("/app/export/ratings", params={"format": "csv"}, headers=headers)
+    rows = list(csv.DictReader(io.StringIO(ratings.text)))
+    assert [float(row["value"]) for row in rows] == [3.0]
+
+
+def test_other_users_need_an_admin(client, headers):
+    assert client.get("/app/export/images").status_code == 401
+    assert client.get("/app/export/images", params={"user_id": 999}, headers=headers).status_code == 404
+    other = client.get("/app/export/images", params={"user_id": 2}, headers=headers)
+    assert [json.loads(line)["description"] for line in other.text.splitlines()] == ["not mine"]
+    assert client.get("/app/export/everything", headers=headers).status_code == 422
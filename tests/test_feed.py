@@ -0,0 +1,85 @@
+from unittest.mock import AsyncMock
+
+import pytest
+from fastapi import status
+
+from app.database.models import Image
+from app.services import feed_service
+from app.services.feed_cache import FeedPage, FeedTimeline
+from tests.fake_redis import FakeRedis
+
+
+@pytest.mark.asyncio
+async def test_feed_pages_newest_first(client, db_session):
+    db_session.add_all([
+        Image(
+            description=f"Feed image {i}",
+            image_url=f"https://example.com/feed-{i}.jpg",
+            user_id=1,
+            public_id=f"feed-public-id-{i}"
+        )
+        for i in range(3)
+    ])
+    await db_session.commit()
+
+    login_data = {"username": "deadpool@example.com", "password": "123"}
+    response_login = client.post("/app/auth/login", data=login_data)
+    headers = {"Authorization": f"Bearer {response_login.json()['access_token']}"}
+
+    first = client.get("/app/feed/", params={"limit": 2}, headers=headers)
+    assert first.status_code == status.HTTP_200_OK
+    assert [img["description"] for img in first.json()] == ["Feed image 2", "Feed image 1"]
+
+    second = client.get(
+        "/app/feed/user/1/",
+        params={"limit": 2, "cursor": first.headers["X-Next-Cursor"]},
+        headers=headers
+    )
+    assert second.status_code == status.HTTP_200_OK
+    assert [img["description"] for img in second.json()] == ["Feed image 0", "Test Image"]
+    assert second.json()[0]["comment_count"] == 0
+
+
+@pytest.mark.asyncio
+async def test_feed_ids_fill_cold_timeline_and_read_past_trim(monkeypatch):
+    timeline = AsyncMock()
+    latest = AsyncMock(return_value=[9, 8, 7])
+    monkeypatch.setattr(feed_service, "feed_timeline", timeline)
+    monkeypatch.setattr(feed_service.crud_images, "get_latest_image_ids", latest)
+    monkeypatch.setattr(feed_service.settings, "FEED_MAX_LENGTH", 3)
+
+    timeline.page.return_value = FeedPage(ready=False, ids=[], truncated=False)
+    ids = await feed_service._feed_ids(None, owner_id=None, limit=2, before_id=9)
+
+    timeline.fill.assert_awaited_once_with(None, [9, 8, 7])
+    assert ids == [8, 7]
+
+    timeline.page.return_value = FeedPage(ready=True, ids=[8, 7], truncated=True)
+    latest.return_value = [6]
+    ids = await feed_service._feed_ids(None, owner_id=None, limit=3, before_id=9)
+
+    assert ids == [8, 7, 6]
+    assert latest.await_args.kwargs["before_id"] == 7
+
+
+@pytest.mark.asyncio
+async def test_timeline_stays_truncated_after_deletes(monkeypatch):
+    monkeypatch.setattr(feed_service.settings, "FEED_MAX_LENGTH", 3)
+    timeline = FeedTimeline(None)
+    monkeypatch.setattr(timeline, "_get_client", AsyncMock(return_value=FakeRedis()))
+
+    await timeline.fill(1, [2, 1])
+    assert (await timeline.page(1, 5)).truncated is False
+
+    for image_id in (3, 4):
+        await timeline.add(image_id, 1)
+    page = await timeline.page(1, 5)
+    assert page.ids == [4, 3, 2] and page.truncated
+
+    # a delete shrinks the set below the limit, id 1 is still only in the database
+    await timeline.remove_many([3], 1)
+    page = await timeline.page(1, 5)
+    assert page.ids == [4, 2] and page.truncated
+
+    await timeline.fill(None, [9, 8, 7])
+    assert (await timeline.page(None, 5)).truncated
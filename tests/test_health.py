@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from app.services.health import ReadinessProbe, readiness
+
+
+@pytest.fixture
+def checks(monkeypatch):
+    calls = {"database": 0, "redis": 0}
+
+    async def database():
+        calls["database"] += 1
+        return {"pool": {"size": 5}}
+
+    async def redis():
+        calls["redis"] += 1
+        raise ConnectionError("redis.internal:6379 refused")
+
+    monkeypatch.setattr(readiness, "checks", {"database": database, "redis": redis})
+    monkeypatch.setattr(readiness, "required", ["database"])
+    readiness.invalidate()
+    yield calls
+    readiness.invalidate()
+
+
+def test_healthz_touches_nothing(client):
+    response = client.get("/healthz")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+
+
+def test_readyz_reports_optional_failures_as_degraded(client, checks):
+    response = client.get("/readyz")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "degraded"
+    assert body["checks"]["database"]["ok"] is True
+    assert body["checks"]["database"]["pool"] == {"size": 5}
+    assert body["checks"]["redis"] == {"ok": False, "error": "ConnectionError"}
+    assert response.headers["cache-control"] == "no-store"
+
+
+def test_readyz_is_cached_between_probes(client, checks):
+    for _ in range(3):
+        client.get("/readyz")
+    assert checks == {"database": 1, "redis": 1}
+
+
+def test_readyz_fails_when_a_required_check_fails(client, checks, monkeypatch):
+    monkeypatch.setattr(readiness, "required", ["database", "redis"])
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert response.json()["status"] == "unavailable"
+
+
+def test_checks_run_once_for_concurrent_probes_and_time_out():
+    probe = ReadinessProbe(ttl=60, timeout=0.05, required=["slow"])
+    started = []
+
+    @probe.register("slow")
+    async def slow():
+        started.append(1)
+        await asyncio.sleep(1)
+
+    async def probes():
+        return await asyncio.gather(*(probe.status() for _ in range(5)))
+
+    results = asyncio.run(probes())
+    assert len(started) == 1
+    assert all(result is results[0] for result in results)
+    assert results[0]["status"] == "unavailable"
+    assert results[0]["checks"]["slow"] == {"ok": False, "error": "TimeoutError"}
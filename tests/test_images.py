@@ -1,12 +1,18 @@
+import hashlib
+from datetime import datetime
 from io import BytesIO
 from unittest.mock import AsyncMock, MagicMock, patch
 import pytest
 from starlette.datastructures import Headers
 from fastapi import UploadFile
+from PIL import Image as PILImage
 import cloudinary.uploader 
+from sqlalchemy import text
 
 from app.main import app
+from app.database.models import Comment, Image, Rating, Tag, Transformation
 from app.services.image_service import CloudinaryService
+from app.services.ingest_service import extract_metadata
 
 @pytest.fixture
 def mock_cloudinary_service():
@@ -180,3 +186,161 @@ async def test_delete_image(client, db_session):
             headers={"Authorization": f"Bearer {access_token}"}
         )
         assert response.status_code == 204
+
+
+@pytest.mark.asyncio
+async def test_delete_image_cascades_to_dependent_rows(client, db_session):
+    image = Image(
+        description="cascade",
+        image_url="https://example.com/cascade.jpg",
+        user_id=1,
+        public_id="cascade-public-id",
+        tags=[Tag(name="cascade")],
+    )
+    db_session.add(image)
+    await db_session.flush()
+    db_session.add_all([
+        Comment(text="first", user_id=1, image_id=image.id),
+        Rating(value=4, user_id=1, image_id=image.id),
+        Transformation(transformation_url="t", qr_code_url="q", image_id=image.id),
+    ])
+    await db_session.commit()
+    image_id = image.id
+
+    response_login = client.post(
+        "/app/auth/login", data={"username": "deadpool@example.com", "password": "123"}
+    )
+    access_token = response_login.json()["access_token"]
+    with patch("cloudinary.uploader.destroy", return_value={"result": "ok"}):
+        response = client.delete(
+            f'/app/delete_image/{image_id}/',
+            headers={"Authorization": f"Bearer {access_token}"}
+        )
+    assert response.status_code == 204
+
+    for table in ("images", "comments", "ratings", "transformations", "image_tag"):
+        column = "id" if table == "images" else "image_id"
+        remaining = await db_session.scalar(
+            text(f"SELECT count(*) FROM {table} WHERE {column} = :id"), {"id": image_id}
+        )
+        assert remaining == 0, table
+    assert await db_session.scalar(text("SELECT count(*) FROM tags WHERE name = 'cascade'")) == 1
+
+
+def _jpeg(size=(64, 48), orientation=None, taken_at=None):
+    image = PILImage.linear_gradient("L").resize(size).convert("RGB")
+    exif = PILImage.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    if taken_at:
+        exif.get_ifd(0x8769)[0x9003] = taken_at
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", exif=exif)
+    return buffer.getvalue()
+
+
+def test_extract_metadata_reads_exif_and_hashes():
+    data = _jpeg(orientation=6, taken_at="2024:05:01 18:30:00")
+    metadata = extract_metadata(data)
+
+    assert metadata.content_hash == hashlib.sha256(data).hexdigest()
+    assert metadata.format == "JPEG"
+    assert metadata.orientation == 6
+    # rotated by 90 degrees when displayed
+    assert (metadata.width, metadata.height) == (48, 64)
+    assert metadata.taken_at == datetime(2024, 5, 1, 18, 30)
+    assert -(1 << 63) <= metadata.phash < 1 << 63
+
+    # a resized copy is a near duplicate, a different picture is not
+    resized = extract_metadata(_jpeg(size=(640, 480), orientation=6))
+    assert bin((metadata.phash ^ resized.phash) & (1 << 64) - 1).count("1") <= 4
+    assert resized.content_hash != metadata.content_hash
+    flipped = extract_metadata(_jpeg(orientation=3))
+    assert bin((metadata.phash ^ flipped.phash) & (1 << 64) - 1).count("1") > 10
+
+
+def test_extract_metadata_of_undecodable_file_keeps_the_hash():
+    metadata = extract_metadata(b"fake image content")
+    assert metadata.content_hash == hashlib.sha256(b"fake image content").hexdigest()
+    assert (metadata.width, metadata.format, metadata.phash) == (None, None, None)
+
+
+@pytest.mark.asyncio
+async def test_upload_image_stores_metadata(client, db_session, mock_cloudinary_service):
+    uploaded = []
+
+    async def upload_image(file, folder):
+        uploaded.append(file.file.read())
+        return {"secure_url": "https://example.com/metadata.jpg", "public_id": "metadata"}
+
+    mock_cloudinary_service.upload_image = AsyncMock(side_effect=upload_image)
+    app.dependency_overrides[CloudinaryService] = lambda: mock_cloudinary_service
+    login = client.post(
+        "/app/auth/login", data={"username": "deadpool@example.com", "password": "123"}
+    )
+    data = _jpeg(size=(80, 60))
+
+    response = client.post(
+        "/app/upload_image",
+        data={"description": "With metadata"},
+        files={"file": ("photo.jpg", data, "image/jpeg")},
+        headers={"Authorization": f"Bearer {login.json()['access_token']}"}
+    )
+
+    assert response.status_code == 200
+    assert (response.json()["width"], response.json()["height"]) == (80, 60)
+    # the file is rewound for the storage upload
+    assert uploaded == [data]
+    row = (await db_session.execute(
+        text("SELECT width, height, format, content_hash, phash FROM images WHERE public_id = 'metadata'")
+    )).one()
+    assert tuple(row[:4]) == (80, 60, "JPEG", hashlib.sha256(data).hexdigest())
+    assert row.phash is not None
+
+    image_id = response.json()["id"]
+    info = client.get(
+        "/app/image-info",
+        params={"image_id": image_id},
+        headers={"Authorization": f"Bearer {login.json()['access_token']}"}
+    )
+    assert (info.json()["width"], info.json()["height"]) == (80, 60)
+    admin_info = client.get(
+        "/app/admin_panel/image-info",
+        params={"image_id": image_id},
+        headers={"Authorization": f"Bearer {login.json()['access_token']}"}
+    )
+    assert (admin_info.json()["width"], admin_info.json()["height"]) == (80, 60)
+
+
+@pytest.mark.asyncio
+async def test_upload_image_rejects_files_over_the_size_limit(client, mock_cloudinary_service, monkeypatch):
+    from app.config import settings
+
+    monkeypatch.setattr(settings, "MAX_UPLOAD_SIZE", 1024)
+    app.dependency_overrides[CloudinaryService] = lambda: mock_cloudinary_service
+    login = client.post(
+        "/app/auth/login", data={"username": "deadpool@example.com", "password": "123"}
+    )
+
+    response = client.post(
+        "/app/upload_image",
+        data={"description": "Too large"},
+        files={"file": ("large.jpg", b"\xff" * 2048, "image/jpeg")},
+        headers={"Authorization": f"Bearer {login.json()['access_token']}"}
+    )
+
+    assert response.status_code == 413
+    mock_cloudinary_service.upload_image.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_metadata_errors_never_fail_an_upload(monkeypatch):
+    import struct
+
+    from app.services import ingest_service
+
+    def broken_exif(data):
+        raise struct.error("unpack requires a buffer of 4 bytes")
+
+    monkeypatch.setattr(ingest_service, "extract_metadata", broken_exif)
+    assert await ingest_service.ImageIngest(0).extract(b"malformed") is None
@@ -0,0 +1,54 @@
+import json
+
+import pytest
+from sqlalchemy import select, text
+
+from app.cli.import_images import Checkpoint, Importer
+from app.database.models import Image
+from tests.conftest import TestingSessionLocal
+
+
+def _line(public_id, owner="deadpool@example.com", tags=()):
+    return json.dumps({
+        "url": f"https://example.com/{public_id}.jpg",
+        "public_id": public_id,
+        "owner_email": owner,
+        "description": f"imported {public_id}",
+        "tags": list(tags),
+    })
+
+
+@pytest.mark.asyncio
+async def test_import_manifest_in_batches_and_resume(db_session, tmp_path):
+    manifest = tmp_path / "manifest.jsonl"
+    checkpoint = tmp_path / "manifest.checkpoint"
+    rejects = tmp_path / "rejects.jsonl"
+    manifest.write_text("\n".join([
+        _line("import-1", tags=["sea", "dusk"]),
+        _line("import-2", tags=["sea"]),
+        _line("import-1"),
+        _line("import-3", owner="nobody@example.com"),
+        "not json",
+        json.dumps({"url": "https://example.com/new.jpg", "owner_email": "deadpool@example.com"}),
+    ]) + "\n")
+
+    result = await Importer(rejects, skip_upload=True).run(manifest, checkpoint, 2, TestingSessionLocal)
+
+    assert (result.imported, result.skipped, result.rejected) == (2, 1, 3)
+    assert Checkpoint.load(checkpoint) == result
+    assert len(rejects.read_text().splitlines()) == 3
+    async with TestingSessionLocal() as session:
+        images = (await session.scalars(
+            select(Image).where(Image.public_id.like("import-%")).order_by(Image.public_id)
+        )).all()
+        assert [(image.public_id, image.user_id) for image in images] == [("import-1", 1), ("import-2", 1)]
+        assert await session.scalar(text(
+            "SELECT count(*) FROM image_tag WHERE image_id IN (SELECT id FROM images WHERE public_id LIKE 'import-%')"
+        )) == 3
+
+    with open(manifest, "a") as appended:
+        appended.write(_line("import-4", tags=["dusk"]) + "\n")
+    resumed = await Importer(rejects, skip_upload=True).run(manifest, checkpoint, 2, TestingSessionLocal)
+
+    assert (resumed.imported, resumed.skipped, resumed.rejected) == (3, 1, 3)
+    assert resumed.line == 7
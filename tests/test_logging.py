@@ -0,0 +1,94 @@
+import json
+import logging
+import queue
+import sys
+
+from app.utils.logger import (
+    JsonFormatter,
+    LoggerSetup,
+    NonBlockingQueueHandler,
+    log_context,
+    log_records_dropped,
+)
+
+
+def read_records(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_requests_are_logged_as_json_with_context(client, tmp_path):
+    pipeline = LoggerSetup(tmp_path, level='DEBUG')
+    pipeline.setup_logger()
+    try:
+        token = client.post(
+            "/app/auth/login",
+            data={"username": "deadpool@example.com", "password": "123"}
+        ).json()['access_token']
+        response = client.get(
+            "/app/comments/image/1/",
+            headers={"Authorization": f"Bearer {token}", "X-Request-ID": "req-42"}
+        )
+        generated = client.get("/no/such/path")
+    finally:
+        pipeline.shutdown()
+
+    assert response.headers["x-request-id"] == "req-42"
+    assert len(generated.headers["x-request-id"]) == 32
+    access = [record for record in read_records(tmp_path / "app.log")
+              if record["logger"] == "app.access"]
+    by_id = {record["request_id"]: record for record in access}
+
+    comments = by_id["req-42"]
+    assert comments["route"] == "/app/comments/image/{image_id}/"
+    assert comments["method"] == "GET"
+    assert comments["status"] == response.status_code
+    assert comments["duration_ms"] >= 0
+    assert isinstance(comments["user_id"], int)
+
+    unmatched = by_id[generated.headers["x-request-id"]]
+    assert unmatched["route"] == "<unmatched>"
+    assert unmatched["status"] == 404
+    assert "user_id" not in unmatched
+
+
+def test_debug_records_are_shed_under_backpressure():
+    handler = NonBlockingQueueHandler(queue.Queue(10))
+
+    def dropped(level):
+        return log_records_dropped._values.get((level,), 0)
+
+    debug_before, info_before, error_before = dropped('DEBUG'), dropped('INFO'), dropped('ERROR')
+
+    def record(level):
+        return logging.LogRecord('app.test', level, __file__, 1, 'message %s', (level,), None)
+
+    for _ in range(8):
+        handler.handle(record(logging.INFO))
+    handler.handle(record(logging.DEBUG))
+    handler.handle(record(logging.WARNING))
+    assert handler.queue.qsize() == 9
+    assert dropped('DEBUG') == debug_before + 1
+
+    handler.handle(record(logging.INFO))
+    handler.handle(record(logging.ERROR))
+    assert handler.queue.qsize() == 10
+    assert dropped('ERROR') == error_before + 1
+    assert dropped('INFO') == info_before
+
+
+def test_prepared_records_keep_context_and_traceback():
+    handler = NonBlockingQueueHandler(queue.Queue())
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = logging.getLogger('app.test').makeRecord(
+            'app.test', logging.ERROR, __file__, 1, 'failed %d', (3,), sys.exc_info()
+        )
+    with log_context(request_id='abc', user_id=7):
+        prepared = handler.prepare(record)
+
+    entry = json.loads(JsonFormatter().format(prepared))
+    assert entry['message'] == 'failed 3'
+    assert entry['request_id'] == 'abc'
+    assert entry['user_id'] == 7
+    assert 'ValueError: boom' in entry['exc_info']
@@ -0,0 +1,51 @@
+import re
+
+from app.services.metrics import Counter, Histogram, MetricsRegistry
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    histogram = registry.histogram('latency_seconds', 'Latency.', ('route',), buckets=(0.1, 1.0))
+    counter = registry.counter('hits_total', 'Hits.', ('route',))
+    histogram.observe(0.05, '/a/{id}')
+    histogram.observe(0.5, '/a/{id}')
+    histogram.observe(5, '/a/{id}')
+    counter.inc('/a/{id}')
+    counter.inc('/a/{id}', amount=2)
+
+    text = registry.render()
+    assert '# TYPE latency_seconds histogram' in text
+    assert 'latency_seconds_bucket{route="/a/{id}",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{route="/a/{id}",le="1.0"} 2' in text
+    assert 'latency_seconds_bucket{route="/a/{id}",le="+Inf"} 3' in text
+    assert 'latency_seconds_count{route="/a/{id}"} 3' in text
+    assert 'latency_seconds_sum{route="/a/{id}"} 5.55' in text
+    assert 'hits_total{route="/a/{id}"} 3' in text
+
+
+def test_label_values_are_escaped():
+    counter = Counter('odd_total', 'Odd labels.', ('value',))
+    counter.inc('say "hi"\n')
+    assert list(counter.render())[-1] == 'odd_total{value="say \\"hi\\"\\n"} 1'
+
+
+def test_metrics_endpoint_uses_route_templates(client):
+    client.get('/')
+    client.get('/app/comments/image/12345/')
+    client.get('/no/such/path/777')
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/plain; version=0.0.4')
+    text = response.text
+    assert 'http_requests_total{method="GET",route="/",status="200"}' in text
+    assert (
+        'http_requests_total{method="GET",route="/app/comments/image/{image_id}/",status="401"}'
+        in text
+    )
+    assert 'route="<unmatched>",status="404"' in text
+    routes = set(re.findall(r'route="([^"]*)"', text))
+    assert not any('12345' in route or '777' in route for route in routes)
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/",le="+Inf"}' in text
+    assert '# TYPE event_loop_lag_seconds histogram' in text
+    assert '# TYPE cache_hit_ratio gauge' in text
@@ -0,0 +1,103 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from app.services.profiling import WAITING_FRAME, RequestSampler, profiler
+
+
+@pytest.fixture(autouse=True)
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiler, "directory", tmp_path)
+    yield tmp_path
+    profiler.armed.clear()
+
+
+@pytest.fixture(scope="module")
+def headers(client):
+    response = client.post(
+        "/app/auth/login",
+        data={"username": "deadpool@example.com", "password": "123"}
+    )
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def test_admin_header_profiles_a_single_request(client, headers, profile_dir):
+    response = client.get(
+        "/app/search/images/", headers={**headers, "X-Profile": "1"}
+    )
+    profile_id = response.headers["x-profile-id"]
+    assert (profile_dir / f"{profile_id}.speedscope.json").is_file()
+
+    listed = client.get("/app/admin_panel/profiling/profiles", headers=headers).json()
+    assert listed[0]["id"] == profile_id
+    assert listed[0]["route"] == "/app/search/images/"
+    assert listed[0]["trigger"] == "header"
+
+    document = client.get(
+        f"/app/admin_panel/profiling/profiles/{profile_id}", headers=headers
+    ).json()
+    assert document["profiles"][0]["type"] == "sampled"
+    assert len(document["profiles"][0]["samples"]) == listed[0]["samples"]
+
+    folded = client.get(
+        f"/app/admin_panel/profiling/profiles/{profile_id}",
+        params={"format": "collapsed"},
+        headers=headers
+    )
+    assert folded.headers["content-type"].startswith("text/plain")
+
+
+def test_profile_header_needs_an_admin_token(client):
+    assert "x-profile-id" not in client.get("/", headers={"X-Profile": "1"}).headers
+    response = client.get("/", headers={"X-Profile": "1", "Authorization": "Bearer nope"})
+    assert response.status_code == 200
+    assert "x-profile-id" not in response.headers
+
+
+def test_armed_route_profiles_the_next_requests(client, headers):
+    response = client.post(
+        "/app/admin_panel/profiling/routes", json={"route": "/", "count": 2}, headers=headers
+    )
+    assert response.json() == {"route": "/", "remaining": 2}
+
+    profiled = ["x-profile-id" in client.get("/").headers for _ in range(3)]
+    assert profiled == [True, True, False]
+    assert client.get("/app/admin_panel/profiling/routes", headers=headers).json() == []
+
+    unknown = client.post(
+        "/app/admin_panel/profiling/routes", json={"route": "/nope", "count": 1}, headers=headers
+    )
+    assert unknown.status_code == 404
+    disarmed = client.delete(
+        "/app/admin_panel/profiling/routes", params={"route": "/"}, headers=headers
+    )
+    assert disarmed.status_code == 404
+
+
+def test_profiling_endpoints_are_admin_only(client):
+    assert client.get("/app/admin_panel/profiling/profiles").status_code == 401
+    assert client.get("/app/admin_panel/profiling/profiles/abc").status_code == 401
+
+
+def test_sampler_separates_running_and_waiting_time():
+    def spin(seconds):
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            pass
+
+    async def request():
+        sampler = RequestSampler(0.001)
+        sampler.start()
+        spin(0.03)
+        await asyncio.sleep(0.03)
+        sampler.stop()
+        return sampler
+
+    samples = asyncio.run(request()).samples
+    names = [frame["name"] for frame in samples.frames]
+    leaves = [names[stack[-1]] for stack in samples.stacks]
+    assert any(leaf.endswith("spin") for leaf in leaves)
+    assert WAITING_FRAME in leaves
+    assert json.dumps(samples.frames)
@@ -0,0 +1,139 @@
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import text
+
+from app.config import settings
+from app.database.models import Comment, Image, Rating, Tag, User
+import app.services.purge_service as purge_service
+from app.services.purge_service import PurgeJob, run_purge
+from tests.conftest import TestingSessionLocal
+
+
+@pytest.fixture(scope="module")
+def headers(client):
+    response = client.post(
+        "/app/auth/login",
+        data={"username": "deadpool@example.com", "password": "123"}
+    )
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def _count(session, statement, **params):
+    return await session.scalar(text(statement), params)
+
+
+@pytest.mark.asyncio
+async def test_purge_removes_everything_a_user_posted(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "PURGE_BATCH_SIZE", 2)
+    spammer = User(username="spammer", email="spam@example.com", password_hash="x")
+    other = User(username="other", email="other@example.com", password_hash="x")
+    db_session.add_all([spammer, other])
+    await db_session.flush()
+
+    spam = [
+        Image(description=f"spam {n}", image_url="u", user_id=spammer.id,
+              public_id=f"spam-{n}", tags=[Tag(name=f"spam-{n}")])
+        for n in range(5)
+    ]
+    kept = Image(description="kept", image_url="u", user_id=other.id, public_id="kept")
+    db_session.add_all([*spam, kept])
+    await db_session.flush()
+    db_session.add_all([
+        Comment(text="reply", user_id=other.id, image_id=spam[0].id),
+        Rating(value=5, user_id=other.id, image_id=spam[0].id),
+        Comment(text="kept comment", user_id=other.id, image_id=kept.id),
+        Comment(text="spam 1", user_id=spammer.id, image_id=kept.id),
+        Comment(text="spam 2", user_id=spammer.id, image_id=kept.id),
+        Comment(text="spam 3", user_id=spammer.id, image_id=kept.id),
+        Rating(value=1, user_id=spammer.id, image_id=kept.id),
+        Rating(value=4, user_id=1, image_id=kept.id),
+    ])
+    await db_session.commit()
+
+    job = PurgeJob("job", spammer.id, requested_by=1)
+    with patch("cloudinary.api.delete_resources") as delete_resources:
+        await run_purge(job, TestingSessionLocal)
+
+    assert job.status == "done", job.error
+    assert (job.images_deleted, job.comments_deleted, job.ratings_deleted) == (5, 3, 1)
+    destroyed = [public_id for call in delete_resources.call_args_list for public_id in call.args[0]]
+    assert sorted(destroyed) == [f"spam-{n}" for n in range(5)]
+    assert job.assets_destroyed == 5
+
+    async with TestingSessionLocal() as session:
+        for table, column in (("images", "user_id"), ("comments", "user_id"), ("ratings", "user_id")):
+            assert await _count(
+                session, f"SELECT count(*) FROM {table} WHERE {column} = :id", id=spammer.id
+            ) == 0, table
+        spam_ids = ", ".join(str(image.id) for image in spam)
+        for table in ("comments", "ratings", "image_tag"):
+            assert await _count(
+                session, f"SELECT count(*) FROM {table} WHERE image_id IN ({spam_ids})"
+            ) == 0, table
+        row = (await session.execute(
+            text("SELECT comment_count, last_comment_text, average_rating FROM images WHERE id = :id"),
+            {"id": kept.id}
+        )).one()
+        assert tuple(row) == (1, "kept comment", 4.0)
+
+
+def test_purge_endpoint_reports_a_job(client, headers, monkeypatch):
+    async def runner(job, session_factory):
+        job.status = "done"
+
+    # the test client closes its event loop after every request
+    monkeypatch.setattr(purge_service, "run_purge", runner)
+    assert client.post("/app/admin_panel/purge-user/999", headers=headers).status_code == 404
+    assert client.post("/app/admin_panel/purge-user/1").status_code == 401
+
+    response = client.post("/app/admin_panel/purge-user/1", headers=headers)
+    assert response.status_code == 202
+    job = response.json()
+    assert job["user_id"] == 1
+    assert job["requested_by"] == 1
+
+    status = client.get(f"/app/admin_panel/purge-jobs/{job['id']}", headers=headers)
+    assert status.status_code == 200
+    assert status.json()["id"] == job["id"]
+    listed = client.get("/app/admin_panel/purge-jobs", headers=headers).json()
+    assert listed[0]["id"] == job["id"]
+    assert client.get("/app/admin_panel/purge-jobs/nope", headers=headers).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_taken_storage_deletions_survive_a_crash(monkeypatch):
+    from unittest.mock import AsyncMock
+
+    import app.services.image_service as image_service
+    from app.services.image_service import storage_deletions
+    from tests.fake_redis import FakeRedis
+
+    redis = FakeRedis()
+    monkeypatch.setattr(storage_deletions, "_get_client", AsyncMock(return_value=redis))
+    queue, processing = storage_deletions._queue_keys()
+    await storage_deletions.push(["a", "b", "c"])
+
+    # a janitor took a batch and died before destroying it
+    assert sorted(await storage_deletions.take(2)) == ["b", "c"]
+    assert redis.lists[queue] == ["a"]
+    assert await storage_deletions.requeue() == 2
+    assert redis.lists[processing] == []
+
+    destroyed = []
+
+    def destroy(public_ids):
+        if "a" in public_ids and not destroyed:
+            destroyed.append(None)
+            raise RuntimeError("rate limited")
+        destroyed.extend(public_ids)
+
+    monkeypatch.setattr(image_service, "destroy_assets", destroy)
+    monkeypatch.setattr(settings, "STORAGE_DELETE_BATCH", 10)
+    # the failed batch is queued again, not left in processing
+    assert await image_service.storage_janitor.flush_once() == 0
+    assert sorted(redis.lists[queue]) == ["a", "b", "c"] and redis.lists[processing] == []
+
+    assert await image_service.storage_janitor.flush_once() == 3
+    assert sorted(destroyed[1:]) == ["a", "b", "c"]
+    assert redis.lists[queue] == [] and redis.lists[processing] == []
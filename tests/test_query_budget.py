@@ -0,0 +1,47 @@
+import pytest
+
+from app.database.query_stats import QueryStats
+
+
+@pytest.fixture(scope="module")
+def headers(client):
+    response = client.post(
+        "/app/auth/login",
+        data={"username": "deadpool@example.com", "password": "123"}
+    )
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def test_server_timing_header_counts_queries(client, headers):
+    response = client.get("/app/search/images/", params={"limit": 5}, headers=headers)
+    assert response.status_code == 200
+    timing = response.headers["server-timing"]
+    assert timing.startswith("db;dur=")
+    assert 'queries"' in timing
+
+
+def test_read_endpoints_stay_within_budget(client, headers, query_budget):
+    with query_budget(4) as seen:
+        client.get("/app/search/images/", params={"limit": 20}, headers=headers)
+        client.get("/app/comments/image/1/", params={"include_author": True}, headers=headers)
+        client.get("/app/users/test", headers=headers)
+    assert [route for route, _ in seen] == [
+        "/app/search/images/",
+        "/app/comments/image/{image_id}/",
+        "/app/users/{username}",
+    ]
+
+
+def test_query_budget_fails_when_exceeded(client, headers, query_budget):
+    with pytest.raises(pytest.fail.Exception, match="Query budget exceeded"):
+        with query_budget(0):
+            client.get("/app/search/images/", params={"limit": 5}, headers=headers)
+
+
+def test_repeated_statements_are_reported():
+    stats = QueryStats()
+    for _ in range(6):
+        stats.record("SELECT * FROM tags WHERE id = ?", 0.001)
+    stats.record("SELECT 1", 0.001)
+    assert stats.count == 7
+    assert stats.repeated(5) == [("SELECT * FROM tags WHERE id = ?", 6)]
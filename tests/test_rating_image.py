@@ -142,3 +142,229 @@ async def test_user_role_USER_cant_delete_rate(client, db_session):
        headers={"Authorization": f"Bearer {access_token_USER}"}
     )
     assert add_rate_response.status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.mark.asyncio
+async def test_leaderboard_orders_by_average_with_min_votes(client, db_session):
+    second_image = Image(
+        description="Runner-up",
+        image_url="https://example.com/runner-up.jpg",
+        user_id=1,
+        public_id="leaderboard-public-id"
+    )
+    db_session.add(second_image)
+    await db_session.flush()
+    db_session.add(Rating(value=5, user_id=2, image_id=second_image.id))
+    await db_session.commit()
+
+    login_data = {"username": "deadpool@example.com", "password": "123"}
+    response_login = client.post("/app/auth/login", data=login_data)
+    headers = {"Authorization": f"Bearer {response_login.json()['access_token']}"}
+
+    response = client.get("/app/leaderboard/", params={"window": "all"}, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    board = response.json()
+    assert [entry["image_id"] for entry in board] == [second_image.id, 1]
+    assert board[0]["rank"] == 1
+    assert board[0]["average_rating"] == 5.0
+    assert board[0]["votes"] == 1
+    assert board[0]["image"]["description"] == "Runner-up"
+
+    response = client.get("/app/leaderboard/", params={"min_votes": 2}, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == []
+
+    response = client.get("/app/leaderboard/", params={"window": "year"}, headers=headers)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.asyncio
+async def test_write_behind_rating_is_flushed(db_session, monkeypatch):
+    from fastapi import HTTPException
+    from unittest.mock import AsyncMock
+
+    from app.services.rating_cache import pending_ratings
+    from app.services.rating_service import accept_rating, rating_flusher
+    from tests.fake_redis import FakeRedis
+
+    monkeypatch.setattr(pending_ratings, "_get_client", AsyncMock(return_value=FakeRedis()))
+
+    image = Image(
+        description="Write-behind",
+        image_url="https://example.com/write-behind.jpg",
+        user_id=1,
+        public_id="write-behind-public-id"
+    )
+    db_session.add(image)
+    await db_session.flush()
+    db_session.add(Rating(value=5, user_id=2, image_id=image.id))
+    await db_session.commit()
+
+    accepted = await accept_rating(image.id, 3, 2, db_session)
+    assert accepted["average_rating"] == 3.5
+    with pytest.raises(HTTPException) as err:
+        await accept_rating(image.id, 2, 1, db_session)
+    assert err.value.status_code == status.HTTP_400_BAD_REQUEST
+
+    # nothing in the database until the flusher runs
+    ratings = await db_session.execute(select(Rating).where(Rating.image_id == image.id))
+    assert len(ratings.scalars().all()) == 1
+
+    assert await rating_flusher.flush_once(db_session) == 1
+    assert await rating_flusher.flush_once(db_session) == 0
+
+    ratings = await db_session.execute(select(Rating).where(Rating.image_id == image.id))
+    assert sorted(rating.value for rating in ratings.scalars().all()) == [2, 5]
+    await db_session.refresh(image)
+    assert image.average_rating == 3.5
+    assert await pending_ratings.averages([image.id]) == {}
+
+
+@pytest.mark.asyncio
+async def test_write_behind_votes_survive_failed_and_interrupted_flushes(db_session, monkeypatch):
+    from unittest.mock import AsyncMock
+
+    from app.repository.ratings import crud_ratings
+    from app.services.rating_cache import pending_ratings
+    from app.services.rating_service import accept_rating, rating_flusher
+    from tests.fake_redis import FakeRedis
+
+    redis = FakeRedis()
+    monkeypatch.setattr(pending_ratings, "_get_client", AsyncMock(return_value=redis))
+    image = Image(
+        description="Flaky flush",
+        image_url="https://example.com/flaky.jpg",
+        user_id=1,
+        public_id="flaky-flush-public-id"
+    )
+    voter = User(username="late_voter", email="late_voter@example.com", password_hash="x")
+    db_session.add_all([image, voter])
+    await db_session.flush()
+    await db_session.commit()
+    image_id, voter_id = image.id, voter.id
+    dirty = pending_ratings._key("ratings", "dirty")
+
+    await accept_rating(image_id, 2, 4, db_session)
+    with monkeypatch.context() as patched:
+        patched.setattr(crud_ratings, "persist_pending", AsyncMock(side_effect=RuntimeError("db down")))
+        assert await rating_flusher.flush_once(db_session) == 0
+    assert str(image_id) in redis.sets[dirty]
+
+    # a vote after the failure, and a batch a crashed flusher left behind
+    await accept_rating(image_id, 3, 2, db_session)
+    redis.hashes[pending_ratings._rating_key("flushing", image_id)] = {str(voter_id): "5"}
+    redis.sets[pending_ratings._rating_key("voters", image_id)].add(str(voter_id))
+
+    # another worker holds the lease
+    await redis.set(pending_ratings._rating_key("lock", image_id), "other", nx=True)
+    assert await rating_flusher.flush_once(db_session) == 0
+    await redis.delete(pending_ratings._rating_key("lock", image_id))
+
+    assert await rating_flusher.flush_once(db_session) == 3
+    ratings = await db_session.execute(select(Rating).where(Rating.image_id == image_id))
+    assert sorted((r.user_id, r.value) for r in ratings.scalars().all()) == [(2, 4), (3, 2), (voter_id, 5)]
+    assert str(image_id) not in redis.sets[dirty]
+    assert redis.hashes[pending_ratings._rating_key("totals", image_id)] == {"sum": "11.0", "count": "3"}
+    assert await pending_ratings.averages([image_id]) == {}
+
+
+@pytest.mark.asyncio
+async def test_synchronous_rating_updates_write_behind_state(db_session, monkeypatch):
+    from unittest.mock import AsyncMock
+
+    from app.repository.ratings import crud_ratings
+    from app.services.rating_cache import pending_ratings
+    from tests.fake_redis import FakeRedis
+
+    redis = FakeRedis()
+    monkeypatch.setattr(pending_ratings, "_get_client", AsyncMock(return_value=redis))
+    image = Image(
+        description="Sync fallback",
+        image_url="https://example.com/sync.jpg",
+        user_id=1,
+        public_id="sync-fallback-public-id"
+    )
+    db_session.add(image)
+    await db_session.flush()
+    await db_session.commit()
+    await pending_ratings.seed(image.id, [], 0.0, 0)
+    await pending_ratings.accept(image.id, 2, 2)
+
+    await crud_ratings.add_rating(image.id, 3, 4, db_session)
+
+    assert await pending_ratings.accept(image.id, 3, 5) is False
+    assert await pending_ratings.averages([image.id]) == {image.id: 3.0}
+
+
+@pytest.mark.asyncio
+async def test_leaderboard_rebuild_keeps_votes_recorded_meanwhile(monkeypatch):
+    from datetime import datetime
+    from unittest.mock import AsyncMock
+
+    from app.config import settings
+    from app.services.leaderboard_cache import leaderboard, LeaderboardWindow
+    from tests.fake_redis import FakeRedis
+
+    monkeypatch.setattr(leaderboard, "_get_client", AsyncMock(return_value=FakeRedis()))
+    now = datetime(2025, 3, 1, 12, 0)
+    await leaderboard.rebuild(LeaderboardWindow.all, now, AsyncMock(return_value=[(1, 3.0, 1)]))
+    # recorded before the next rebuild: already in its snapshot, not journaled
+    await leaderboard.record(1, 3.0, rated_at=now)
+
+    async def load_totals():
+        # a vote committed after the snapshot was read
+        await leaderboard.record(2, 5.0, rated_at=now)
+        return [(1, 6.0, 2)]
+
+    # the bucket is due again
+    leaderboard_key = leaderboard._bucket_key(LeaderboardWindow.all, now)
+    client = await leaderboard._get_client()
+    await client.delete(leaderboard_key + ":fresh")
+    assert await leaderboard.rebuild(LeaderboardWindow.all, now, load_totals)
+
+    top = await leaderboard.top(LeaderboardWindow.all, now, 10, 1)
+    assert [(entry.image_id, entry.average_rating, entry.votes) for entry in top] == [
+        (2, 5.0, 1), (1, 3.0, 2)
+    ]
+    assert not [key for key in client.lists if ":journal:" in key or ":replay:" in key]
+
+    monkeypatch.setattr(settings, "LEADERBOARD_SCAN_LIMIT", 1)
+    # nothing qualifies within the scanned entries: the caller asks SQL
+    assert await leaderboard.top(LeaderboardWindow.all, now, 1, 3) is None
+
+
+@pytest.mark.asyncio
+async def test_due_leaderboard_serves_the_old_bucket_while_rebuilding(monkeypatch):
+    from datetime import datetime
+    from unittest.mock import AsyncMock
+
+    from app.services import leaderboard_service
+    from app.services.leaderboard_cache import leaderboard, LeaderboardWindow
+    from tests.fake_redis import FakeRedis
+
+    redis = FakeRedis()
+    monkeypatch.setattr(leaderboard, "_get_client", AsyncMock(return_value=redis))
+    top_rated = AsyncMock(return_value=[(9, 4.0, 1)])
+    totals = AsyncMock(return_value=[(1, 5.0, 1)])
+    monkeypatch.setattr(leaderboard_service.crud_ratings, "get_top_rated", top_rated)
+    monkeypatch.setattr(leaderboard_service.crud_ratings, "get_rating_totals", totals)
+    now = datetime(2025, 3, 1, 12, 0)
+    window = LeaderboardWindow.week
+
+    # no bucket at all: the aggregate answers and the bucket is built meanwhile
+    entries = await leaderboard_service._top_entries(None, window, 10, 1, now)
+    assert [entry.image_id for entry in entries] == [9]
+    await leaderboard_service._rebuilds[window]
+    totals.assert_awaited_once()
+
+    # due again: the old bucket answers, no aggregate on the read path
+    totals.return_value = [(2, 3.0, 1)]
+    await redis.delete(leaderboard._bucket_key(window, now) + ":fresh")
+    entries = await leaderboard_service._top_entries(None, window, 10, 1, now)
+    assert [entry.image_id for entry in entries] == [1]
+    top_rated.assert_awaited_once()
+    await leaderboard_service._rebuilds[window]
+
+    entries = await leaderboard_service._top_entries(None, window, 10, 1, now)
+    assert [entry.image_id for entry in entries] == [2]
+    assert totals.await_count == 2
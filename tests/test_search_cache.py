@@ -0,0 +1,159 @@
+import asyncio
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock
+import pytest
+
+from app.services.cache_service import (
+    CachedResponse,
+    CacheMetrics,
+    CacheScope,
+    CacheVersions,
+    ResponseCache,
+)
+import app.schemas as sch
+from app.repository.images import ImageCard
+from app.services.search_service import image_cards_serializer, normalize_search_params
+
+
+def make_cache(mock_redis):
+    redis_client = MagicMock()
+    redis_client.get_redis_client = AsyncMock(return_value=mock_redis)
+    metrics = CacheMetrics()
+    return ResponseCache(redis_client, CacheVersions(redis_client), metrics), metrics
+
+
+def test_equivalent_searches_share_key():
+    first = normalize_search_params("Sunset", None, "whatever", None, None)
+    second = normalize_search_params("sunset", "", "date", "", 0)
+
+    assert ResponseCache.make_digest(first) == ResponseCache.make_digest(second)
+    assert first != normalize_search_params("sunset", None, "rating", None, None)
+
+
+@pytest.mark.asyncio
+async def test_cache_hit_skips_producer():
+    mock_redis = AsyncMock()
+    mock_redis.mget = AsyncMock(return_value=["3", None, "1"])
+    mock_redis.get = AsyncMock(
+        return_value=CachedResponse(b'[]', {"X-Next-Cursor": "abc"}).pack()
+    )
+    cache, metrics = make_cache(mock_redis)
+    producer = AsyncMock()
+
+    response, hit = await cache.get_or_set(
+        "image_search", {"query": ""}, [CacheScope.images], producer, ttl=60
+    )
+
+    assert hit is True
+    assert response.body == b'[]'
+    assert response.headers == {"X-Next-Cursor": "abc"}
+    producer.assert_not_called()
+    assert mock_redis.get.call_args.args[0].split(":")[3] == "3.0.1"
+    assert metrics.snapshot()["image_search"]["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_run_producer_once():
+    mock_redis = AsyncMock()
+    mock_redis.mget = AsyncMock(return_value=[None])
+    mock_redis.get = AsyncMock(return_value=None)
+    mock_redis.set = AsyncMock(return_value=True)
+    cache, metrics = make_cache(mock_redis)
+
+    async def producer():
+        await asyncio.sleep(0.01)
+        return CachedResponse(b'[{"id": 1}]')
+
+    producer_mock = AsyncMock(side_effect=producer)
+    results = await asyncio.gather(*[
+        cache.get_or_set(
+            "image_search", {"query": "cat"}, [CacheScope.images], producer_mock, ttl=60
+        )
+        for _ in range(5)
+    ])
+
+    assert producer_mock.await_count == 1
+    assert all(response.body == b'[{"id": 1}]' for response, _ in results)
+    assert metrics.snapshot()["image_search"]["coalesced"] == 4
+
+
+@pytest.mark.asyncio
+async def test_redis_failure_falls_back_to_producer():
+    mock_redis = AsyncMock()
+    mock_redis.mget = AsyncMock(side_effect=OSError("connection refused"))
+    cache, metrics = make_cache(mock_redis)
+    producer = AsyncMock(return_value=CachedResponse(b'[]'))
+
+    response, hit = await cache.get_or_set(
+        "image_search", {}, [CacheScope.images], producer, ttl=60
+    )
+
+    assert hit is False
+    assert response.body == b'[]'
+    producer.assert_awaited_once()
+    assert metrics.snapshot()["image_search"]["bypass"] == 1
+
+
+def test_trusted_serializer_matches_schema_json():
+    card = ImageCard(
+        id=1,
+        description="sunset",
+        image_url="https://example.com/1.jpg",
+        user_id=2,
+        tags=["sea", "sky"],
+        average_rating=4.5,
+        created_at=datetime(2025, 2, 20, 10, 0, 0),
+        comment_count=0,
+        last_comment=None,
+        width=640,
+        height=480,
+    )
+    schema = sch.ImageResponseSchema(
+        id=1,
+        description="sunset",
+        image_url="https://example.com/1.jpg",
+        user_id=2,
+        tags=["sea", "sky"],
+        average_rating=4.5,
+        created_at=datetime(2025, 2, 20, 10, 0, 0),
+        width=640,
+        height=480,
+    )
+
+    assert image_cards_serializer.dump([card]) == (
+        b"[" + schema.model_dump_json(by_alias=True).encode() + b"]"
+    )
+
+
+@pytest.mark.asyncio
+async def test_rating_pages_follow_stored_averages_with_write_behind(db_session, monkeypatch):
+    import json
+
+    from app.config import settings
+    from app.database.models import Image
+    from app.services.rating_cache import pending_ratings
+    from app.services.search_service import cached_image_search
+    from tests.fake_redis import FakeRedis
+
+    monkeypatch.setattr(settings, "RATINGS_WRITE_BEHIND", True)
+    monkeypatch.setattr(pending_ratings, "_get_client", AsyncMock(return_value=FakeRedis()))
+    images = [
+        Image(description=f"keyset-merge {rating}", image_url="u", user_id=1,
+              public_id=f"keyset-merge-{rating}", average_rating=rating)
+        for rating in (5.0, 4.0, 3.0)
+    ]
+    db_session.add_all(images)
+    await db_session.commit()
+    # a pending vote drags the middle image below the last one
+    await pending_ratings.seed(images[1].id, [], 4.0, 1)
+    await pending_ratings.accept(images[1].id, 2, 1)
+
+    seen, cursor = [], None
+    for _ in range(3):
+        response = await cached_image_search(
+            db_session, query="keyset-merge", order_by="rating", limit=1, cursor=cursor
+        )
+        seen.extend((card["description"], card["average_rating"]) for card in json.loads(response.body))
+        cursor = response.headers["X-Next-Cursor"]
+
+    assert seen == [("keyset-merge 5.0", 5.0), ("keyset-merge 4.0", 2.5), ("keyset-merge 3.0", 3.0)]
@@ -1,6 +1,8 @@
 import pytest
 from fastapi import status
 
+from app.database.models import Image, Tag
+
 
 @pytest.mark.asyncio
 async def test_search_by_fail_param(client, db_session):
@@ -62,6 +64,10 @@ async def test_search_without_params_but_have_bind_image(client, db_session):
             'image_url': 'https://example.com/test.jpg',
             'tags': [],
             'user_id': 1,
+            'comment_count': 0,
+            'last_comment': None,
+            'width': None,
+            'height': None,
         },
 
     ]
@@ -149,3 +155,36 @@ async def test_search_variable_parameter(client, db_session):
         # remove elements
         img.pop('created_at', None)
         expected_img.pop('created_at', None)
+
+@pytest.mark.asyncio
+async def test_search_by_tag_returns_all_image_tags(client, db_session):
+    """
+    tag filter must not cut the aggregated tag list of the image
+    """
+    image = Image(
+        description="Beach",
+        image_url="https://example.com/beach.jpg",
+        user_id=1,
+        public_id="beach-public-id"
+    )
+    image.tags = [Tag(name="sea"), Tag(name="sun")]
+    db_session.add(image)
+    await db_session.commit()
+
+    login_data = {
+        "username": "deadpool@example.com",
+        "password": "123"
+    }
+    response_login = client.post("/app/auth/login", data=login_data)
+    assert response_login.status_code == status.HTTP_200_OK
+    access_token = response_login.json()["access_token"]
+
+    search_response = client.get(
+            "/app/search/images/",
+            params={"tag": "sea"},
+            headers={"Authorization": f"Bearer {access_token}"}
+        )
+    assert search_response.status_code == status.HTTP_200_OK
+    found = search_response.json()
+    assert [img["id"] for img in found] == [image.id]
+    assert sorted(found[0]["tags"]) == ["sea", "sun"]
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.database.slow_queries import (
+    SlowQueryLog,
+    StatementStats,
+    normalize,
+    parameter_shape,
+    slow_query_log,
+)
+
+
+@pytest.fixture(scope="module")
+def headers(client):
+    response = client.post(
+        "/app/auth/login",
+        data={"username": "deadpool@example.com", "password": "123"}
+    )
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture
+def everything_is_slow(monkeypatch):
+    monkeypatch.setattr(slow_query_log, "threshold_ms", 1e-9)
+    slow_query_log.reset()
+    yield
+    slow_query_log.reset()
+
+
+def test_fingerprints_fold_literals_and_placeholder_lists():
+    first = normalize("SELECT *  FROM images\n WHERE id IN (?, ?, ?) AND description = 'a''b' LIMIT 20")
+    second = normalize("SELECT * FROM images WHERE id IN ($1, $2) AND description = 'x' LIMIT 5")
+    assert first == second == "SELECT * FROM images WHERE id IN (...) AND description = ? LIMIT ?"
+    assert normalize("SELECT images_1.id FROM images AS images_1") == (
+        "SELECT images_1.id FROM images AS images_1"
+    )
+
+
+def test_parameter_shapes_leave_values_out():
+    assert parameter_shape(("secret@example.com", 3, None)) == "(str[18], int, null)"
+    assert parameter_shape({"name": "x", "ids": [1, 2]}) == "{name: str[1], ids: list[2]}"
+    assert parameter_shape([(1,), (2,)], executemany=True) == "2 x (int)"
+
+
+def test_slow_statements_are_logged_and_listed(client, headers, everything_is_slow, caplog):
+    with caplog.at_level(logging.WARNING, logger="app.database.slow_queries"):
+        client.get("/app/search/images/", params={"limit": 5}, headers=headers)
+    assert any(record.message.startswith("Slow query") for record in caplog.records)
+
+    response = client.get("/app/admin_panel/slow-queries", params={"limit": 100}, headers=headers)
+    assert response.status_code == 200
+    entries = response.json()
+    search = [entry for entry in entries if entry["last_operation"] == "ImageCrud.search_images"]
+    assert search, entries
+    assert search[0]["last_route"] == "/app/search/images/"
+    assert search[0]["slow_calls"] >= 1
+    assert "deadpool" not in search[0]["last_parameters"]
+    assert [entry["total_ms"] for entry in entries] == sorted(
+        (entry["total_ms"] for entry in entries), reverse=True
+    )
+
+    assert client.delete("/app/admin_panel/slow-queries", headers=headers).status_code == 204
+    assert client.get("/app/admin_panel/slow-queries").status_code == 401
+
+
+def test_plans_are_only_captured_for_postgres_reads():
+    log = SlowQueryLog(threshold_ms=1, max_fingerprints=10)
+    postgres = SimpleNamespace(dialect=SimpleNamespace(name="postgresql"))
+    sqlite = SimpleNamespace(dialect=SimpleNamespace(name="sqlite"))
+    stats = StatementStats("f", "SELECT ?")
+
+    async def decisions():
+        return [
+            log._should_explain(postgres, stats, "SELECT 1", False),
+            log._should_explain(postgres, stats, "UPDATE images SET description = $1", False),
+            log._should_explain(postgres, stats, "SELECT 1", True),
+            log._should_explain(sqlite, stats, "SELECT 1", False),
+        ]
+
+    assert asyncio.run(decisions()) == [True, False, False, False]
+    stats.plan_captured_at = time.time()
+    assert asyncio.run(decisions())[0] is False
+
+
+def test_fingerprint_table_is_bounded():
+    log = SlowQueryLog(threshold_ms=100, max_fingerprints=2)
+    log.record("SELECT a FROM t", 5)
+    log.record("SELECT b FROM t", 1)
+    log.record("SELECT c FROM t", 3)
+    assert [stats.statement for stats in log.top()] == ["SELECT a FROM t", "SELECT c FROM t"]
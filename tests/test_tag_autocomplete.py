@@ -0,0 +1,119 @@
+import pytest
+from fastapi import status
+
+from app.services.tag_index import TagPrefixIndex, tag_index
+
+
+def test_prefix_index_ranks_by_usage():
+    index = TagPrefixIndex()
+    index.load([("Sunset", 5), ("sun", 9), ("summer", 7), ("sea", 1)])
+
+    assert index.suggest("su") == [("sun", 9), ("summer", 7), ("Sunset", 5)]
+    assert index.suggest("SUN", limit=1) == [("sun", 9)]
+    assert index.suggest("x") == []
+
+    index.record_usage(["sunrise"], delta=10)
+    assert index.suggest("sun", limit=2) == [("sunrise", 10), ("sun", 9)]
+
+
+def test_prefix_index_memo_follows_updates():
+    index = TagPrefixIndex()
+    index.SCAN_LIMIT = 1
+    index.load([("cat", 3), ("car", 2), ("cab", 1)])
+
+    assert index.suggest("ca", limit=2) == [("cat", 3), ("car", 2)]
+    index.record_usage(["cab"], delta=5)
+    assert index.suggest("ca", limit=2) == [("cab", 6), ("cat", 3)]
+
+
+@pytest.mark.asyncio
+async def test_autocomplete_endpoint(client, db_session):
+    login_data = {"username": "deadpool@example.com", "password": "123"}
+    response_login = client.post("/app/auth/login", data=login_data)
+    headers = {"Authorization": f"Bearer {response_login.json()['access_token']}"}
+
+    tag_index.loaded_at = None
+    response = client.get(
+        "/app/tags/autocomplete/", params={"q": "zzz-none"}, headers=headers
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == []
+
+    tag_index.record_usage(["zzz-none-yet"])
+    response = client.get(
+        "/app/tags/autocomplete/", params={"q": "ZZZ"}, headers=headers
+    )
+    assert response.json() == [{"name": "zzz-none-yet", "count": 1}]
+
+
+@pytest.mark.asyncio
+async def test_reload_is_single_flight_and_replays_usage():
+    import asyncio
+
+    index = TagPrefixIndex()
+    index.load([("old", 1)])
+    index.loaded_at = None
+    started, release = asyncio.Event(), asyncio.Event()
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        started.set()
+        await release.wait()
+        return [("new", 2)]
+
+    first = asyncio.create_task(index.reload(loader))
+    await started.wait()
+    index.loaded_at = 0.0  # loaded before: a second reload does not wait
+    await index.reload(loader)
+    # recorded while the reload runs, kept after the swap
+    index.record_usage(["new", "later"])
+    assert index.suggest("old") == [("old", 1)]
+    release.set()
+    await first
+
+    assert len(calls) == 1
+    assert index.suggest("new") == [("new", 3)]
+    assert index.suggest("later") == [("later", 1)]
+    assert index.suggest("old") == []
+
+
+@pytest.mark.asyncio
+async def test_deleted_images_lower_tag_usage(db_session, monkeypatch):
+    from app.database.models import Image, Tag
+    from app.repository.images import crud_images
+
+    index = TagPrefixIndex()
+    monkeypatch.setattr("app.repository.images.tag_index", index)
+    image = Image(description="tagged", image_url="u", user_id=1,
+                  public_id="usage-drop", tags=[Tag(name="usage-drop")])
+    db_session.add(image)
+    await db_session.commit()
+    index.load([("usage-drop", 1)])
+
+    tag_names = await crud_images.get_image_tag_names([image.id], db_session)
+    await crud_images.delete_image_rows([image.id], db_session)
+    await db_session.commit()
+    await crud_images.forget_deleted_images([image.id], 1, db_session, tag_names)
+
+    assert index.suggest("usage") == [("usage-drop", 0)]
+
+
+@pytest.mark.asyncio
+async def test_tagging_a_new_image_counts_usage_with_expired_tags():
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    from app.repository.images import crud_images
+    from tests.conftest import engine
+
+    # the application sessions expire everything on commit
+    Session = async_sessionmaker(bind=engine, expire_on_commit=True)
+    async with Session() as session:
+        tags = await crud_images.handle_tags(["expired-tag-a", "expired-tag-b"], session)
+        image = await crud_images.create_image(
+            "https://example.com/expired.jpg", "expired tags", 1, "expired-tags", session
+        )
+        await crud_images._add_tag_to_image(image, tags, session)
+
+        assert sorted(tag.name for tag in image.tags) == ["expired-tag-a", "expired-tag-b"]
+    assert tag_index.suggest("expired-tag") == [("expired-tag-a", 1), ("expired-tag-b", 1)]
@@ -0,0 +1,110 @@
+import asyncio
+import json
+
+import pytest
+
+from app.services.tracing import FileExporter, InMemoryExporter, Tracer, tracer
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+@pytest.fixture
+def spans():
+    """Sample every request into a fresh in-memory exporter."""
+    exporter, sample_rate = tracer.exporter, tracer.sample_rate
+    collector = InMemoryExporter()
+    tracer.exporter, tracer.sample_rate = collector, 1.0
+    yield collector
+    tracer.exporter, tracer.sample_rate = exporter, sample_rate
+
+
+@pytest.fixture(scope="module")
+def headers(client):
+    response = client.post(
+        "/app/auth/login",
+        data={"username": "deadpool@example.com", "password": "123"}
+    )
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def test_request_trace_covers_repository_and_sql(client, headers, spans):
+    response = client.get("/app/comments/image/1/", headers=headers)
+
+    roots = [span for span in spans.spans() if span.parent_id is None]
+    assert [span.name for span in roots] == ["GET /app/comments/image/{image_id}/"]
+    root = roots[0]
+    assert root.attributes["http.status_code"] == response.status_code
+
+    trace = spans.spans(root.trace_id)
+    names = {span.name for span in trace}
+    assert "UserCrud.get_user_by_email" in names
+    handler = next(span for span in trace if span.name == "handler.get_comments_for_image")
+    assert handler.parent_id == root.span_id
+    assert any(name.startswith("CommentCrud.") for name in names)
+    assert "sql" in names
+    span_ids = {span.span_id for span in trace}
+    assert all(span.parent_id in span_ids for span in trace if span is not root)
+    assert all(span.duration <= root.duration for span in trace)
+    statement = next(span for span in trace if span.name == "sql").attributes["db.statement"]
+    assert statement.startswith("SELECT")
+
+
+def test_private_repository_helpers_get_spans(client, headers, spans):
+    response = client.post("/app/1/add_tags", json={"tags": ["traced-tag"]}, headers=headers)
+    assert response.status_code == 200
+
+    names = {span.name for span in spans.spans()}
+    assert "handler.add_tags_to_image" in names
+    assert "CrudTags._add_tag_to_image" in names
+
+
+def test_traceparent_continues_the_callers_trace(client, spans):
+    client.get("/", headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"})
+    root, = spans.spans(TRACE_ID)
+    assert root.parent_id == PARENT_ID
+    assert root.name == "GET /"
+
+    spans.clear()
+    client.get("/", headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-00"})
+    assert spans.spans() == []
+
+
+def test_spans_propagate_into_tasks_and_respect_sampling():
+    collector = InMemoryExporter()
+    local = Tracer(collector, sample_rate=1.0)
+
+    async def work(name):
+        with local.span(name):
+            await asyncio.sleep(0)
+
+    async def main():
+        with local.trace("root") as root:
+            await asyncio.gather(work("a"), asyncio.create_task(work("b")))
+        return root
+
+    root = asyncio.run(main())
+    children = [span for span in collector.spans() if span.name in ("a", "b")]
+    assert len(children) == 2
+    assert all(span.parent_id == root.span_id for span in children)
+
+    collector.clear()
+    local.sample_rate = 0.0
+    asyncio.run(main())
+    assert collector.spans() == []
+
+
+def test_file_exporter_writes_json_lines(tmp_path):
+    exporter = FileExporter(tmp_path / "traces.jsonl")
+    local = Tracer(exporter)
+    with local.trace("root"):
+        with pytest.raises(ValueError):
+            with local.span("child"):
+                raise ValueError("boom")
+    exporter.close()
+
+    lines = [json.loads(line) for line in (tmp_path / "traces.jsonl").read_text().splitlines()]
+    assert [line["name"] for line in lines] == ["child", "root"]
+    assert lines[0]["status"] == "error"
+    assert lines[0]["attributes"]["error"] == "ValueError: boom"
+    assert lines[0]["parent_id"] == lines[1]["span_id"]